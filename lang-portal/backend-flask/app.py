@@ -1,13 +1,28 @@
+import os
 from flask import Flask, g, jsonify
 from flask_cors import CORS
 
-from lib.db import Db
+from lib.db import Db, DatabaseBusy, BASE_DIR
+from lib.cache import LRUCache
+from lib import queries
+from lib.compression import Compressor
+from lib.result_cache import ResultCache
+from lib.catalog import Catalog
+from lib.events import EventBroker
+from lib.jobs import JobRunner
+from lib.prefix_index import PrefixIndex
+from lib.sessions import SessionSweeper
 
 import routes.words
 import routes.groups
 import routes.study_sessions
 import routes.dashboard
 import routes.study_activities
+import routes.sync
+import routes.metrics
+import routes.admin
+import routes.jobs
+import routes.analytics
 
 def create_app(test_config=None):
     app = Flask(__name__)
@@ -18,10 +33,100 @@ def create_app(test_config=None):
         )
     else:
         app.config.update(test_config)
+
+    # Word detail cache settings (entries, seconds)
+    app.config.setdefault('WORD_CACHE_SIZE', 1024)
+    app.config.setdefault('WORD_CACHE_TTL', 300)
+
+    # Idle SQLite connections kept per process
+    app.config.setdefault('DB_POOL_SIZE', 4)
+
+    # Write transactions: seconds SQLite waits for the lock, retries after that
+    # (first backoff in seconds, doubling, jittered), and whether this process
+    # queues its writers so they take the lock one at a time in arrival order
+    app.config.setdefault('DB_BUSY_TIMEOUT', 2.0)
+    app.config.setdefault('DB_WRITE_RETRIES', 2)
+    app.config.setdefault('DB_RETRY_BACKOFF', 0.05)
+    app.config.setdefault('DB_SINGLE_WRITER', False)
+
+    # Study history resets delete this many rows per transaction, pausing between batches (seconds)
+    app.config.setdefault('RESET_BATCH_SIZE', 500)
+    app.config.setdefault('RESET_BATCH_PAUSE', 0.01)
+
+    # Study sessions idle this long (seconds) are closed by the sweeper, which runs every interval (0 disables it);
+    # unlike /close, the next review reopens a swept session
+    app.config.setdefault('SESSION_IDLE_TIMEOUT', 1800)
+    app.config.setdefault('SESSION_SWEEP_INTERVAL', 60)
+
+    # Online backups: snapshot directory, pages copied per step and pause between steps (seconds)
+    app.config.setdefault('BACKUP_DIR', os.path.join(BASE_DIR, 'backups'))
+    app.config.setdefault('BACKUP_PAGES', 256)
+    app.config.setdefault('BACKUP_PAUSE', 0.005)
+    app.config.setdefault('BACKUP_MAX_RESTARTS', 5)
+
+    # Seconds the study activity/group snapshot is trusted before checking other processes' writes
+    app.config.setdefault('CATALOG_CHECK_INTERVAL', 1.0)
+
+    # Seconds between dashboard stream checks for writes made by other processes
+    app.config.setdefault('DASHBOARD_POLL_INTERVAL', 1.0)
+
+    # Bearer token for /api/admin endpoints; unset leaves them open like the rest of the API
+    app.config.setdefault('ADMIN_TOKEN', None)
+
+    # Background jobs: queue database, worker threads per process (0 leaves them
+    # to `invoke run-jobs`), attempts, first retry delay and seconds without a
+    # heartbeat before a running job is reclaimed
+    app.config.setdefault('JOBS_DATABASE', os.path.splitext(app.config['DATABASE'])[0] + '-jobs.db')
+    app.config.setdefault('JOBS_WORKERS', 2)
+    app.config.setdefault('JOBS_MAX_ATTEMPTS', 3)
+    app.config.setdefault('JOBS_RETRY_DELAY', 5)
+    app.config.setdefault('JOBS_STALE_AFTER', 300)
     
     # Initialize database first since we need it for CORS configuration
-    app.db = Db(database=app.config['DATABASE'])
+    app.db = Db(
+        database=app.config['DATABASE'],
+        pool_size=app.config['DB_POOL_SIZE'],
+        busy_timeout=app.config['DB_BUSY_TIMEOUT'],
+        write_retries=app.config['DB_WRITE_RETRIES'],
+        retry_backoff=app.config['DB_RETRY_BACKOFF'],
+        single_writer=app.config['DB_SINGLE_WRITER']
+    )
+
+    # Word detail payloads, invalidated on word/group/review writes and checked
+    # against table_versions for writes made by other processes
+    app.word_cache = LRUCache(
+        maxsize=app.config['WORD_CACHE_SIZE'],
+        ttl=app.config['WORD_CACHE_TTL']
+    )
     
+    # Closes idle study sessions; started by the dev server below, driven by serve.py's master
+    app.session_sweeper = SessionSweeper(
+        app.db,
+        idle_seconds=app.config['SESSION_IDLE_TIMEOUT'],
+        interval=app.config['SESSION_SWEEP_INTERVAL'],
+        logger=app.logger
+    )
+
+    # Type-ahead index over kanji/romaji/english, kept current from the change log
+    app.word_index = PrefixIndex()
+
+    # In-process pub/sub; handlers publish 'write' after committing changes
+    app.events = EventBroker()
+
+    # Snapshot of study activities and groups serving the activity listing and launch data
+    app.catalog = Catalog(app, check_interval=app.config['CATALOG_CHECK_INTERVAL'])
+
+    # Background work (study history resets, backups, rebuilds) is queued here
+    # instead of running in the request; routes register their job handlers
+    app.jobs = JobRunner(
+        app.config['JOBS_DATABASE'],
+        workers=app.config['JOBS_WORKERS'],
+        max_attempts=app.config['JOBS_MAX_ATTEMPTS'],
+        retry_delay=app.config['JOBS_RETRY_DELAY'],
+        stale_after=app.config['JOBS_STALE_AFTER'],
+        logger=app.logger
+    )
+
     # Initialize database tables if they don't exist
     with app.app_context():
         try:
@@ -29,6 +134,11 @@ def create_app(test_config=None):
             app.logger.info('Database initialized successfully')
         except Exception as e:
             app.logger.error(f'Database initialization failed: {str(e)}')
+
+        # Prepare and plan every registered statement so broken SQL fails at startup
+        plans = queries.validate(app.db.get())
+        app.logger.debug(f'Validated {len(plans)} query plans')
+        app.db.close()
     
     # Configure CORS
     CORS(app, resources={r"/*": {
@@ -38,11 +148,24 @@ def create_app(test_config=None):
     
 }})
     
+    # Compress large JSON responses (gzip, or br when brotli is installed)
+    Compressor(app)
+
+    # Rendered responses of read-mostly endpoints, validated against table_versions
+    ResultCache(app)
+
     # Define a route for the root URL
     @app.route('/')
     def index():
         return jsonify({"message": "Welcome to the Language Portal API"})
 
+    # Writes that couldn't get the database lock are shed instead of failing with a 500
+    @app.errorhandler(DatabaseBusy)
+    def database_busy(e):
+        response = jsonify({"error": "Database is busy, try again"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
     # Close database connection
     @app.teardown_appcontext
     def close_db(exception):
@@ -54,10 +177,16 @@ def create_app(test_config=None):
     routes.study_sessions.load(app)
     routes.dashboard.load(app)
     routes.study_activities.load(app)
+    routes.sync.load(app)
+    routes.metrics.load(app)
+    routes.admin.load(app)
+    routes.jobs.load(app)
+    routes.analytics.load(app)
     
     return app
 
-app = create_app()
-
+# Development server; see serve.py for the prefork production server
 if __name__ == '__main__':
+    app = create_app()
+    app.session_sweeper.start()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""Compare type-ahead lookups in the prefix index with SQLite LIKE prefix queries.
+
+Run from the backend directory with `invoke benchmark-completion` or
+`python -m benchmarks.completion`. A throwaway database is filled with the
+seed words plus random romaji words.
+"""
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import time
+
+from lib.prefix_index import PrefixIndex
+
+PREFIXES = ['a', 'ka', 'tab', 'shi', 'nom', 'x', 'taberu']
+
+LIKE_SQL = '''
+    SELECT id, kanji, romaji, english FROM words
+    WHERE romaji LIKE ? OR kanji LIKE ? OR english LIKE ?
+    LIMIT ?
+'''
+
+def random_word(rng):
+    syllables = [consonant + vowel for consonant in ['', 'k', 's', 't', 'n', 'h', 'm', 'r'] for vowel in 'aiueo']
+    romaji = ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 5)))
+    english = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+    return (romaji.upper(), romaji, english, '[]')
+
+def fill(database, words, seed=0):
+    rng = random.Random(seed)
+    connection = sqlite3.connect(database)
+    connection.executemany(
+        'INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)',
+        [random_word(rng) for _ in range(words)]
+    )
+    connection.commit()
+    connection.close()
+
+def time_us(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) * 1e6 / iterations
+
+def run(database, iterations=1000, limit=10):
+    connection = sqlite3.connect(database)
+
+    index = PrefixIndex()
+    started = time.perf_counter()
+    index.build(connection.execute('SELECT id, kanji, romaji, english FROM words').fetchall(), 0)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f'{len(index)} words indexed in {build_ms:.1f} ms')
+
+    print(f"{'prefix':<10} {'hits':>5} {'index us':>10} {'LIKE us':>10}")
+    for prefix in PREFIXES:
+        pattern = prefix + '%'
+        hits = len(index.complete(prefix, limit))
+        index_us = time_us(lambda: index.complete(prefix, limit), iterations)
+        like_us = time_us(
+            lambda: connection.execute(LIKE_SQL, (pattern, pattern, pattern, limit)).fetchall(),
+            max(iterations // 10, 1)
+        )
+        print(f'{prefix:<10} {hits:>5} {index_us:>10.1f} {like_us:>10.1f}')
+
+    connection.close()
+
+def main(words=50000, iterations=1000):
+    from app import create_app
+
+    handle, database = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    os.unlink(database)
+    try:
+        create_app({'DATABASE': database})
+        fill(database, words)
+        run(database, iterations=iterations)
+    finally:
+        if os.path.exists(database):
+            os.unlink(database)
+
+if __name__ == '__main__':
+    main()
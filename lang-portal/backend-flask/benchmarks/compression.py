@@ -0,0 +1,78 @@
+"""Report bytes saved and CPU cost of response compression per endpoint.
+
+Run from the backend directory with `invoke benchmark-compression` or
+`python -m benchmarks.compression`. A throwaway seeded database is used.
+"""
+import os
+import tempfile
+import time
+
+from lib.compression import available_encodings, compress
+
+ENDPOINTS = [
+    '/words',
+    '/words/1',
+    '/groups',
+    '/groups/1',
+    '/groups/1/words',
+    '/groups/1/study_sessions',
+    '/api/groups/1/words/raw',
+    '/api/groups/2/words/raw',
+    '/api/study-sessions',
+    '/api/study-sessions/1',
+    '/api/study-activities',
+    '/dashboard/stats',
+]
+
+def measure(app, path, iterations=50):
+    client = app.test_client()
+    # Ask for the identity encoding so the raw body can be measured
+    body = client.get(path, headers={'Accept-Encoding': 'identity'}).get_data()
+
+    results = []
+    for encoding in available_encodings():
+        started = time.process_time()
+        for _ in range(iterations):
+            compressed = compress(
+                body,
+                encoding,
+                level=app.config['COMPRESS_LEVEL'],
+                br_quality=app.config['COMPRESS_BR_QUALITY']
+            )
+        cpu_ms = (time.process_time() - started) * 1000 / iterations
+        results.append({
+            'encoding': encoding,
+            'raw_bytes': len(body),
+            'compressed_bytes': len(compressed),
+            'saved_bytes': len(body) - len(compressed),
+            'cpu_ms': cpu_ms,
+            'compressed': len(body) >= app.config['COMPRESS_MIN_SIZE'],
+        })
+    return results
+
+def run(app, endpoints=ENDPOINTS, iterations=50):
+    print(f"{'endpoint':<32} {'enc':<5} {'raw':>8} {'comp':>8} {'saved':>7} {'cpu ms':>8}")
+    for path in endpoints:
+        for result in measure(app, path, iterations):
+            saved_pct = 100 * result['saved_bytes'] / result['raw_bytes'] if result['raw_bytes'] else 0
+            note = '' if result['compressed'] else '  (below threshold)'
+            print(
+                f"{path:<32} {result['encoding']:<5} {result['raw_bytes']:>8} "
+                f"{result['compressed_bytes']:>8} {saved_pct:>6.1f}% {result['cpu_ms']:>8.3f}{note}"
+            )
+
+def main(iterations=50):
+    from app import create_app
+
+    handle, database = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    os.unlink(database)
+    try:
+        app = create_app({'DATABASE': database})
+        run(app, iterations=iterations)
+    finally:
+        if os.path.exists(database):
+            os.unlink(database)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Review history analytics computed with NumPy and stored in summary tables.
+
+The review log is read in id-ordered chunks into column arrays (word id,
+session id, correct, unix time). Every metric is then a handful of
+vectorized group-bys (bincount over a group key, or a sort followed by
+boundary masks) instead of per-row SQL or Python loops:
+
+- word difficulty: per-word accuracy smoothed towards the overall accuracy
+  (PRIOR_REVIEWS pseudo-reviews), so a word seen once isn't rated 0 or 1
+- forgetting curve: recall rate of each review by the time since the same
+  word's previous review, in CURVE_EDGES buckets
+- activity accuracy: accuracy per (study activity, group) pair
+
+refresh() replaces the summary tables in one transaction. NumPy is
+optional; without it refresh() raises RuntimeError and the endpoints keep
+serving the last stored summaries.
+"""
+import time
+
+from lib import queries
+
+# NumPy is optional, it is only needed to refresh the summaries
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHUNK_SIZE = 100000
+
+# Pseudo-reviews at the overall accuracy added to every word's own reviews
+PRIOR_REVIEWS = 5
+
+# Forgetting curve bucket boundaries (seconds since the word's previous review)
+CURVE_EDGES = [60, 3600, 6 * 3600, 86400, 3 * 86400, 7 * 86400, 30 * 86400]
+
+def available():
+    return np is not None
+
+def load_reviews(connection, chunk_size=CHUNK_SIZE):
+    """The review log as arrays: word_id, session_id, correct and time (unix seconds)."""
+    chunks = []
+    last_id = 0
+    while True:
+        last_id, word_ids, session_ids, correct, created_at = connection.execute(
+            queries.get('analytics.review_chunk'), (last_id, chunk_size)
+        ).fetchone()
+        if last_id is None:
+            break
+        chunks.append((
+            np.array(word_ids.split(','), dtype=np.int64),
+            np.array(session_ids.split(','), dtype=np.int64),
+            np.array(correct.split(','), dtype=np.int64).astype(bool),
+            np.array(created_at.split(','), dtype='datetime64[s]').astype(np.int64)
+        ))
+
+    columns = [np.concatenate(column) for column in zip(*chunks)] if chunks else [
+        np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=bool), np.empty(0, dtype=np.int64)
+    ]
+    return dict(zip(["word_id", "session_id", "correct", "time"], columns))
+
+def load_sessions(connection):
+    """Group and activity of every session as arrays indexed by session id (-1 when missing)."""
+    rows = np.array(connection.execute(queries.get('analytics.sessions')).fetchall(), dtype=np.int64).reshape(-1, 3)
+    size = int(rows[:, 0].max()) + 1 if len(rows) else 1
+    group_ids = np.full(size, -1, dtype=np.int64)
+    activity_ids = np.full(size, -1, dtype=np.int64)
+    group_ids[rows[:, 0]] = rows[:, 1]
+    activity_ids[rows[:, 0]] = rows[:, 2]
+    return group_ids, activity_ids
+
+def word_difficulty(reviews):
+    """Rows of (word_id, reviews, correct, accuracy, difficulty, last reviewed unix time)."""
+    word_ids, correct, times = reviews["word_id"], reviews["correct"], reviews["time"]
+    if not len(word_ids):
+        return []
+
+    counts = np.bincount(word_ids)
+    corrects = np.bincount(word_ids, weights=correct).astype(np.int64)
+    last_times = np.zeros(len(counts), dtype=np.int64)
+    np.maximum.at(last_times, word_ids, times)
+
+    prior = corrects.sum() / counts.sum()
+    reviewed = np.nonzero(counts)[0]
+    accuracy = corrects[reviewed] / counts[reviewed]
+    smoothed = (corrects[reviewed] + PRIOR_REVIEWS * prior) / (counts[reviewed] + PRIOR_REVIEWS)
+    return list(zip(
+        reviewed.tolist(), counts[reviewed].tolist(), corrects[reviewed].tolist(),
+        np.round(accuracy, 4).tolist(), np.round(1 - smoothed, 4).tolist(), last_times[reviewed].tolist()
+    ))
+
+def forgetting_curve(reviews):
+    """Rows of (bucket, min_seconds, max_seconds, reviews, recalled, recall_rate)."""
+    # One sort on word id, then time, packed into a single int64 key
+    times = reviews["time"] - reviews["time"].min() if len(reviews["time"]) else reviews["time"]
+    order = np.argsort((reviews["word_id"] << 32) | times, kind='stable')
+    word_ids = reviews["word_id"][order]
+    times = reviews["time"][order]
+    correct = reviews["correct"][order]
+
+    # Every review after the first of its word, with the time since the one before
+    repeated = word_ids[1:] == word_ids[:-1]
+    elapsed = (times[1:] - times[:-1])[repeated]
+    recalled = correct[1:][repeated]
+
+    buckets = np.digitize(elapsed, CURVE_EDGES)
+    counts = np.bincount(buckets, minlength=len(CURVE_EDGES) + 1)
+    recalls = np.bincount(buckets, weights=recalled, minlength=len(CURVE_EDGES) + 1).astype(np.int64)
+
+    bounds = [0] + CURVE_EDGES + [None]
+    return [(
+        bucket, bounds[bucket], bounds[bucket + 1], int(counts[bucket]), int(recalls[bucket]),
+        round(recalls[bucket] / counts[bucket], 4) if counts[bucket] else None
+    ) for bucket in range(len(CURVE_EDGES) + 1)]
+
+def activity_accuracy(reviews, session_groups, session_activities):
+    """Rows of (study_activity_id, group_id, reviews, correct, accuracy)."""
+    session_ids = reviews["session_id"]
+    known = (session_ids >= 0) & (session_ids < len(session_groups))
+    group_ids = np.full(len(session_ids), -1, dtype=np.int64)
+    activity_ids = np.full(len(session_ids), -1, dtype=np.int64)
+    group_ids[known] = session_groups[session_ids[known]]
+    activity_ids[known] = session_activities[session_ids[known]]
+
+    # Reviews of deleted sessions don't belong to any cell
+    valid = (group_ids >= 0) & (activity_ids >= 0)
+    if not valid.any():
+        return []
+    width = int(group_ids[valid].max()) + 1
+    cells = activity_ids[valid] * width + group_ids[valid]
+    counts = np.bincount(cells)
+    corrects = np.bincount(cells, weights=reviews["correct"][valid]).astype(np.int64)
+
+    used = np.nonzero(counts)[0]
+    return list(zip(
+        (used // width).tolist(), (used % width).tolist(), counts[used].tolist(), corrects[used].tolist(),
+        np.round(corrects[used] / counts[used], 4).tolist()
+    ))
+
+def refresh(connection, chunk_size=CHUNK_SIZE, progress=None):
+    """Recompute every summary table from the review log; commits on `connection`."""
+    if np is None:
+        raise RuntimeError('Analytics needs numpy, install it with: pip install numpy')
+
+    started = time.monotonic()
+
+    def step(message):
+        if progress is not None:
+            progress(message)
+
+    step('Loading review history')
+    reviews = load_reviews(connection, chunk_size)
+    session_groups, session_activities = load_sessions(connection)
+
+    step('Computing metrics')
+    difficulty = word_difficulty(reviews)
+    curve = forgetting_curve(reviews)
+    accuracy = activity_accuracy(reviews, session_groups, session_activities)
+
+    step('Writing summaries')
+    seconds = round(time.monotonic() - started, 3)
+    try:
+        for name in ['analytics.clear_word_difficulty', 'analytics.clear_forgetting_curve', 'analytics.clear_activity_accuracy']:
+            connection.execute(queries.get(name))
+        connection.executemany(queries.get('analytics.insert_word_difficulty'), difficulty)
+        connection.executemany(queries.get('analytics.insert_forgetting_curve'), curve)
+        connection.executemany(queries.get('analytics.insert_activity_accuracy'), accuracy)
+        connection.execute(queries.get('analytics.insert_run'), (len(reviews["word_id"]), seconds))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+    return {
+        "reviews": len(reviews["word_id"]),
+        "words": len(difficulty),
+        "activity_groups": len(accuracy),
+        "seconds": round(time.monotonic() - started, 3)
+    }
@@ -0,0 +1,187 @@
+"""Hot backups of the SQLite database while the app keeps serving.
+
+`online` snapshots use SQLite's backup API, copying `pages` pages per step
+and pausing between steps so writers are never locked out for long. A write
+from another connection during the copy restarts it from the first page, so
+on a busy database the copy may never finish: after `max_restarts` restarts
+it falls back to VACUUM INTO. `vacuum` snapshots use VACUUM INTO directly,
+which produces a compacted copy in one read transaction. Snapshots are gzip compressed by default and get a
+sha256sum-style `.sha256` file next to them, checked again on restore.
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+METHODS = ('online', 'vacuum')
+
+SNAPSHOT_SUFFIXES = ('.db', '.db.gz')
+
+# Restarts of an online copy (see the module docstring) before falling back to VACUUM INTO
+MAX_RESTARTS = 5
+
+class BackupRestarted(Exception):
+    """Raised from the progress callback to abort an online copy that keeps restarting."""
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def snapshot_name(database, compress=True):
+    stem = os.path.splitext(os.path.basename(database))[0]
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    return f"{stem}-{stamp}{'.db.gz' if compress else '.db'}"
+
+def copy_online(database, target, pages=256, pause=0.005, progress=None, max_restarts=MAX_RESTARTS):
+    """Copy with the backup API; returns the number of restarts.
+
+    Raises BackupRestarted after more than max_restarts restarts.
+    """
+    source = sqlite3.connect(database)
+    destination = sqlite3.connect(target)
+    state = {"remaining": None, "restarts": 0}
+
+    def step(status, remaining, total):
+        # Every step copies pages; remaining not going down means the copy restarted
+        if state["remaining"] is not None and remaining >= state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > max_restarts:
+                raise BackupRestarted(f'Online backup restarted {state["restarts"]} times by concurrent writes')
+        state["remaining"] = remaining
+        if progress is not None:
+            progress(total - remaining, total)
+        # Give writers a window between steps
+        if pause:
+            time.sleep(pause)
+
+    try:
+        source.backup(destination, pages=pages, progress=step)
+    finally:
+        destination.close()
+        source.close()
+    return state["restarts"]
+
+def copy_vacuum(database, target):
+    source = sqlite3.connect(database)
+    try:
+        source.execute('VACUUM INTO ?', (target,))
+    finally:
+        source.close()
+
+def backup(database, directory, method='online', compress=True, pages=256, pause=0.005, progress=None,
+           max_restarts=MAX_RESTARTS):
+    """Write a snapshot of `database` into `directory`; returns its path, size and checksum.
+
+    `method` in the result is the one that produced the snapshot: an online
+    copy that kept restarting is redone with VACUUM INTO.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of: {', '.join(METHODS)}")
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, snapshot_name(database, compress))
+    copy_path = path[:-len('.gz')] if compress else path
+    partial = copy_path + '.partial'
+
+    started = time.monotonic()
+    restarts = 0
+    try:
+        if method == 'online':
+            try:
+                restarts = copy_online(database, partial, pages=pages, pause=pause, progress=progress,
+                                       max_restarts=max_restarts)
+            except BackupRestarted:
+                restarts = max_restarts + 1
+                method = 'vacuum'
+                # VACUUM INTO needs a target that doesn't exist
+                os.unlink(partial)
+        if method == 'vacuum':
+            copy_vacuum(database, partial)
+
+        if compress:
+            with open(partial, 'rb') as source, gzip.open(path, 'wb', compresslevel=6) as destination:
+                shutil.copyfileobj(source, destination, 1024 * 1024)
+            os.unlink(partial)
+        else:
+            os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.unlink(partial)
+
+    checksum = sha256_file(path)
+    with open(path + '.sha256', 'w') as file:
+        file.write(f'{checksum}  {os.path.basename(path)}\n')
+
+    return {
+        "path": path,
+        "method": method,
+        "restarts": restarts,
+        "bytes": os.path.getsize(path),
+        "sha256": checksum,
+        "seconds": round(time.monotonic() - started, 3)
+    }
+
+def verify(path):
+    """Return True when the snapshot matches its .sha256 file."""
+    with open(path + '.sha256') as file:
+        expected = file.read().split()[0]
+    return sha256_file(path) == expected
+
+def restore(path, target):
+    """Restore a snapshot into `target`, which must not exist yet.
+
+    Raises ValueError when the checksum doesn't match or the restored file
+    fails SQLite's integrity check.
+    """
+    if os.path.exists(target):
+        raise ValueError(f'{target} already exists, restore into a fresh file')
+    if not verify(path):
+        raise ValueError(f'{path} does not match its checksum')
+
+    partial = target + '.partial'
+    opener = gzip.open if path.endswith('.gz') else open
+    try:
+        with opener(path, 'rb') as source, open(partial, 'wb') as destination:
+            shutil.copyfileobj(source, destination, 1024 * 1024)
+
+        # A file that isn't a SQLite database raises sqlite3.DatabaseError here
+        connection = sqlite3.connect(partial)
+        try:
+            result = connection.execute('PRAGMA integrity_check').fetchone()[0]
+            schema_version = connection.execute('PRAGMA user_version').fetchone()[0]
+        finally:
+            connection.close()
+        if result != 'ok':
+            raise ValueError(f'Restored database failed the integrity check: {result}')
+
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.unlink(partial)
+    return {
+        "path": target,
+        "bytes": os.path.getsize(target),
+        "schema_version": schema_version
+    }
+
+def list_snapshots(directory):
+    if not os.path.isdir(directory):
+        return []
+
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(SNAPSHOT_SUFFIXES):
+            continue
+        path = os.path.join(directory, name)
+        snapshots.append({
+            "name": name,
+            "bytes": os.path.getsize(path),
+            "checksum": os.path.exists(path + '.sha256')
+        })
+    return snapshots
@@ -0,0 +1,87 @@
+import threading
+import time
+
+# Tables the snapshot is built from
+TABLES = ('study_activities', 'groups')
+
+class Snapshot:
+    """Study activities and groups with their responses already serialized; replaced, never modified."""
+
+    def __init__(self, versions, activities, groups, render):
+        self.versions = versions
+        self.activities = activities
+        self.groups = groups
+        self.listing = render([activity_payload(activity) for activity in activities])
+        self.activity = {activity['id']: render(activity_payload(activity)) for activity in activities}
+        self.launch = {activity['id']: render({
+            'activity': activity_payload(activity),
+            'groups': [{'id': group['id'], 'name': group['name']} for group in groups]
+        }) for activity in activities}
+
+def activity_payload(activity):
+    return {
+        'id': activity['id'],
+        'title': activity['name'],
+        'launch_url': activity['url'],
+        'preview_url': activity['preview_url']
+    }
+
+class Catalog:
+    """Process-wide snapshot behind the study activity listing and launch endpoints.
+
+    Requests get the current Snapshot without touching the database. It is
+    rebuilt on the next request after a local write to its tables (published
+    on app.events), or when their table_versions moved in another process,
+    which is checked at most every check_interval seconds.
+    """
+
+    def __init__(self, app, check_interval=1.0):
+        self.app = app
+        self.check_interval = check_interval
+        self.rebuilds = 0
+        self._snapshot = None
+        self._stale = True
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        app.events.listen('write', self.on_write)
+
+    def on_write(self, data):
+        if data and set(data.get('tables', [])) & set(TABLES):
+            self._stale = True
+
+    def current(self):
+        snapshot = self._snapshot
+        if snapshot is not None and not self._stale and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            # Another request may have refreshed it while this one waited
+            snapshot = self._snapshot
+            if snapshot is not None and not self._stale and time.monotonic() - self._checked_at < self.check_interval:
+                return snapshot
+
+            # Cleared before reading, so a write landing during the rebuild marks it stale again
+            stale, self._stale = self._stale, False
+            try:
+                versions = self.app.db.table_versions(TABLES)
+                if snapshot is None or stale or versions != snapshot.versions:
+                    snapshot = self._snapshot = self.load(versions)
+                    self.rebuilds += 1
+            except Exception:
+                # Keep the pending rebuild for the next request
+                self._stale = self._stale or stale
+                raise
+            self._checked_at = time.monotonic()
+            return snapshot
+
+    def load(self, versions):
+        activities = [dict(row) for row in self.app.db.execute('study_activities.list').fetchall()]
+        groups = [dict(row) for row in self.app.db.execute('groups.list_all').fetchall()]
+        return Snapshot(versions, activities, groups, lambda payload: self.app.json.response(payload).get_data())
+
+    def stats(self):
+        return {
+            "rebuilds": self.rebuilds,
+            "activities": len(self._snapshot.activities) if self._snapshot else 0,
+            "groups": len(self._snapshot.groups) if self._snapshot else 0
+        }
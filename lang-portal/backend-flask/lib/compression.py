@@ -0,0 +1,95 @@
+import gzip
+from flask import request
+
+from lib.cache import LRUCache
+
+# Brotli is optional; without it responses are only gzip encoded
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIMETYPES = [
+    'application/json',
+    'text/html',
+    'text/plain',
+    'text/css',
+    'application/javascript',
+]
+
+def compress(data, encoding, level=6, br_quality=4):
+    if encoding == 'br':
+        return brotli.compress(data, quality=br_quality)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+class Compressor:
+    """after_request hook compressing eligible responses with br or gzip.
+
+    Responses get a weak ETag of their uncompressed body, so clients can
+    revalidate with If-None-Match, and the compressed bytes are cached per
+    (ETag, encoding) so unchanged resources are only compressed once.
+    """
+
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)  # bytes
+        app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BR_QUALITY', 4)
+        app.config.setdefault('COMPRESS_CACHE_SIZE', 256)  # entries
+
+        self.config = app.config
+        self.cache = LRUCache(maxsize=app.config['COMPRESS_CACHE_SIZE'])
+        app.compressor = self
+        app.after_request(self.after_request)
+
+    def choose_encoding(self):
+        for encoding in available_encodings():
+            if request.accept_encodings[encoding] > 0:
+                return encoding
+        return None
+
+    def after_request(self, response):
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in self.config['COMPRESS_MIMETYPES']):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.content_length is not None and response.content_length < self.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        # Weak, since the compressed and identity representations share it
+        response.add_etag(weak=True)
+        response.make_conditional(request)
+        if response.status_code != 200:
+            return response
+
+        encoding = self.choose_encoding()
+        if encoding is None:
+            return response
+
+        etag, _ = response.get_etag()
+        key = (etag, encoding)
+        data = self.cache.get(key)
+        if data is None:
+            data = compress(
+                response.get_data(),
+                encoding,
+                level=self.config['COMPRESS_LEVEL'],
+                br_quality=self.config['COMPRESS_BR_QUALITY']
+            )
+            self.cache.set(key, data)
+
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -1,16 +1,322 @@
 import sqlite3
 import json
+import os
+import random
+import threading
+import time
+import unicodedata
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
 from flask import g
 
+from lib import queries
+
+# Root of the backend package; sql/ and seed/ paths are resolved against it
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bump whenever the schema created by setup_tables changes, and add the
+# steps upgrading existing databases to MIGRATIONS
+SCHEMA_VERSION = 15
+
+# Setup files in the order they have to run
+SETUP_FILES = [
+    'setup/create_table_words.sql',
+    'setup/create_table_word_reviews.sql',
+    'setup/create_table_word_review_items.sql',
+    'setup/create_table_groups.sql',
+    'setup/create_table_word_groups.sql',
+    'setup/create_table_study_activities.sql',
+    'setup/create_table_study_sessions.sql',
+    'setup/create_trigger_words_groups_insert.sql',
+    'setup/create_trigger_words_groups_delete.sql',
+    'setup/create_change_log.sql',
+    'setup/create_indexes_word_review_items.sql',
+    'setup/create_indexes_words.sql',
+    'setup/create_index_words_norm_key.sql',
+    'setup/create_table_versions.sql',
+    'setup/create_trigger_group_rollups.sql',
+    'setup/create_trigger_group_rollups_version.sql',
+    'setup/create_indexes_study_sessions.sql',
+    'setup/create_tables_analytics.sql',
+    'setup/create_table_session_word_stats.sql',
+]
+
+# Columns added to existing tables by migrations, as {name: declaration}.
+# setup/create_table_*.sql already declares them for new databases.
+GROUP_ROLLUP_COLUMNS = {
+    'reviewed_words': 'INTEGER NOT NULL DEFAULT 0',
+    'mastered_words': 'INTEGER NOT NULL DEFAULT 0',
+    'correct_reviews': 'INTEGER NOT NULL DEFAULT 0',
+    'wrong_reviews': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+# ALTER TABLE can't add a CURRENT_TIMESTAMP default; migrated rows are backfilled
+# and study_sessions.insert sets last_activity_at explicitly
+SESSION_LIFECYCLE_COLUMNS = {
+    'last_activity_at': 'DATETIME',
+    'ended_at': 'DATETIME',
+}
+
+WORD_KEY_COLUMNS = {
+    'norm_key': 'TEXT',
+}
+
+SESSION_WORDS_COLUMNS = {
+    'words_count': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+# Sessions closed before this existed count as closed through /close
+SESSION_AUTO_CLOSED_COLUMNS = {
+    'auto_closed': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+def add_missing_columns(cursor, table, columns):
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row[1] for row in cursor.fetchall()}
+    for column, declaration in columns.items():
+        if column not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+def add_group_rollup_columns(db, cursor):
+    add_missing_columns(cursor, 'groups', GROUP_ROLLUP_COLUMNS)
+
+def add_session_lifecycle_columns(db, cursor):
+    add_missing_columns(cursor, 'study_sessions', SESSION_LIFECYCLE_COLUMNS)
+
+def add_word_key_column(db, cursor):
+    add_missing_columns(cursor, 'words', WORD_KEY_COLUMNS)
+
+def add_session_words_column(db, cursor):
+    add_missing_columns(cursor, 'study_sessions', SESSION_WORDS_COLUMNS)
+
+def add_session_auto_closed_column(db, cursor):
+    add_missing_columns(cursor, 'study_sessions', SESSION_AUTO_CLOSED_COLUMNS)
+
+# Existing duplicates keep a NULL key past the first (lowest id) copy, so the
+# unique index can be built; `invoke report-duplicates` lists them
+def backfill_word_keys(db, cursor):
+    seen = set()
+    keys = []
+    for word_id, kanji, romaji in cursor.execute('SELECT id, kanji, romaji FROM words ORDER BY id').fetchall():
+        key = word_key(kanji, romaji)
+        keys.append((None if key in seen else key, word_id))
+        seen.add(key)
+    cursor.executemany('UPDATE words SET norm_key = ? WHERE id = ?', keys)
+
+def rebuild_group_rollups(db, cursor):
+    cursor.execute(queries.get('groups.rebuild_rollups'))
+
+# Upgrade steps keyed by the schema version they produce. A step is a SQL file
+# or a callable taking (db, cursor). Older steps replay setup files against the
+# schema of their version, so a setup file must never start depending on a
+# column added later: put such statements in a new file instead.
+MIGRATIONS = {
+    2: [
+        'setup/create_trigger_words_groups_insert.sql',
+        'setup/create_trigger_words_groups_delete.sql',
+        'migrations/0002_recount_group_words.sql',
+    ],
+    3: [
+        'migrations/0003_canonicalize_word_parts.sql',
+    ],
+    4: [
+        'setup/create_change_log.sql',
+        'migrations/0004_backfill_change_log.sql',
+    ],
+    5: [
+        'setup/create_indexes_word_review_items.sql',
+    ],
+    6: [
+        'setup/create_indexes_words.sql',
+    ],
+    7: [
+        'setup/create_table_versions.sql',
+    ],
+    8: [
+        add_group_rollup_columns,
+        'setup/create_trigger_group_rollups.sql',
+        rebuild_group_rollups,
+    ],
+    9: [
+        add_session_lifecycle_columns,
+        'migrations/0009_backfill_session_activity.sql',
+        'setup/create_indexes_study_sessions.sql',
+    ],
+    10: [
+        # Both files gained indexes for sorted pages; existing ones are skipped
+        'setup/create_indexes_words.sql',
+        'setup/create_indexes_study_sessions.sql',
+    ],
+    11: [
+        add_word_key_column,
+        'migrations/0011_drop_words_change_log_update.sql',
+        'setup/create_change_log.sql',
+        backfill_word_keys,
+        'setup/create_index_words_norm_key.sql',
+    ],
+    12: [
+        'setup/create_tables_analytics.sql',
+    ],
+    13: [
+        add_session_words_column,
+        'setup/create_table_session_word_stats.sql',
+        'migrations/0013_backfill_session_word_stats.sql',
+    ],
+    14: [
+        'migrations/0014_narrow_groups_update_triggers.sql',
+        'setup/create_table_versions.sql',
+        'setup/create_change_log.sql',
+        'setup/create_trigger_group_rollups_version.sql',
+    ],
+    15: [
+        add_session_auto_closed_column,
+    ],
+}
+
+def canonical_parts(parts):
+    """Render word parts (a list, or its JSON text) as the minified JSON stored in words.parts.
+
+    Raises ValueError when parts isn't a JSON array.
+    """
+    if isinstance(parts, str):
+        parts = json.loads(parts)
+    if not isinstance(parts, list):
+        raise ValueError('parts must be a JSON array')
+    return json.dumps(parts, ensure_ascii=False, separators=(',', ':'))
+
+def word_key(kanji, romaji):
+    """Uniqueness key of a word: NFKC kanji and lowercased NFKC romaji."""
+    kanji = unicodedata.normalize('NFKC', kanji).strip()
+    romaji = unicodedata.normalize('NFKC', romaji).strip().lower()
+    return f'{kanji}|{romaji}'
+
+@lru_cache(maxsize=None)
+def load_sql(filepath):
+    with open(os.path.join(BASE_DIR, 'sql', filepath), 'r') as file:
+        return file.read()
+
+# Split a SQL file into statements (trigger bodies included) so they can run
+# one by one inside a transaction, which executescript() would commit
+@lru_cache(maxsize=None)
+def load_statements(filepath):
+    statements = []
+    statement = ''
+    for line in load_sql(filepath).splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            statements.append(statement.strip())
+            statement = ''
+    return tuple(statements)
+
+class DatabaseBusy(sqlite3.OperationalError):
+    """A write transaction couldn't get the database lock within its retries."""
+
+def is_lock_error(error):
+    message = str(error)
+    return 'database is locked' in message or 'database is busy' in message
+
+class WriteQueue:
+    """FIFO lock letting one writer of this process at a time ask SQLite for the lock.
+
+    SQLite's busy handler polls with growing sleeps, so under contention a
+    late writer can win over one that has waited for seconds. Queued here,
+    writers go in arrival order and only the head of the queue polls.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._waiting = deque()
+        self._held = False
+
+    def acquire(self, timeout=None):
+        token = object()
+        with self._condition:
+            self._waiting.append(token)
+            acquired = self._condition.wait_for(lambda: not self._held and self._waiting[0] is token, timeout)
+            self._waiting.remove(token)
+            if acquired:
+                self._held = True
+            else:
+                # The writer behind this one may be at the head now
+                self._condition.notify_all()
+            return acquired
+
+    def release(self):
+        with self._condition:
+            self._held = False
+            self._condition.notify_all()
+
+    def __len__(self):
+        return len(self._waiting)
+
 class Db:
-    def __init__(self, database='words.db'):
+    def __init__(self, database='words.db', pool_size=4, busy_timeout=5.0,
+                 write_retries=2, retry_backoff=0.05, single_writer=False):
         self.database = database
         self.connection = None
 
+        # Seconds SQLite waits for a lock, then BEGIN IMMEDIATE is retried
+        # write_retries times after a jittered, doubling backoff
+        self.busy_timeout = busy_timeout
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff
+        self.write_queue = WriteQueue() if single_writer else None
+        self._write_stats = {
+            "transactions": 0,
+            "retries": 0,
+            "busy": 0,
+            "lock_wait_seconds": 0.0,
+            "max_lock_wait_seconds": 0.0
+        }
+        self._stats_lock = threading.Lock()
+
+        # Idle connections reused across requests so their statement caches stay warm
+        self.pool_size = pool_size
+        self._pool = []
+        self._pool_lock = threading.Lock()
+        self._pid = os.getpid()
+
+    # Open a new connection; background jobs use this directly, requests via get()
+    def connect(self):
+        connection = sqlite3.connect(
+            self.database,
+            timeout=self.busy_timeout,
+            cached_statements=queries.CACHED_STATEMENTS,
+            check_same_thread=False  # pooled connections move between request threads
+        )
+        connection.row_factory = sqlite3.Row  # Return rows as dictionaries
+        return connection
+
+    def acquire(self):
+        with self._pool_lock:
+            # Connections must never be shared with a forked child
+            if os.getpid() != self._pid:
+                self._pool = []
+                self._pid = os.getpid()
+            if self._pool:
+                return self._pool.pop()
+        return self.connect()
+
+    def release(self, connection):
+        if connection.in_transaction:
+            connection.rollback()
+        with self._pool_lock:
+            if os.getpid() == self._pid and len(self._pool) < self.pool_size:
+                self._pool.append(connection)
+                return
+        connection.close()
+
+    # Close idle pooled connections, e.g. in a prefork master before forking workers
+    def close_pool(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, []
+        for connection in pool:
+            connection.close()
+
     def get(self):
         if 'db' not in g:
-            g.db = sqlite3.connect(self.database)
-            g.db.row_factory = sqlite3.Row  # Return rows as dictionaries
+            g.db = self.acquire()
         return g.db
 
     def commit(self):
@@ -21,42 +327,167 @@ class Db:
         connection = self.get()
         return connection.cursor()
 
+    # Run a statement from the query registry (lib/queries.py) by name
+    def execute(self, name, params=()):
+        cursor = self.cursor()
+        cursor.execute(queries.get(name), params)
+        return cursor
+
+    # Run several reads against one snapshot: a deferred BEGIN takes the read
+    # lock on the first SELECT and keeps it until the block ends
+    @contextmanager
+    def read_transaction(self):
+        connection = self.get()
+        if connection.in_transaction:
+            yield connection
+            return
+        connection.execute('BEGIN')
+        try:
+            yield connection
+        finally:
+            connection.rollback()
+
+    # Run a write transaction: BEGIN IMMEDIATE takes the write lock up front,
+    # so the block never fails halfway on a lock held by another connection.
+    # Commits when the block ends, rolls back on errors; joins an open
+    # transaction instead. Raises DatabaseBusy when the lock isn't available.
+    # Background jobs pass their own connection from connect().
+    @contextmanager
+    def write(self, connection=None):
+        connection = connection or self.get()
+        if connection.in_transaction:
+            yield connection
+            return
+
+        started = time.monotonic()
+        queue = self.write_queue
+        if queue is not None and not queue.acquire(self.busy_timeout * (self.write_retries + 1)):
+            self._record_write(started, busy=True)
+            raise DatabaseBusy('Timed out waiting for the write queue')
+        try:
+            self._begin_immediate(connection, started)
+            try:
+                yield connection
+                connection.commit()
+            except sqlite3.OperationalError as e:
+                connection.rollback()
+                if is_lock_error(e):
+                    # The commit waits for readers to finish; they took too long
+                    self._record_write(started, busy=True)
+                    raise DatabaseBusy(str(e)) from e
+                raise
+            except BaseException:
+                connection.rollback()
+                raise
+        finally:
+            if queue is not None:
+                queue.release()
+
+    def _begin_immediate(self, connection, started):
+        for attempt in range(self.write_retries + 1):
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                self._record_write(started)
+                return
+            except sqlite3.OperationalError as e:
+                if not is_lock_error(e):
+                    raise
+                if attempt == self.write_retries:
+                    self._record_write(started, busy=True)
+                    raise DatabaseBusy(str(e)) from e
+            with self._stats_lock:
+                self._write_stats["retries"] += 1
+            # Full jitter, so writers that timed out together don't retry together
+            time.sleep(random.uniform(0, self.retry_backoff * 2 ** attempt))
+
+    def _record_write(self, started, busy=False):
+        waited = time.monotonic() - started
+        with self._stats_lock:
+            stats = self._write_stats
+            stats["busy" if busy else "transactions"] += 1
+            stats["lock_wait_seconds"] += waited
+            stats["max_lock_wait_seconds"] = max(stats["max_lock_wait_seconds"], waited)
+
+    # Write transaction counters of this process, for /api/metrics
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._write_stats)
+        attempts = stats["transactions"] + stats["busy"]
+        stats["lock_wait_seconds"] = round(stats["lock_wait_seconds"], 6)
+        stats["max_lock_wait_seconds"] = round(stats["max_lock_wait_seconds"], 6)
+        stats["avg_lock_wait_seconds"] = round(stats["lock_wait_seconds"] / attempts, 6) if attempts else 0.0
+        stats["queued"] = len(self.write_queue) if self.write_queue is not None else 0
+        return stats
+
+    # Write counters of the given tables (maintained by triggers), for cache validation
+    def table_versions(self, tables):
+        versions = dict(self.execute('table_versions.all').fetchall())
+        return tuple(versions.get(table) for table in tables)
+
+    # Recompute every group's review rollups from word_reviews
+    def rebuild_group_rollups(self):
+        cursor = self.cursor()
+        rebuild_group_rollups(self, cursor)
+        self.commit()
+        return cursor.rowcount
+
+    # Hand the request's connection back to the pool
     def close(self):
         db = g.pop('db', None)
         if db is not None:
-            db.close()
+            self.release(db)
 
-    # Function to load SQL from a file
+    # Function to load SQL from a file (read once, then memoized)
     def sql(self, filepath):
-        with open('sql/' + filepath, 'r') as file:
-            return file.read()
+        return load_sql(filepath)
 
     # Function to load the words from a JSON file
     def load_json(self, filepath):
-        with open(filepath, 'r') as file:
+        with open(os.path.join(BASE_DIR, filepath), 'r') as file:
             return json.load(file)
 
+    # Runs inside the caller's transaction, nothing is committed here
     def setup_tables(self, cursor):
-        cursor.execute(self.sql('setup/create_table_words.sql'))
-        self.get().commit()
+        for filepath in SETUP_FILES:
+            self.execute_file(cursor, filepath)
 
-        cursor.execute(self.sql('setup/create_table_word_reviews.sql'))
-        self.get().commit()
+    def execute_file(self, cursor, filepath):
+        for statement in load_statements(filepath):
+            cursor.execute(statement)
 
-        cursor.execute(self.sql('setup/create_table_word_review_items.sql'))
-        self.get().commit()
+    # Apply the MIGRATIONS newer than from_version, inside the caller's transaction
+    def migrate(self, cursor, from_version):
+        for version in range(from_version + 1, SCHEMA_VERSION + 1):
+            for step in MIGRATIONS.get(version, []):
+                if callable(step):
+                    step(self, cursor)
+                else:
+                    self.execute_file(cursor, step)
 
-        cursor.execute(self.sql('setup/create_table_groups.sql'))
-        self.get().commit()
+    def table_exists(self, cursor, table):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return cursor.fetchone() is not None
 
-        cursor.execute(self.sql('setup/create_table_word_groups.sql'))
-        self.get().commit()
+    # Compare groups.words_count with the actual membership; optionally repair it
+    def check_group_counts(self, fix=False):
+        cursor = self.cursor()
+        cursor.execute('''
+            SELECT g.id, g.name, g.words_count,
+                (SELECT COUNT(*) FROM words_groups wg WHERE wg.group_id = g.id) AS actual_count
+            FROM groups g
+            WHERE g.words_count IS NOT actual_count
+            ORDER BY g.id
+        ''')
+        mismatches = [dict(row) for row in cursor.fetchall()]
 
-        cursor.execute(self.sql('setup/create_table_study_activities.sql'))
-        self.get().commit()
+        if fix and mismatches:
+            cursor.executemany(
+                'UPDATE groups SET words_count = ? WHERE id = ?',
+                [(row['actual_count'], row['id']) for row in mismatches]
+            )
+            self.commit()
 
-        cursor.execute(self.sql('setup/create_table_study_sessions.sql'))
-        self.get().commit()
+        return mismatches
 
     def import_study_activities_json(self, cursor, data_json_path):
         study_activities = self.load_json(data_json_path)
@@ -64,90 +495,95 @@ class Db:
             cursor.execute('''
             INSERT INTO study_activities (name, url, preview_url) VALUES (?, ?, ?)
             ''', (activity['name'], activity['url'], activity['preview_url']))
-        self.get().commit()
 
     def import_word_json(self, cursor, group_name, data_json_path):
         # Insert a new group
         cursor.execute('''
           INSERT INTO groups (name) VALUES (?)
         ''', (group_name,))
-        self.get().commit()
 
         # Get the ID of the group
-        cursor.execute('SELECT id FROM groups WHERE name = ?', (group_name,))
-        core_verbs_group_id = cursor.fetchone()[0]
+        core_verbs_group_id = cursor.lastrowid
 
         # Insert some sample words (verbs) from JSON file and associate with the group
         words = self.load_json(data_json_path)
 
         for word in words:
-          # Insert the word into the words table
-          cursor.execute('''
-            INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)
-          ''', (word['kanji'], word['romaji'], word['english'], json.dumps(word['parts'])))
-          
-          # Get the last inserted word's ID
-          word_id = cursor.lastrowid
+          # Insert the word, or update the existing word with the same key
+          cursor.execute(queries.get('words.upsert'), (
+            word['kanji'], word['romaji'], word['english'], canonical_parts(word['parts']),
+            word_key(word['kanji'], word['romaji'])
+          ))
+          word_id = cursor.fetchone()[0]
 
           # Changed from word_groups to words_groups
           cursor.execute('''
-            INSERT INTO words_groups (word_id, group_id) VALUES (?, ?)
+            INSERT OR IGNORE INTO words_groups (word_id, group_id) VALUES (?, ?)
           ''', (word_id, core_verbs_group_id))
-        self.get().commit()
 
-        # Update the words_count in the groups table by counting all words in the group
-        cursor.execute('''
-          UPDATE groups
-          SET words_count = (
-            SELECT COUNT(*) FROM words_groups WHERE group_id = ?
-          )
-          WHERE id = ?
-        ''', (core_verbs_group_id, core_verbs_group_id))
-
-        self.get().commit()
+        # groups.words_count is maintained by the words_groups triggers
 
         print(f"Successfully added {len(words)} verbs to the '{group_name}' group.")
 
     # Initialize the database with sample data
     def init(self, app):
         with app.app_context():
-            cursor = self.cursor()
-            self.setup_tables(cursor)
-            
-            # Check if the tables already contain data
-            cursor.execute('SELECT COUNT(*) FROM words')
-            words_count = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM groups')
-            groups_count = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM study_activities')
-            study_activities_count = cursor.fetchone()[0]
-            
-            if words_count == 0 and groups_count == 0 and study_activities_count == 0:
-                self.import_word_json(
-                    cursor=cursor,
-                    group_name='Core Verbs',
-                    data_json_path='seed/data_verbs.json'
-                )
-                self.import_word_json(
-                    cursor=cursor,
-                    group_name='Core Adjectives',
-                    data_json_path='seed/data_adjectives.json'
-                )
-                self.import_study_activities_json(
-                    cursor=cursor,
-                    data_json_path='seed/study_activities.json'
-                )
-                
-                # Create a study session
+            connection = self.get()
+
+            # Fast path: an up to date schema means setup and seeding already ran
+            schema_version = connection.execute('PRAGMA user_version').fetchone()[0]
+            if schema_version >= SCHEMA_VERSION:
+                app.logger.info('Database schema is up to date, skipping setup.')
+                return
+
+            cursor = connection.cursor()
+            cursor.execute('BEGIN')
+            try:
+                if schema_version == 0 and not self.table_exists(cursor, 'words'):
+                    self.setup_tables(cursor)
+                else:
+                    # Databases created before user_version was stamped have the version 1 schema
+                    self.migrate(cursor, max(schema_version, 1))
+
+                # Check if the tables already contain data
                 cursor.execute('''
-                    INSERT INTO study_sessions (group_id, study_activity_id)
-                    VALUES (1, 1), (2, 2)
+                    SELECT
+                        (SELECT COUNT(*) FROM words) +
+                        (SELECT COUNT(*) FROM groups) +
+                        (SELECT COUNT(*) FROM study_activities)
                 ''')
-                self.get().commit()
-            else:
-                app.logger.info('Database already contains data, skipping seed data insertion.')
+                rows_count = cursor.fetchone()[0]
+
+                if rows_count == 0:
+                    self.import_word_json(
+                        cursor=cursor,
+                        group_name='Core Verbs',
+                        data_json_path='seed/data_verbs.json'
+                    )
+                    self.import_word_json(
+                        cursor=cursor,
+                        group_name='Core Adjectives',
+                        data_json_path='seed/data_adjectives.json'
+                    )
+                    self.import_study_activities_json(
+                        cursor=cursor,
+                        data_json_path='seed/study_activities.json'
+                    )
+
+                    # Create a study session
+                    cursor.execute('''
+                        INSERT INTO study_sessions (group_id, study_activity_id)
+                        VALUES (1, 1), (2, 2)
+                    ''')
+                else:
+                    app.logger.info('Database already contains data, skipping seed data insertion.')
+
+                # PRAGMA values can't be bound as parameters
+                cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
 
 # Create an instance of the Db class
 db = Db()
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""Find duplicate and near-duplicate words without comparing every pair.
+
+A word's signature is a set of character n-grams: bigrams of its NFKC kanji
+and trigrams of its romaji (lowercased ASCII letters and digits, diacritics
+removed), both padded with start/end markers. Two words are near-duplicates
+when the Jaccard similarity of their signatures reaches the threshold.
+
+Candidates come from prefix filtering. With every signature sorted rarest
+gram first, two signatures with Jaccard >= t must share one of the first
+len - ceil(t * len) + 1 grams of each, so only those prefixes go into the
+inverted index. Rare grams keep the posting lists short, and words are
+visited smallest first so a size bound drops candidates that are too small.
+"""
+import itertools
+import math
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from lib import queries
+from lib.db import word_key
+
+# Tolerance for the float products in the prefix and similarity bounds
+EPSILON = 1e-9
+
+def ngrams(text, n, tag):
+    padded = f'^{text}$'
+    return {tag + padded[start:start + n] for start in range(len(padded) - n + 1)}
+
+def signature(kanji, romaji):
+    kanji = unicodedata.normalize('NFKC', kanji).strip()
+    # Decomposed so macrons and accents drop out: 'Tōkyō' and 'tokyo' match
+    romaji = ''.join(character for character in unicodedata.normalize('NFKD', romaji).lower() if character.isalnum() and character.isascii())
+    return ngrams(kanji, 2, 'k') | ngrams(romaji, 3, 'r')
+
+def jaccard(a, b):
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+def similar_pairs(words, threshold=0.8):
+    """Pairs of (id, kanji, romaji) words whose signatures reach `threshold`.
+
+    Returns [(similarity, id_a, id_b)] with id_a < id_b, most similar first.
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError('threshold must be in (0, 1]')
+
+    signatures = {word_id: signature(kanji, romaji) for word_id, kanji, romaji in words}
+    frequency = Counter(gram for grams in signatures.values() for gram in grams)
+
+    index = defaultdict(list)  # prefix gram -> ids of the words visited so far
+    pairs = []
+    for word_id in sorted(signatures, key=lambda word_id: (len(signatures[word_id]), word_id)):
+        grams = signatures[word_id]
+        size = len(grams)
+        min_size = threshold * size - EPSILON
+        prefix = sorted(grams, key=lambda gram: (frequency[gram], gram))[:size - math.ceil(threshold * size - EPSILON) + 1]
+
+        candidates = set()
+        for gram in prefix:
+            postings = index[gram]
+            candidates.update(other for other in postings if len(signatures[other]) >= min_size)
+            postings.append(word_id)
+
+        for other in candidates:
+            similarity = jaccard(grams, signatures[other])
+            if similarity >= threshold - EPSILON:
+                pairs.append((round(similarity, 4), min(word_id, other), max(word_id, other)))
+
+    pairs.sort(key=lambda pair: (-pair[0], pair[1], pair[2]))
+    return pairs
+
+def exact_duplicates(words):
+    """Ids of (id, kanji, romaji) words sharing a word_key, one list per key."""
+    ids = defaultdict(list)
+    for word_id, kanji, romaji in words:
+        ids[word_key(kanji, romaji)].append(word_id)
+    return [word_ids for word_ids in ids.values() if len(word_ids) > 1]
+
+def report(connection, threshold=0.8):
+    """Exact and near-duplicate words of the database on `connection`."""
+    started = time.monotonic()
+    rows = connection.execute(queries.get('words.keys')).fetchall()
+    words = {row[0]: row for row in rows}
+    triples = [(word_id, kanji, romaji) for word_id, kanji, romaji, english, norm_key in rows]
+
+    exact = exact_duplicates(triples)
+    exact_pairs = {pair for word_ids in exact for pair in itertools.combinations(word_ids, 2)}
+    near = [pair for pair in similar_pairs(triples, threshold) if (pair[1], pair[2]) not in exact_pairs]
+
+    def describe(word_id):
+        word_id, kanji, romaji, english, norm_key = words[word_id]
+        return {"id": word_id, "kanji": kanji, "romaji": romaji, "english": english}
+
+    return {
+        "words": len(rows),
+        "exact": [[describe(word_id) for word_id in word_ids] for word_ids in exact],
+        "near": [{
+            "similarity": similarity,
+            "words": [describe(id_a), describe(id_b)]
+        } for similarity, id_a, id_b in near],
+        "seconds": round(time.monotonic() - started, 3)
+    }
@@ -0,0 +1,68 @@
+import queue
+import threading
+
+# Replaces the pending events of a subscriber that fell behind
+OVERFLOW = 'overflow'
+
+class EventBroker:
+    """In-process pub/sub.
+
+    Listeners are callables run synchronously by publish() (used to derive
+    new events from a write), subscribers are queues drained by long-lived
+    consumers such as the dashboard SSE stream.
+
+    A subscriber whose queue is full loses its pending events and gets a
+    single (OVERFLOW, None) instead, so it knows to resynchronize.
+    """
+
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._listeners = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def listen(self, event, callback):
+        with self._lock:
+            self._listeners.setdefault(event, []).append(callback)
+
+    # Returns a queue receiving (event, data) tuples for the given events
+    def subscribe(self, events):
+        subscriber = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._subscribers[subscriber] = set(events)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.pop(subscriber, None)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event, data=None):
+        with self._lock:
+            listeners = list(self._listeners.get(event, []))
+            subscribers = [subscriber for subscriber, events in self._subscribers.items() if event in events]
+
+        for callback in listeners:
+            callback(data)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # A stalled consumer never blocks writers; it resynchronizes instead
+                self.overflow(subscriber)
+
+    def overflow(self, subscriber):
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            subscriber.put_nowait((OVERFLOW, None))
+        except queue.Full:
+            # Refilled by a concurrent publish, which will overflow it again
+            pass
@@ -0,0 +1,16 @@
+# Parse a ?fields=a,b,c projection against an endpoint's whitelist. Returns the
+# requested fields in whitelist order (all of them when the parameter is absent)
+# and raises ValueError naming any field that isn't allowed.
+def requested_fields(args, allowed):
+    value = args.get('fields')
+    if not value:
+        return list(allowed)
+
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    return [field for field in allowed if field in fields]
+
+def project(row, fields):
+    return {field: row[field] for field in fields}
@@ -0,0 +1,280 @@
+"""Background jobs queued in SQLite and run by worker threads.
+
+Handlers are registered per kind and called as handler(job, **params). Any
+process sharing the jobs database may run a job, so params and the return
+value must be JSON serializable. Workers claim the oldest due job in an
+immediate transaction, so each job runs on one worker at a time.
+
+A failed attempt is retried after retry_delay seconds, doubling each time,
+until max_attempts is reached. A running job whose heartbeat is older than
+stale_after seconds has lost its worker (e.g. the process was killed); it
+is claimed again as its next attempt. Progress updates refresh the
+heartbeat, so long handlers should report progress.
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from lib.db import load_statements
+
+# Progress is written at most this often (seconds); message changes always are
+PROGRESS_INTERVAL = 0.25
+
+FINISHED = ('succeeded', 'failed')
+
+COLUMNS = '''
+    id, kind, params, status, attempts, max_attempts, progress, total, message,
+    result, error, run_after, created_at, started_at, finished_at
+'''
+
+# Running jobs that stopped reporting get another attempt, or fail when out of them
+RECLAIM_SQL = '''
+    UPDATE jobs
+    SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+        error = 'Worker stopped responding',
+        finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE CURRENT_TIMESTAMP END
+    WHERE status = 'running' AND heartbeat_at < datetime('now', ?)
+'''
+
+CLAIM_SQL = '''
+    UPDATE jobs
+    SET status = 'running', attempts = attempts + 1, worker = ?,
+        progress = 0, total = NULL, message = NULL,
+        started_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+    WHERE id = (
+        SELECT id FROM jobs
+        WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP
+        ORDER BY run_after, id
+        LIMIT 1
+    )
+    RETURNING id, kind, params, attempts, max_attempts
+'''
+
+# Keeps the newest `keep` finished jobs
+PRUNE_SQL = '''
+    DELETE FROM jobs WHERE id IN (
+        SELECT id FROM jobs WHERE finished_at IS NOT NULL ORDER BY id DESC LIMIT -1 OFFSET ?
+    )
+'''
+
+class Job:
+    """A claimed job as its handler sees it; update() reports progress."""
+
+    def __init__(self, runner, job_id, kind, params, attempt, max_attempts):
+        self.runner = runner
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.attempt = attempt
+        self.max_attempts = max_attempts
+        self.progress = 0
+        self.total = None
+        self.message = None
+        self._flushed_at = time.monotonic()
+
+    def update(self, progress=None, total=None, message=None):
+        if progress is not None:
+            self.progress = progress
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+        if message is not None or time.monotonic() - self._flushed_at >= PROGRESS_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self.runner.execute('''
+            UPDATE jobs SET progress = ?, total = ?, message = ?, heartbeat_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND attempts = ?
+        ''', (self.progress, self.total, self.message, self.id, self.attempt))
+        self._flushed_at = time.monotonic()
+
+class JobRunner:
+    """SQLite-backed job queue with a pool of worker threads per process.
+
+    Workers start with the first submit() of a process, or explicitly with
+    start() (serve.py's workers, `invoke run-jobs`). With workers=0 this
+    process only queues jobs and another one runs them.
+    """
+
+    def __init__(self, database, workers=2, poll_interval=1.0, max_attempts=3,
+                 retry_delay=5, stale_after=300, keep=1000, logger=None):
+        self.database = database
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.stale_after = stale_after
+        self.keep = keep
+        self.logger = logger or logging.getLogger(__name__)
+        self.handlers = {}  # kind -> (handler, max_attempts)
+        self._setup = False
+        self._threads = []
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def connect(self):
+        # Autocommit; claims open their own immediate transaction
+        connection = sqlite3.connect(self.database, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        if not self._setup:
+            connection.execute('PRAGMA journal_mode = WAL')
+            for statement in load_statements('setup/create_table_jobs.sql'):
+                connection.execute(statement)
+            self._setup = True
+        return connection
+
+    def execute(self, sql, params=()):
+        with closing(self.connect()) as connection:
+            return connection.execute(sql, params).fetchall()
+
+    def register(self, kind, handler, max_attempts=None):
+        self.handlers[kind] = (handler, max_attempts or self.max_attempts)
+
+    def submit(self, kind, **params):
+        """Queue a job of a registered kind; returns its id."""
+        if kind not in self.handlers:
+            raise ValueError(f'No handler registered for {kind} jobs')
+        with closing(self.connect()) as connection:
+            job_id = connection.execute(
+                'INSERT INTO jobs (kind, params, max_attempts) VALUES (?, ?, ?)',
+                (kind, json.dumps(params), self.handlers[kind][1])
+            ).lastrowid
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id):
+        """Status of a job as a JSON-ready dict, or None."""
+        rows = self.execute(f'SELECT {COLUMNS} FROM jobs WHERE id = ?', (job_id,))
+        return self.to_dict(rows[0]) if rows else None
+
+    def list(self, status=None, kind=None, limit=50):
+        rows = self.execute(f'''
+            SELECT {COLUMNS} FROM jobs
+            WHERE (? IS NULL OR status = ?) AND (? IS NULL OR kind = ?)
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (status, status, kind, kind, limit))
+        return [self.to_dict(row) for row in rows]
+
+    def to_dict(self, row):
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finishes; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in FINISHED:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.02)
+
+    def start(self):
+        """Start the worker threads, once per process (a forked child starts its own)."""
+        with self._lock:
+            if os.getpid() != self._pid:
+                self._threads = []
+                self._pid = os.getpid()
+            if self._threads or self.workers <= 0:
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._work, name=f'jobs-{number}', daemon=True)
+                for number in range(1, self.workers + 1)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        """Let running jobs finish (up to timeout seconds) and stop the workers."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stopping.set()
+        self._wake.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def _work(self):
+        worker = f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+        connection = self.connect()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    job = self._claim(connection, worker)
+                except sqlite3.Error as e:
+                    self.logger.warning(f'Claiming a job failed: {e}')
+                    job = None
+
+                if job is None:
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+                    continue
+                self._run(connection, job)
+        finally:
+            connection.close()
+
+    def _claim(self, connection, worker):
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(RECLAIM_SQL, (f'-{self.stale_after} seconds',))
+            rows = connection.execute(CLAIM_SQL, (worker,)).fetchall()
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        if not rows:
+            return None
+        job_id, kind, params, attempt, max_attempts = rows[0]
+        return Job(self, job_id, kind, json.loads(params), attempt, max_attempts)
+
+    def _run(self, connection, job):
+        handler = self.handlers.get(job.kind, (None,))[0]
+        try:
+            if handler is None:
+                raise ValueError(f'No handler registered for {job.kind} jobs')
+            result = json.dumps(handler(job, **job.params))
+        except Exception as e:
+            self.logger.exception(f'Job {job.id} ({job.kind}) attempt {job.attempt} failed')
+            if job.attempt < job.max_attempts and handler is not None:
+                delay = self.retry_delay * 2 ** (job.attempt - 1)
+                outcome = ('''
+                    UPDATE jobs SET status = 'queued', error = ?, run_after = datetime('now', ?)
+                    WHERE id = ? AND attempts = ?
+                ''', (str(e), f'+{delay} seconds', job.id, job.attempt))
+            else:
+                outcome = ('''
+                    UPDATE jobs SET status = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND attempts = ?
+                ''', (str(e), job.id, job.attempt))
+        else:
+            outcome = ('''
+                UPDATE jobs
+                SET status = 'succeeded', result = ?, error = NULL, progress = ?, total = ?, message = ?,
+                    finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND attempts = ?
+            ''', (result, job.progress, job.total, job.message, job.id, job.attempt))
+
+        # A worker must outlive a locked jobs database; a job whose outcome
+        # wasn't recorded stays running until it's reclaimed as stale
+        try:
+            connection.execute(*outcome)
+        except sqlite3.Error as e:
+            self.logger.warning(f'Recording job {job.id} ({job.kind}) attempt {job.attempt} failed: {e}')
+        try:
+            connection.execute(PRUNE_SQL, (self.keep,))
+        except sqlite3.Error as e:
+            self.logger.warning(f'Pruning finished jobs failed: {e}')
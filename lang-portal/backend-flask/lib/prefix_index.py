@@ -0,0 +1,109 @@
+import bisect
+import json
+import threading
+import unicodedata
+
+def normalize(text):
+    """Fold width and case so 'Ｔａｂｅ', 'TABE' and 'tabe' share a key."""
+    return unicodedata.normalize('NFKC', text or '').casefold().strip()
+
+class PrefixIndex:
+    """Sorted (key, word_id) array over kanji, romaji and english for type-ahead lookups.
+
+    complete() is a bisect plus a short scan. The index is built on first use
+    and brought up to date from the change log before each lookup, so words
+    written by other requests (or other worker processes) show up without a
+    rebuild.
+    """
+
+    def __init__(self):
+        self.version = None  # change_log version the index reflects
+        self._entries = []
+        self._words = {}  # word_id -> (kanji, romaji, english)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._words)
+
+    def _keys(self, word):
+        return {key for key in map(normalize, word) if key}
+
+    def _remove(self, word_id):
+        word = self._words.pop(word_id, None)
+        if word is None:
+            return
+        for key in self._keys(word):
+            position = bisect.bisect_left(self._entries, (key, word_id))
+            if position < len(self._entries) and self._entries[position] == (key, word_id):
+                del self._entries[position]
+
+    def _add(self, word_id, kanji, romaji, english):
+        self._remove(word_id)
+        word = (kanji, romaji, english)
+        self._words[word_id] = word
+        for key in self._keys(word):
+            bisect.insort(self._entries, (key, word_id))
+
+    def build(self, rows, version):
+        with self._lock:
+            self._words = {row[0]: tuple(row[1:4]) for row in rows}
+            self._entries = sorted(
+                (key, word_id)
+                for word_id, word in self._words.items()
+                for key in self._keys(word)
+            )
+            self.version = version
+
+    def add(self, word_id, kanji, romaji, english):
+        with self._lock:
+            self._add(word_id, kanji, romaji, english)
+
+    def remove(self, word_id):
+        with self._lock:
+            self._remove(word_id)
+
+    def refresh(self, db):
+        """Build the index, or apply the words changed since it was last refreshed."""
+        if self.version is None:
+            # Read the version first: words written in between are re-applied next time
+            version = db.execute('change_log.version').fetchone()[0]
+            self.build(db.execute('words.index_rows').fetchall(), version)
+            return
+
+        changes = db.execute('words.index_changes', (self.version,)).fetchall()
+        if not changes:
+            return
+
+        word_ids = [int(change['row_key']) for change in changes]
+        rows = db.execute('sync.words', (json.dumps(word_ids),)).fetchall()
+        with self._lock:
+            for word_id in word_ids:
+                self._remove(word_id)
+            for row in rows:
+                self._add(row['id'], row['kanji'], row['romaji'], row['english'])
+            self.version = max(self.version, changes[-1]['version'])
+
+    def complete(self, prefix, limit=10):
+        """Return up to limit words with a field starting with prefix, in key order (exact matches first)."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        word_ids = []
+        with self._lock:
+            position = bisect.bisect_left(self._entries, (prefix,))
+            while position < len(self._entries) and len(word_ids) < limit:
+                key, word_id = self._entries[position]
+                if not key.startswith(prefix):
+                    break
+                if word_id not in word_ids:
+                    word_ids.append(word_id)
+                position += 1
+            words = [(word_id, self._words[word_id]) for word_id in word_ids]
+
+        return [{
+            "id": word_id,
+            "kanji": kanji,
+            "romaji": romaji,
+            "english": english
+        } for word_id, (kanji, romaji, english) in words]
@@ -0,0 +1,690 @@
+"""Registry of every SQL statement issued by the route handlers.
+
+Statements are declared once here and looked up by name, so each connection's
+statement cache sees a fixed set of SQL strings and query plans can be
+reviewed (and validated at startup) in one place. Sortable listings are
+expanded into one named statement per whitelisted column/order pair instead
+of formatting ORDER BY clauses per request. Projectable statements (?fields=)
+register their full SELECT list and a few named narrower profiles up front;
+a request selects the smallest profile covering its fields and the handler
+drops the rest, so clients can't add statements at runtime.
+"""
+
+# Per-connection prepared statement cache; keep it above len(QUERIES)
+CACHED_STATEMENTS = 256
+
+SORT_ORDERS = ('asc', 'desc')
+
+QUERIES = {}
+
+# name -> (sql template, {field: SQL expression}, sort columns or None, {profile: fields})
+PROJECTIONS = {}
+
+# Registered names of every sorted variant (paginated listings)
+SORTED = set()
+
+def register(name, sql):
+    if name in QUERIES:
+        raise ValueError(f'Query {name} is already registered')
+    QUERIES[name] = sql
+
+def register_sorted(name, sql, columns):
+    """Register `sql` once per (sort key, order); `sql` has an {order_by} placeholder."""
+    for sort_key, column in columns.items():
+        for order in SORT_ORDERS:
+            register(sorted_name(name, sort_key, order), sql.format(order_by=f'{column} {order.upper()}'))
+            SORTED.add(sorted_name(name, sort_key, order))
+
+def sorted_name(name, sort_key, order):
+    return f'{name}.{sort_key}.{order}'
+
+def render_columns(columns, fields):
+    return ', '.join(f'{columns[field]} AS {field}' for field in fields)
+
+def register_projected(name, sql, columns, sort_columns=None, profiles=None):
+    """Register a statement whose SELECT list can be narrowed to named profiles of `columns`.
+
+    `sql` has a {columns} placeholder, plus {order_by} when sort_columns is
+    given (sort expressions must not rely on selected aliases). The variant
+    selecting every field is registered under the usual names, each profile
+    (a list of fields) under name[profile].
+    """
+    profiles = profiles or {}
+    PROJECTIONS[name] = (sql, columns, sort_columns, profiles)
+    for profile, fields in [(None, columns)] + list(profiles.items()):
+        template = sql.replace('{columns}', render_columns(columns, fields))
+        variant = name if profile is None else f'{name}[{profile}]'
+        if sort_columns:
+            register_sorted(variant, template, sort_columns)
+        else:
+            register(variant, template)
+
+def projected_name(name, fields, sort_key=None, order=None):
+    """Name of the registered variant of `name` selecting the fewest columns that include `fields`.
+
+    Rows may carry more columns than asked for; handlers project them.
+    """
+    sql, columns, sort_columns, profiles = PROJECTIONS[name]
+    covering = [profile for profile, profile_fields in profiles.items() if set(fields) <= set(profile_fields)]
+    variant = name
+    if covering:
+        variant = f'{name}[{min(covering, key=lambda profile: len(profiles[profile]))}]'
+    return sorted_name(variant, sort_key, order) if sort_columns else variant
+
+def get(name):
+    return QUERIES[name]
+
+def explain(connection, name):
+    """Return the EXPLAIN QUERY PLAN detail lines for a registered statement."""
+    sql = QUERIES[name]
+    # Plans don't depend on parameter values, so bind NULLs for every placeholder
+    rows = connection.execute('EXPLAIN QUERY PLAN ' + sql, (None,) * sql.count('?')).fetchall()
+    return [row[3] for row in rows]
+
+def validate(connection):
+    """Prepare and plan every registered statement; returns {name: plan lines}."""
+    plans = {}
+    for name in QUERIES:
+        try:
+            plans[name] = explain(connection, name)
+        except Exception as e:
+            raise RuntimeError(f'Query {name} failed validation: {e}') from e
+    return plans
+
+# Fields and sort expressions shared by the word listings
+WORD_COLUMNS = {
+    'id': 'w.id',
+    'kanji': 'w.kanji',
+    'romaji': 'w.romaji',
+    'english': 'w.english',
+    'correct_count': 'COALESCE(r.correct_count, 0)',
+    'wrong_count': 'COALESCE(r.wrong_count, 0)'
+}
+
+WORD_SORT_COLUMNS = {
+    'kanji': 'w.kanji',
+    'romaji': 'w.romaji',
+    'english': 'w.english',
+    'correct_count': 'COALESCE(r.correct_count, 0)',
+    'wrong_count': 'COALESCE(r.wrong_count, 0)'
+}
+
+# Narrower SELECT lists of the word listings. slim needs no word_reviews
+# columns, so the LEFT JOIN is dropped and words_kanji covers the kanji order.
+WORD_PROFILES = {
+    'slim': ['id', 'kanji', 'romaji', 'english']
+}
+
+# ---------------------------------------------------------------- caching
+
+register('table_versions.all', 'SELECT table_name, version FROM table_versions')
+
+# ---------------------------------------------------------------- words
+
+register_projected('words.list', '''
+    SELECT {columns}
+    FROM words w
+    LEFT JOIN word_reviews r ON w.id = r.word_id
+    ORDER BY {order_by}
+    LIMIT ? OFFSET ?
+''', WORD_COLUMNS, WORD_SORT_COLUMNS, WORD_PROFILES)
+
+register('words.count', 'SELECT COUNT(*) as count FROM words')
+
+register('words.exists', 'SELECT id FROM words WHERE id = ?')
+
+register('words.missing_ids', '''
+    SELECT value AS id FROM json_each(?)
+    WHERE value NOT IN (SELECT id FROM words)
+''')
+
+register('words.details_by_ids', '''
+    SELECT w.id, w.kanji, w.romaji, w.english,
+        COALESCE(r.correct_count, 0) AS correct_count,
+        COALESCE(r.wrong_count, 0) AS wrong_count
+    FROM words w
+    LEFT JOIN word_reviews r ON w.id = r.word_id
+    WHERE w.id IN (SELECT value FROM json_each(?))
+''')
+
+register('words.groups_by_word_ids', '''
+    SELECT wg.word_id, g.id, g.name
+    FROM words_groups wg
+    JOIN groups g ON wg.group_id = g.id
+    WHERE wg.word_id IN (SELECT value FROM json_each(?))
+    ORDER BY g.id
+''')
+
+# Type-ahead prefix index (lib/prefix_index.py): full load, then deltas from the change log
+register('words.index_rows', 'SELECT id, kanji, romaji, english FROM words')
+
+register('words.index_changes', '''
+    SELECT version, row_key
+    FROM change_log
+    WHERE version > ? AND +table_name = 'words'  -- + keeps the planner on the version range
+    ORDER BY version
+''')
+
+register('change_log.version', 'SELECT COALESCE(MAX(version), 0) FROM change_log')
+
+# Latest word_reviews change per word, for validating cached word details
+register('words.review_versions', '''
+    SELECT CAST(row_key AS INTEGER), version
+    FROM change_log
+    WHERE table_name = 'word_reviews' AND row_key IN (SELECT CAST(value AS TEXT) FROM json_each(?))
+''')
+
+register('words.insert', 'INSERT INTO words (kanji, romaji, english, parts, norm_key) VALUES (?, ?, ?, ?, ?)')
+
+register('words.id_by_key', 'SELECT id FROM words WHERE norm_key = ?')
+
+# Imports: a word already present (by norm_key) takes the imported english and parts
+register('words.upsert', '''
+    INSERT INTO words (kanji, romaji, english, parts, norm_key) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (norm_key) DO UPDATE SET english = excluded.english, parts = excluded.parts
+    RETURNING id
+''')
+
+register('words.keys', 'SELECT id, kanji, romaji, english, norm_key FROM words ORDER BY id')
+
+# ---------------------------------------------------------------- groups
+
+# The review rollup columns are kept up to date by sql/setup/create_trigger_group_rollups.sql
+register_sorted('groups.list', '''
+    SELECT id, name, words_count, reviewed_words, mastered_words, correct_reviews, wrong_reviews
+    FROM groups
+    ORDER BY {order_by}
+    LIMIT ? OFFSET ?
+''', {
+    'name': 'name',
+    'words_count': 'words_count',
+    'mastered_words': 'mastered_words'
+})
+
+register('groups.count', 'SELECT COUNT(*) as count FROM groups')
+
+register('groups.list_all', 'SELECT id, name FROM groups')
+
+register('groups.exists', 'SELECT id FROM groups WHERE id = ?')
+
+register('groups.name', 'SELECT name FROM groups WHERE id = ?')
+
+register('groups.get', '''
+    SELECT g.id, g.name, COUNT(wg.word_id) as total_word_count,
+        g.reviewed_words, g.mastered_words, g.correct_reviews, g.wrong_reviews
+    FROM groups g
+    LEFT JOIN words_groups wg ON g.id = wg.group_id
+    WHERE g.id = ?
+    GROUP BY g.id
+''')
+
+register('groups.insert', 'INSERT INTO groups (name) VALUES (?)')
+
+# Full recomputation of the review rollups (same mastery rule as the triggers)
+register('groups.rebuild_rollups', '''
+    UPDATE groups SET (reviewed_words, mastered_words, correct_reviews, wrong_reviews) = (
+        SELECT
+            COALESCE(SUM(r.correct_count + r.wrong_count > 0), 0),
+            COALESCE(SUM(r.correct_count >= 3 AND r.correct_count > r.wrong_count), 0),
+            COALESCE(SUM(r.correct_count), 0),
+            COALESCE(SUM(r.wrong_count), 0)
+        FROM words_groups wg
+        JOIN word_reviews r ON r.word_id = wg.word_id
+        WHERE wg.group_id = groups.id
+    )
+''')
+
+register_projected('groups.words', '''
+    SELECT {columns}
+    FROM words_groups wg
+    JOIN words w ON w.id = wg.word_id
+    LEFT JOIN word_reviews r ON w.id = r.word_id
+    WHERE wg.group_id = ?
+    ORDER BY {order_by}
+    LIMIT ? OFFSET ?
+''', WORD_COLUMNS, WORD_SORT_COLUMNS, WORD_PROFILES)
+
+register('groups.words_count', '''
+    SELECT COUNT(*)
+    FROM words_groups
+    WHERE group_id = ?
+''')
+
+# Word exports: parts is canonical JSON text, spliced into the response as-is
+register_projected('groups.words_raw', '''
+    SELECT {columns}
+    FROM words_groups wg
+    JOIN words w ON w.id = wg.word_id
+    WHERE wg.group_id = ?
+''', {
+    'id': 'w.id',
+    'kanji': 'w.kanji',
+    'romaji': 'w.romaji',
+    'english': 'w.english',
+    'parts': 'w.parts'
+}, profiles=WORD_PROFILES)
+
+register('groups.add_word', '''
+    INSERT OR IGNORE INTO words_groups (group_id, word_id)
+    VALUES (?, ?)
+''')
+
+# groups.words_count is maintained by the words_groups triggers
+register('groups.add_words', '''
+    INSERT OR IGNORE INTO words_groups (group_id, word_id)
+    SELECT ?, id FROM words WHERE id IN (SELECT value FROM json_each(?))
+''')
+
+register('groups.study_sessions_count', '''
+    SELECT COUNT(*)
+    FROM study_sessions
+    WHERE group_id = ?
+''')
+
+# Keys are the sort names used by the frontend
+register_sorted('groups.study_sessions', '''
+    SELECT
+        s.id,
+        s.group_id,
+        s.study_activity_id,
+        s.created_at as start_time,
+        COALESCE(s.ended_at, s.last_activity_at) as end_time,
+        s.ended_at,
+        a.name as activity_name,
+        g.name as group_name,
+        (
+            SELECT COUNT(*)
+            FROM word_review_items
+            WHERE study_session_id = s.id
+        ) as review_count
+    FROM study_sessions s
+    JOIN study_activities a ON s.study_activity_id = a.id
+    JOIN groups g ON s.group_id = g.id
+    WHERE s.group_id = ?
+    ORDER BY {order_by}
+    LIMIT ? OFFSET ?
+''', {
+    'startTime': 'created_at',
+    'endTime': 'end_time',
+    'activityName': 'a.name',
+    'groupName': 'g.name',
+    'reviewItemsCount': 'review_count'
+})
+
+# ---------------------------------------------------------------- study sessions
+
+register('study_sessions.count', '''
+    SELECT COUNT(*) as count
+    FROM study_sessions ss
+    JOIN groups g ON g.id = ss.group_id
+    JOIN study_activities sa ON sa.id = ss.study_activity_id
+''')
+
+register('study_sessions.list', '''
+    SELECT
+        ss.id,
+        ss.group_id,
+        g.name as group_name,
+        sa.id as activity_id,
+        sa.name as activity_name,
+        ss.created_at,
+        COALESCE(ss.ended_at, ss.last_activity_at) as end_time,
+        ss.ended_at,
+        (
+            SELECT COUNT(*)
+            FROM word_review_items
+            WHERE study_session_id = ss.id
+        ) as review_items_count
+    FROM study_sessions ss
+    JOIN groups g ON g.id = ss.group_id
+    JOIN study_activities sa ON sa.id = ss.study_activity_id
+    ORDER BY ss.created_at DESC
+    LIMIT ? OFFSET ?
+''')
+
+register('study_sessions.get', '''
+    SELECT
+        ss.id,
+        ss.group_id,
+        g.name as group_name,
+        sa.id as activity_id,
+        sa.name as activity_name,
+        ss.created_at,
+        COALESCE(ss.ended_at, ss.last_activity_at) as end_time,
+        ss.ended_at,
+        COUNT(wri.id) as review_items_count
+    FROM study_sessions ss
+    JOIN groups g ON g.id = ss.group_id
+    JOIN study_activities sa ON sa.id = ss.study_activity_id
+    LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
+    WHERE ss.id = ?
+    GROUP BY ss.id
+''')
+
+# A range of the session_word_stats_kanji index, already in page order
+register_projected('study_sessions.words', '''
+    SELECT {columns}
+    FROM session_word_stats s
+    JOIN words w ON w.id = s.word_id
+    WHERE s.session_id = ?
+    ORDER BY s.kanji, s.word_id
+    LIMIT ? OFFSET ?
+''', {
+    'id': 's.word_id',
+    'kanji': 's.kanji',
+    'romaji': 'w.romaji',
+    'english': 'w.english',
+    'correct_count': 's.correct',
+    'wrong_count': 's.wrong'
+})
+
+# study_sessions.words_count is maintained by the session_word_stats triggers
+register('study_sessions.words_count', '''
+    SELECT words_count as count FROM study_sessions WHERE id = ?
+''')
+
+register('study_sessions.insert', '''
+    INSERT INTO study_sessions (group_id, study_activity_id, last_activity_at)
+    VALUES (?, ?, CURRENT_TIMESTAMP)
+''')
+
+# Session lifecycle: reviews bump last_activity_at (reopening sessions the idle
+# sweeper ended), closing sets ended_at once and for good
+register('study_sessions.touch', '''
+    UPDATE study_sessions SET last_activity_at = CURRENT_TIMESTAMP, ended_at = NULL, auto_closed = 0
+    WHERE id = ? AND (ended_at IS NULL OR auto_closed)
+''')
+
+register('study_sessions.state', 'SELECT id, ended_at FROM study_sessions WHERE id = ?')
+
+# A swept session keeps its end time, but reviews no longer reopen it
+register('study_sessions.close', '''
+    UPDATE study_sessions SET ended_at = COALESCE(ended_at, CURRENT_TIMESTAMP), auto_closed = 0
+    WHERE id = ? AND (ended_at IS NULL OR auto_closed)
+''')
+
+# Idle sessions end at their last activity; bound as a datetime() modifier like '-1800 seconds'
+register('study_sessions.close_idle', '''
+    UPDATE study_sessions SET ended_at = last_activity_at, auto_closed = 1
+    WHERE ended_at IS NULL AND last_activity_at < datetime('now', ?)
+''')
+
+# Served by the partial study_sessions_active index
+register('study_sessions.active', '''
+    SELECT id, group_id, study_activity_id, created_at, last_activity_at
+    FROM study_sessions
+    WHERE ended_at IS NULL
+    ORDER BY last_activity_at DESC
+    LIMIT ?
+''')
+
+register('word_review_items.insert', '''
+    INSERT INTO word_review_items (study_session_id, word_id, correct) VALUES (?, ?, ?)
+''')
+
+# Takes (session_id, correct, wrong, word_id); unknown words get no row
+register('session_word_stats.upsert', '''
+    INSERT INTO session_word_stats (session_id, word_id, kanji, correct, wrong)
+    SELECT ?, id, kanji, ?, ? FROM words WHERE id = ?
+    ON CONFLICT(session_id, word_id) DO UPDATE SET
+    correct = correct + excluded.correct,
+    wrong = wrong + excluded.wrong
+''')
+
+register('word_reviews.upsert', '''
+    INSERT INTO word_reviews (word_id, correct_count, wrong_count)
+    VALUES (?, ?, ?)
+    ON CONFLICT(word_id) DO UPDATE SET
+    correct_count = correct_count + ?,
+    wrong_count = wrong_count + ?
+''')
+
+# ---------------------------------------------------------------- study activities
+
+register('study_activities.list', 'SELECT id, name, url, preview_url FROM study_activities')
+
+register('study_activities.get', 'SELECT id, name, url, preview_url FROM study_activities WHERE id = ?')
+
+register('study_activities.exists', 'SELECT id FROM study_activities WHERE id = ?')
+
+register('study_activities.sessions_count', '''
+    SELECT COUNT(*) as count
+    FROM study_sessions ss
+    JOIN groups g ON g.id = ss.group_id
+    WHERE ss.study_activity_id = ?
+''')
+
+register('study_activities.sessions', '''
+    SELECT
+        ss.id,
+        ss.group_id,
+        g.name as group_name,
+        sa.name as activity_name,
+        ss.created_at,
+        COALESCE(ss.ended_at, ss.last_activity_at) as end_time,
+        ss.ended_at,
+        ss.study_activity_id as activity_id,
+        (
+            SELECT COUNT(*)
+            FROM word_review_items
+            WHERE study_session_id = ss.id
+        ) as review_items_count
+    FROM study_sessions ss
+    JOIN groups g ON g.id = ss.group_id
+    JOIN study_activities sa ON sa.id = ss.study_activity_id
+    WHERE ss.study_activity_id = ?
+    ORDER BY ss.created_at DESC
+    LIMIT ? OFFSET ?
+''')
+
+# ---------------------------------------------------------------- dashboard
+
+register('dashboard.recent_session', '''
+    SELECT
+        ss.id,
+        ss.group_id,
+        sa.name as activity_name,
+        ss.created_at,
+        (
+            SELECT COUNT(*)
+            FROM word_review_items
+            WHERE study_session_id = ss.id AND correct = 1
+        ) as correct_count,
+        (
+            SELECT COUNT(*)
+            FROM word_review_items
+            WHERE study_session_id = ss.id AND correct = 0
+        ) as wrong_count
+    FROM study_sessions ss
+    JOIN study_activities sa ON ss.study_activity_id = sa.id
+    ORDER BY ss.created_at DESC
+    LIMIT 1
+''')
+
+register('dashboard.sessions_count', 'SELECT COUNT(*) as count FROM study_sessions')
+
+register('dashboard.review_totals', '''
+    SELECT SUM(correct_count) as correct, SUM(wrong_count) as wrong
+    FROM word_reviews
+''')
+
+# ---------------------------------------------------------------- sync
+
+register('sync.changes', '''
+    SELECT version, table_name, row_key, deleted
+    FROM change_log
+    WHERE version > ?
+    ORDER BY version
+    LIMIT ?
+''')
+
+register('sync.words', '''
+    SELECT id, kanji, romaji, english, parts
+    FROM words
+    WHERE id IN (SELECT value FROM json_each(?))
+''')
+
+register('sync.groups', '''
+    SELECT id, name, words_count
+    FROM groups
+    WHERE id IN (SELECT value FROM json_each(?))
+''')
+
+# Keys are bound as a JSON array of [word_id, group_id] pairs
+register('sync.words_groups', '''
+    SELECT wg.word_id, wg.group_id
+    FROM json_each(?) k
+    JOIN words_groups wg
+        ON wg.word_id = json_extract(k.value, '$[0]')
+        AND wg.group_id = json_extract(k.value, '$[1]')
+''')
+
+register('sync.word_reviews', '''
+    SELECT word_id, correct_count, wrong_count, last_reviewed
+    FROM word_reviews
+    WHERE word_id IN (SELECT value FROM json_each(?))
+''')
+
+# ---------------------------------------------------------------- study history reset
+
+# Sessions in scope: (group_id, group_id, start, start, end, end); NULL disables a filter
+RESET_SESSION_SCOPE = '''
+    (? IS NULL OR group_id = ?)
+    AND (? IS NULL OR created_at >= ?)
+    AND (? IS NULL OR created_at < ?)
+'''
+
+# Separate subqueries: MIN() and MAX() in one SELECT can't both use the rowid shortcut
+register('reset.review_item_id_range', '''
+    SELECT
+        (SELECT MIN(id) FROM word_review_items) AS min_id,
+        (SELECT MAX(id) FROM word_review_items) AS max_id
+''')
+
+register('reset.session_id_range', '''
+    SELECT
+        (SELECT MIN(id) FROM study_sessions) AS min_id,
+        (SELECT MAX(id) FROM study_sessions) AS max_id
+''')
+
+# Ends the in-scope sessions up to an id first, so add_review rejects new
+# items for them while their recorded id ranges are being deleted
+register('reset.close_sessions', '''
+    UPDATE study_sessions SET ended_at = COALESCE(ended_at, CURRENT_TIMESTAMP), auto_closed = 0
+    WHERE (ended_at IS NULL OR auto_closed) AND id <= ?
+    AND ''' + RESET_SESSION_SCOPE)
+
+register('reset.review_item_word_ids', '''
+    SELECT DISTINCT word_id
+    FROM word_review_items
+    WHERE id BETWEEN ? AND ?
+    AND study_session_id IN (SELECT id FROM study_sessions WHERE id <= ? AND ''' + RESET_SESSION_SCOPE + ''')
+''')
+
+register('reset.delete_review_items', '''
+    DELETE FROM word_review_items
+    WHERE id BETWEEN ? AND ?
+    AND study_session_id IN (SELECT id FROM study_sessions WHERE id <= ? AND ''' + RESET_SESSION_SCOPE + ''')
+''')
+
+register('reset.delete_session_word_stats', '''
+    DELETE FROM session_word_stats
+    WHERE session_id IN (SELECT id FROM study_sessions WHERE id BETWEEN ? AND ? AND ''' + RESET_SESSION_SCOPE + ''')
+''')
+
+register('reset.delete_sessions', '''
+    DELETE FROM study_sessions
+    WHERE id BETWEEN ? AND ?
+    AND ''' + RESET_SESSION_SCOPE)
+
+# Recount word_reviews for a JSON array of word ids from the remaining review
+# items; last_reviewed is NULL for words none are left for
+register('reset.rebuild_word_reviews', '''
+    INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
+    SELECT
+        ids.value,
+        (SELECT COUNT(*) FROM word_review_items WHERE word_id = ids.value AND correct = 1),
+        (SELECT COUNT(*) FROM word_review_items WHERE word_id = ids.value AND correct = 0),
+        (SELECT MAX(created_at) FROM word_review_items WHERE word_id = ids.value)
+    FROM json_each(?) ids
+    WHERE true
+    ON CONFLICT(word_id) DO UPDATE SET
+    correct_count = excluded.correct_count,
+    wrong_count = excluded.wrong_count,
+    last_reviewed = excluded.last_reviewed
+''')
+
+# ---------------------------------------------------------------- analytics
+
+# One chunk of the review log (in id order) as comma separated columns, which
+# lib/analytics.py turns into NumPy arrays far faster than sqlite3 builds a
+# tuple per row. group_concat skips NULLs, so every column must be non-NULL
+# to keep them aligned.
+register('analytics.review_chunk', '''
+    SELECT MAX(id), group_concat(word_id), group_concat(study_session_id), group_concat(correct),
+        group_concat(COALESCE(created_at, '1970-01-01 00:00:00'))
+    FROM (
+        SELECT id, word_id, study_session_id, correct, created_at
+        FROM word_review_items
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    )
+''')
+
+register('analytics.sessions', 'SELECT id, group_id, study_activity_id FROM study_sessions')
+
+register('analytics.clear_word_difficulty', 'DELETE FROM analytics_word_difficulty')
+
+register('analytics.clear_forgetting_curve', 'DELETE FROM analytics_forgetting_curve')
+
+register('analytics.clear_activity_accuracy', 'DELETE FROM analytics_activity_accuracy')
+
+register('analytics.insert_word_difficulty', '''
+    INSERT INTO analytics_word_difficulty (word_id, reviews, correct, accuracy, difficulty, last_reviewed_at)
+    VALUES (?, ?, ?, ?, ?, datetime(?, 'unixepoch'))
+''')
+
+register('analytics.insert_forgetting_curve', '''
+    INSERT INTO analytics_forgetting_curve (bucket, min_seconds, max_seconds, reviews, recalled, recall_rate)
+    VALUES (?, ?, ?, ?, ?, ?)
+''')
+
+register('analytics.insert_activity_accuracy', '''
+    INSERT INTO analytics_activity_accuracy (study_activity_id, group_id, reviews, correct, accuracy)
+    VALUES (?, ?, ?, ?, ?)
+''')
+
+register('analytics.insert_run', 'INSERT INTO analytics_runs (reviews, seconds) VALUES (?, ?)')
+
+register('analytics.latest_run', '''
+    SELECT id, reviews, seconds, computed_at FROM analytics_runs ORDER BY id DESC LIMIT 1
+''')
+
+register_sorted('analytics.words', '''
+    SELECT a.word_id, w.kanji, w.romaji, w.english, a.reviews, a.correct, a.accuracy, a.difficulty, a.last_reviewed_at
+    FROM analytics_word_difficulty a
+    JOIN words w ON w.id = a.word_id
+    ORDER BY {order_by}
+    LIMIT ? OFFSET ?
+''', {
+    'difficulty': 'a.difficulty',
+    'reviews': 'a.reviews'
+})
+
+register('analytics.words_count', 'SELECT COUNT(*) FROM analytics_word_difficulty')
+
+register('analytics.forgetting_curve', '''
+    SELECT bucket, min_seconds, max_seconds, reviews, recalled, recall_rate
+    FROM analytics_forgetting_curve
+    ORDER BY bucket
+''')
+
+register('analytics.activity_accuracy', '''
+    SELECT a.study_activity_id, sa.name AS activity_name, a.group_id, g.name AS group_name,
+        a.reviews, a.correct, a.accuracy
+    FROM analytics_activity_accuracy a
+    LEFT JOIN study_activities sa ON sa.id = a.study_activity_id
+    LEFT JOIN groups g ON g.id = a.group_id
+    ORDER BY a.study_activity_id, a.group_id
+''')
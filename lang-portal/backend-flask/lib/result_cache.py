@@ -0,0 +1,68 @@
+from functools import wraps
+from flask import request, Response
+
+from lib.cache import LRUCache
+
+class ResultCache:
+    """Caches rendered GET responses keyed on (endpoint, view args, query args).
+
+    Each entry records the table_versions of the tables its view reads; a
+    write to any of them (from this or another process) bumps a version and
+    the next lookup rebuilds the entry. Only 200 responses are stored.
+
+        @app.route('/groups')
+        @cross_origin()
+        @app.result_cache.cached('groups')
+        def get_groups(): ...
+    """
+
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESULT_CACHE_SIZE', 512)  # entries
+        app.config.setdefault('RESULT_CACHE_BYTES', 8 * 1024 * 1024)
+
+        self.app = app
+        self.cache = LRUCache(
+            maxsize=app.config['RESULT_CACHE_SIZE'],
+            max_bytes=app.config['RESULT_CACHE_BYTES'],
+            sizeof=lambda entry: len(entry[1])
+        )
+        app.result_cache = self
+
+    def key(self):
+        return (
+            request.endpoint,
+            tuple(sorted(request.view_args.items())),
+            tuple(sorted(request.args.items(multi=True)))
+        )
+
+    def cached(self, *tables):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Read the versions before the view runs, so a concurrent write
+                # leaves the stored entry already out of date rather than wrong
+                versions = self.app.db.table_versions(tables)
+                key = self.key()
+
+                entry = self.cache.get(key, valid=lambda entry: entry[0] == versions)
+                if entry is not None:
+                    _, body, mimetype = entry
+                    return Response(body, mimetype=mimetype)
+
+                response = self.app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    self.cache.set(key, (versions, response.get_data(), response.mimetype))
+                return response
+            return wrapper
+        return decorator
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from lib import queries
+
+def close_idle_sessions(db, idle_seconds):
+    """End sessions without activity for idle_seconds at their last activity; returns how many."""
+    # A dedicated connection, so this can run outside requests and in a prefork master
+    connection = db.connect()
+    try:
+        cursor = connection.execute(queries.get('study_sessions.close_idle'), (f'-{int(idle_seconds)} seconds',))
+        connection.commit()
+        return cursor.rowcount
+    finally:
+        connection.close()
+
+class SessionSweeper:
+    """Periodically closes idle study sessions.
+
+    Either start() a daemon thread, or call run_pending() from an existing
+    loop (serve.py's master does, so prefork workers don't each sweep).
+    """
+
+    def __init__(self, db, idle_seconds=1800, interval=60, logger=None):
+        self.db = db
+        self.idle_seconds = idle_seconds
+        self.interval = interval
+        self.logger = logger
+        self.closed = 0
+        self._next_run = 0
+        self._stop = threading.Event()
+
+    def run_pending(self):
+        if self.interval <= 0 or time.monotonic() < self._next_run:
+            return 0
+        self._next_run = time.monotonic() + self.interval
+        try:
+            closed = close_idle_sessions(self.db, self.idle_seconds)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f'Closing idle sessions failed: {str(e)}')
+            return 0
+        self.closed += closed
+        if closed and self.logger:
+            self.logger.info(f'Closed {closed} idle study sessions')
+        return closed
+
+    def start(self):
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(max(self.interval, 1))
@@ -0,0 +1,77 @@
+import json
+import math
+import time
+
+from lib import queries
+
+def batch_ranges(min_id, max_id, batch_size):
+    if min_id is None:
+        return []
+    return [(start, min(start + batch_size - 1, max_id)) for start in range(min_id, max_id + 1, batch_size)]
+
+def reset_study_history(job, db, group_id=None, start=None, end=None, batch_size=500, pause=0.0):
+    """Delete study sessions (optionally one group's, or those created in [start, end))
+    with their review items and word stats, then recount word_reviews for the affected words.
+
+    Work is split into rowid ranges of batch_size, each its own db.write()
+    transaction so the write lock is only held briefly (and taken up front, so a
+    review committed between a batch's read and delete can't fail it); `pause`
+    seconds are slept between batches.
+
+    The in-scope sessions are closed before the review item range is read, so
+    no review can land above it and be orphaned when its session is deleted.
+    Sessions created after the job started are out of its range and kept.
+    """
+    scope = (group_id, group_id, start, start, end, end)
+    connection = db.connect()
+
+    def execute(name, params=()):
+        return connection.execute(queries.get(name), params)
+
+    try:
+        sessions_range = execute('reset.session_id_range').fetchone()
+        if sessions_range['max_id'] is not None:
+            with db.write(connection):
+                execute('reset.close_sessions', (sessions_range['max_id'],) + scope)
+        items_range = execute('reset.review_item_id_range').fetchone()
+        item_batches = batch_ranges(items_range['min_id'], items_range['max_id'], batch_size)
+        session_batches = batch_ranges(sessions_range['min_id'], sessions_range['max_id'], batch_size)
+        job.update(progress=0, total=len(item_batches) + len(session_batches), message='Deleting review items')
+
+        word_ids = set()
+        deleted_review_items = 0
+        # Bounded by the recorded sessions too, whose ranges the session phase deletes
+        last_session = sessions_range['max_id']
+        for low, high in item_batches:
+            with db.write(connection):
+                word_ids.update(row['word_id'] for row in execute('reset.review_item_word_ids', (low, high, last_session) + scope))
+                deleted_review_items += execute('reset.delete_review_items', (low, high, last_session) + scope).rowcount
+            job.update(progress=job.progress + 1)
+            time.sleep(pause)
+
+        job.update(message='Deleting study sessions')
+        deleted_sessions = 0
+        for low, high in session_batches:
+            with db.write(connection):
+                execute('reset.delete_session_word_stats', (low, high) + scope)
+                deleted_sessions += execute('reset.delete_sessions', (low, high) + scope).rowcount
+            job.update(progress=job.progress + 1)
+            time.sleep(pause)
+
+        # Rebuild the per-word counters from the review items that are left
+        word_ids = sorted(word_ids)
+        job.update(total=job.total + math.ceil(len(word_ids) / batch_size), message='Rebuilding word reviews')
+        for index in range(0, len(word_ids), batch_size):
+            with db.write(connection):
+                execute('reset.rebuild_word_reviews', (json.dumps(word_ids[index:index + batch_size]),))
+            job.update(progress=job.progress + 1)
+            time.sleep(pause)
+
+        job.update(message='Done')
+        return {
+            "deleted_review_items": deleted_review_items,
+            "deleted_sessions": deleted_sessions,
+            "rebuilt_words": len(word_ids)
+        }
+    finally:
+        connection.close()
@@ -0,0 +1,223 @@
+"""Generate production-scale databases for performance work.
+
+Everything derives from one random.Random(seed), so the same scale and seed
+always produce the same database. Review items follow a Zipf distribution
+over the vocabulary (a few words are reviewed constantly, most rarely) and
+are spread over `days` of sessions ending at a fixed date.
+
+With fast=True the indexes and triggers are dropped while the rows are bulk
+inserted and recreated afterwards, and the aggregates the triggers would
+have maintained (words_count, word_reviews, group rollups, change log) are
+rebuilt in one pass each.
+"""
+import itertools
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from lib import queries
+from lib.db import Db, SCHEMA_VERSION, canonical_parts, load_statements, word_key
+
+# words, groups, activities, sessions, review items
+SCALES = {
+    'small': dict(words=1000, groups=20, activities=2, sessions=500, reviews=20000),
+    'medium': dict(words=10000, groups=100, activities=4, sessions=5000, reviews=200000),
+    'large': dict(words=100000, groups=500, activities=8, sessions=50000, reviews=2000000),
+}
+
+# Generated history ends here rather than now, to keep output deterministic
+DEFAULT_UNTIL = datetime(2025, 3, 1)
+
+SYLLABLES = [consonant + vowel for consonant in ['', 'k', 's', 't', 'n', 'h', 'm', 'y', 'r', 'w', 'g', 'z', 'd', 'b', 'p'] for vowel in 'aiueo']
+
+BATCH_SIZE = 10000
+
+def zipf_cum_weights(n, s=1.1):
+    return list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+def chunks(rows, size=BATCH_SIZE):
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def generate_word(rng):
+    syllables = [rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))]
+    characters = [chr(rng.randint(0x4E00, 0x9FA5)) for _ in syllables]
+    english = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 9)))
+    parts = [{"kanji": character, "romaji": [syllable]} for character, syllable in zip(characters, syllables)]
+    kanji, romaji = ''.join(characters), ''.join(syllables)
+    return (kanji, romaji, english, canonical_parts(parts), word_key(kanji, romaji))
+
+def generate_words(rng, count):
+    """`count` words with distinct norm_keys (a colliding draw is redrawn)."""
+    keys = set()
+    while len(keys) < count:
+        word = generate_word(rng)
+        if word[-1] not in keys:
+            keys.add(word[-1])
+            yield word
+
+def drop_indexes_and_triggers(connection):
+    """Drop user indexes and triggers; returns the SQL recreating them."""
+    rows = connection.execute('''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+        ORDER BY type = 'trigger', name
+    ''').fetchall()
+    for kind, name, sql in rows:
+        connection.execute(f'DROP {kind.upper()} {name}')
+    return [sql for kind, name, sql in rows]
+
+def generate(database, words, groups, activities, sessions, reviews, seed=42, days=365,
+             until=DEFAULT_UNTIL, fast=True, log=print):
+    """Write a new database at `database`; returns the row counts and seconds taken."""
+    if os.path.exists(database):
+        raise ValueError(f'{database} already exists')
+
+    rng = random.Random(seed)
+    started = time.monotonic()
+    connection = sqlite3.connect(database, isolation_level=None)
+
+    def step(message):
+        if log:
+            log(f'[{time.monotonic() - started:7.2f}s] {message}')
+
+    try:
+        # Nothing to protect while loading a new file
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+
+        connection.execute('BEGIN')
+        cursor = connection.cursor()
+        Db(database).setup_tables(cursor)
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        recreate = drop_indexes_and_triggers(connection) if fast else []
+
+        step(f'Inserting {words} words')
+        for batch in chunks(generate_words(rng, words)):
+            cursor.executemany(queries.get('words.insert'), batch)
+
+        step(f'Inserting {activities} study activities')
+        # The real activities first, then made up ones
+        seed_activities = Db(database).load_json('seed/study_activities.json')
+        cursor.executemany('INSERT INTO study_activities (name, url, preview_url) VALUES (?, ?, ?)', (
+            [(activity['name'], activity['url'], activity['preview_url']) for activity in seed_activities] + [
+                (f'Activity {number}', 'http://localhost:8082', '/assets/study_activities/typing-tutor.png')
+                for number in range(len(seed_activities) + 1, activities + 1)
+            ]
+        )[:activities])
+
+        # Overlapping membership: every word joins a Zipf-popular group, some join more
+        step(f'Inserting {groups} groups and their members')
+        cursor.executemany('INSERT INTO groups (name) VALUES (?)', [(f'Group {number:04d}',) for number in range(1, groups + 1)])
+        group_weights = zipf_cum_weights(groups, s=0.8)
+        group_ids = list(range(1, groups + 1))
+
+        def memberships():
+            for word_id in range(1, words + 1):
+                extra = 0
+                while extra < 3 and rng.random() < 0.3:
+                    extra += 1
+                for group_id in set(rng.choices(group_ids, cum_weights=group_weights, k=1 + extra)):
+                    yield (word_id, group_id)
+
+        for batch in chunks(memberships()):
+            cursor.executemany('INSERT INTO words_groups (word_id, group_id) VALUES (?, ?)', batch)
+
+        step(f'Inserting {sessions} study sessions')
+        start = until - timedelta(days=days)
+        session_starts = sorted(start + timedelta(seconds=rng.randrange(days * 86400)) for _ in range(sessions))
+        cursor.executemany(
+            'INSERT INTO study_sessions (group_id, study_activity_id, created_at, last_activity_at) VALUES (?, ?, ?, ?)',
+            [(
+                rng.choices(group_ids, cum_weights=group_weights)[0],
+                rng.randint(1, activities),
+                timestamp(session_start),
+                timestamp(session_start)
+            ) for session_start in session_starts]
+        )
+
+        # Zipf over a shuffled vocabulary, so popular words aren't just the lowest ids
+        step(f'Inserting {reviews} review items')
+        word_ranks = list(range(1, words + 1))
+        rng.shuffle(word_ranks)
+        word_weights = zipf_cum_weights(words)
+        difficulty = [rng.random() for _ in range(words + 1)]
+        offsets = [0] * (sessions + 1)
+
+        def review_items():
+            for word_id, session_id in zip(
+                rng.choices(word_ranks, cum_weights=word_weights, k=reviews),
+                (rng.randint(1, sessions) for _ in range(reviews))
+            ):
+                offsets[session_id] += rng.randint(3, 30)
+                reviewed_at = session_starts[session_id - 1] + timedelta(seconds=offsets[session_id])
+                correct = rng.random() > difficulty[word_id] * 0.6
+                yield (word_id, session_id, int(correct), timestamp(reviewed_at))
+
+        for batch in chunks(review_items()):
+            cursor.executemany(
+                'INSERT INTO word_review_items (word_id, study_session_id, correct, created_at) VALUES (?, ?, ?, ?)',
+                batch
+            )
+
+        # Aggregates are computed with one GROUP BY each, which needs no index.
+        # Sessions end at their last review; all generated history is over.
+        step('Computing session end times, word reviews and session word stats')
+        cursor.execute('''
+            UPDATE study_sessions SET last_activity_at = activity.last_review
+            FROM (
+                SELECT study_session_id, MAX(created_at) AS last_review
+                FROM word_review_items
+                GROUP BY study_session_id
+            ) activity
+            WHERE activity.study_session_id = study_sessions.id
+        ''')
+        cursor.execute('UPDATE study_sessions SET ended_at = last_activity_at')
+
+        # Without fast, the triggers maintain the group rollups and change log from here
+        cursor.execute('''
+            INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
+            SELECT word_id, SUM(correct = 1), SUM(correct = 0), MAX(created_at)
+            FROM word_review_items
+            GROUP BY word_id
+        ''')
+        for statement in load_statements('migrations/0013_backfill_session_word_stats.sql'):
+            cursor.execute(statement)
+
+        if fast:
+            step('Recreating indexes and triggers, rebuilding what they maintain')
+            for sql in recreate:
+                cursor.execute(sql)
+            for filepath in ['migrations/0002_recount_group_words.sql', 'migrations/0004_backfill_change_log.sql']:
+                for statement in load_statements(filepath):
+                    cursor.execute(statement)
+            cursor.execute(queries.get('groups.rebuild_rollups'))
+            cursor.execute('''
+                UPDATE study_sessions SET words_count = counts.words
+                FROM (SELECT session_id, COUNT(*) AS words FROM session_word_stats GROUP BY session_id) counts
+                WHERE counts.session_id = study_sessions.id
+            ''')
+
+        connection.execute('COMMIT')
+        step('Done')
+    except Exception:
+        connection.close()
+        os.unlink(database)
+        raise
+
+    counts = {
+        table: connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        for table in ['words', 'groups', 'words_groups', 'study_activities', 'study_sessions', 'word_review_items', 'word_reviews', 'session_word_stats']
+    }
+    connection.close()
+    counts['seconds'] = round(time.monotonic() - started, 2)
+    return counts
@@ -0,0 +1,104 @@
+import hmac
+from flask import request, jsonify
+from flask_cors import cross_origin
+
+from lib import backup
+
+# Jobs queued by admin endpoints; their status needs the admin token too
+ADMIN_JOB_KINDS = ('backup', 'rebuild_group_rollups')
+
+# When ADMIN_TOKEN is configured, admin endpoints need "Authorization: Bearer <token>"
+def unauthorized(app):
+    token = app.config.get('ADMIN_TOKEN')
+    if not token:
+        return None
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if hmac.compare_digest(supplied, token):
+        return None
+    return jsonify({'error': 'Unauthorized'}), 401
+
+def load(app):
+    def run_backup(job, method, compress):
+        return backup.backup(
+            app.config['DATABASE'],
+            app.config['BACKUP_DIR'],
+            method=method,
+            compress=compress,
+            pages=app.config['BACKUP_PAGES'],
+            pause=app.config['BACKUP_PAUSE'],
+            max_restarts=app.config['BACKUP_MAX_RESTARTS'],
+            progress=lambda copied, total: job.update(progress=copied, total=total)
+        )
+
+    def run_rebuild_group_rollups(job):
+        with app.app_context():
+            groups = app.db.rebuild_group_rollups()
+            app.events.publish('write', {'tables': ['groups']})
+            app.db.close()
+        return {'groups': groups}
+
+    app.jobs.register('backup', run_backup)
+    app.jobs.register('rebuild_group_rollups', run_rebuild_group_rollups)
+
+    # Endpoint: POST /api/admin/backup snapshots the database in the background.
+    # Optional JSON body: {"method": "online" | "vacuum", "compress": true}
+    @app.route('/api/admin/backup', methods=['POST'])
+    @cross_origin()
+    def create_backup():
+        error = unauthorized(app)
+        if error:
+            return error
+
+        data = request.get_json(silent=True) or {}
+        method = data.get('method', 'online')
+        if method not in backup.METHODS:
+            return jsonify({'error': f"method must be one of: {', '.join(backup.METHODS)}"}), 400
+        compress = bool(data.get('compress', True))
+
+        job_id = app.jobs.submit('backup', method=method, compress=compress)
+
+        return jsonify({
+            'message': 'Backup started',
+            'job_id': job_id,
+            'status_url': f'/api/admin/backup/{job_id}'
+        }), 202
+
+    # Endpoint: GET /api/admin/backup/:job_id reports backup progress (pages copied)
+    @app.route('/api/admin/backup/<int:job_id>', methods=['GET'])
+    @cross_origin()
+    def get_backup_status(job_id):
+        error = unauthorized(app)
+        if error:
+            return error
+
+        job = app.jobs.get(job_id)
+        if job is None or job['kind'] != 'backup':
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job)
+
+    # Endpoint: GET /api/admin/backups lists the snapshots in BACKUP_DIR
+    @app.route('/api/admin/backups', methods=['GET'])
+    @cross_origin()
+    def list_backups():
+        error = unauthorized(app)
+        if error:
+            return error
+
+        return jsonify({'backups': backup.list_snapshots(app.config['BACKUP_DIR'])})
+
+    # Endpoint: POST /api/admin/rebuild-rollups recomputes the group review rollups
+    # in the background; poll /api/jobs/:job_id
+    @app.route('/api/admin/rebuild-rollups', methods=['POST'])
+    @cross_origin()
+    def rebuild_group_rollups():
+        error = unauthorized(app)
+        if error:
+            return error
+
+        job_id = app.jobs.submit('rebuild_group_rollups')
+
+        return jsonify({
+            'message': 'Rollup rebuild started',
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
@@ -0,0 +1,107 @@
+from flask import request, jsonify
+from flask_cors import cross_origin
+
+from lib import analytics, queries
+
+def load(app):
+    # Summaries are recomputed by a background job, see POST /analytics/refresh
+    def run_refresh(job):
+        connection = app.db.connect()
+        try:
+            return analytics.refresh(connection, progress=lambda message: job.update(message=message))
+        finally:
+            connection.close()
+
+    app.jobs.register('refresh_analytics', run_refresh, max_attempts=1)
+
+    # How current the summaries are (all None before the first refresh)
+    def latest_run():
+        run = app.db.execute('analytics.latest_run').fetchone()
+        return {
+            'computed_at': run['computed_at'] if run else None,
+            'reviews': run['reviews'] if run else None
+        }
+
+    # Endpoint: POST /analytics/refresh recomputes the summaries from the whole
+    # review log in the background; poll /api/jobs/:job_id
+    @app.route('/analytics/refresh', methods=['POST'])
+    @cross_origin()
+    def refresh_analytics():
+        if not analytics.available():
+            return jsonify({'error': 'Analytics needs numpy, install it with: pip install numpy'}), 503
+
+        job_id = app.jobs.submit('refresh_analytics')
+        return jsonify({
+            'message': 'Analytics refresh started',
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
+
+    # Endpoint: GET /analytics/words?page=&per_page=&sort_by=difficulty|reviews&order=
+    # pages through per-word difficulty, hardest first by default
+    @app.route('/analytics/words', methods=['GET'])
+    @cross_origin()
+    def get_word_difficulty():
+        try:
+            page = request.args.get('page', 1, type=int)
+            per_page = min(request.args.get('per_page', 20, type=int), 100)
+            offset = (page - 1) * per_page
+
+            sort_by = request.args.get('sort_by', 'difficulty')
+            order = request.args.get('order', 'desc')
+            if sort_by not in ['difficulty', 'reviews']:
+                sort_by = 'difficulty'
+            if order not in ['asc', 'desc']:
+                order = 'desc'
+
+            words = app.db.execute(queries.sorted_name('analytics.words', sort_by, order), (per_page, offset)).fetchall()
+            total = app.db.execute('analytics.words_count').fetchone()[0]
+
+            return jsonify({
+                **latest_run(),
+                'words': [dict(word) for word in words],
+                'total': total,
+                'page': page,
+                'per_page': per_page,
+                'total_pages': (total + per_page - 1) // per_page
+            })
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    # Endpoint: GET /analytics/forgetting-curve returns recall rates by time since the previous review
+    @app.route('/analytics/forgetting-curve', methods=['GET'])
+    @cross_origin()
+    def get_forgetting_curve():
+        try:
+            buckets = app.db.execute('analytics.forgetting_curve').fetchall()
+            return jsonify({
+                **latest_run(),
+                'buckets': [dict(bucket) for bucket in buckets]
+            })
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    # Endpoint: GET /analytics/activity-accuracy returns the activity x group accuracy
+    # matrix as its axes plus one cell per pair with reviews
+    @app.route('/analytics/activity-accuracy', methods=['GET'])
+    @cross_origin()
+    def get_activity_accuracy():
+        try:
+            cells = app.db.execute('analytics.activity_accuracy').fetchall()
+            activities = {cell['study_activity_id']: cell['activity_name'] for cell in cells}
+            groups = {cell['group_id']: cell['group_name'] for cell in cells}
+
+            return jsonify({
+                **latest_run(),
+                'activities': [{'id': activity_id, 'name': name} for activity_id, name in sorted(activities.items())],
+                'groups': [{'id': group_id, 'name': name} for group_id, name in sorted(groups.items())],
+                'cells': [{
+                    'activity_id': cell['study_activity_id'],
+                    'group_id': cell['group_id'],
+                    'reviews': cell['reviews'],
+                    'correct': cell['correct'],
+                    'accuracy': cell['accuracy']
+                } for cell in cells]
+            })
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
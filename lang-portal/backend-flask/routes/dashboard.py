@@ -1,7 +1,151 @@
-from flask import jsonify, request
+from flask import jsonify, request, Response
 from flask_cors import cross_origin
+import json
+import os
+import queue
+import threading
+
+from lib.events import OVERFLOW
+
+# Events pushed to /dashboard/stream subscribers
+DASHBOARD_EVENTS = ('stats', 'recent-session')
+
+# Seconds between keep-alive comments on an idle stream
+STREAM_KEEPALIVE = 15
+
+# Tables the stats and recent session are computed from
+DASHBOARD_TABLES = ('words', 'groups', 'study_sessions', 'study_activities', 'word_reviews', 'word_review_items')
+
+def compute_recent_session(db):
+    # Get the most recent study session with activity name and results
+    session = db.execute('dashboard.recent_session').fetchone()
+    
+    if not session:
+        return None
+    
+    return {
+        "id": session["id"],
+        "group_id": session["group_id"],
+        "activity_name": session["activity_name"],
+        "created_at": session["created_at"],
+        "correct_count": session["correct_count"] or 0,
+        "wrong_count": session["wrong_count"] or 0
+    }
+
+def compute_stats(db):
+    # Get vocabulary count
+    total_vocabulary = db.execute('words.count').fetchone()['count']
+    
+    # Get group count
+    total_groups = db.execute('groups.count').fetchone()['count']
+    
+    # Get study sessions count
+    total_sessions = db.execute('dashboard.sessions_count').fetchone()['count']
+    
+    # Get word reviews
+    reviews = db.execute('dashboard.review_totals').fetchone()
+    
+    # Calculate success rate
+    correct_count = reviews['correct'] or 0
+    wrong_count = reviews['wrong'] or 0
+    total_reviews = correct_count + wrong_count
+    success_rate = round((correct_count / total_reviews * 100) if total_reviews > 0 else 0, 1)
+    
+    return {
+        "total_vocabulary": total_vocabulary,
+        "total_groups": total_groups,
+        "total_sessions": total_sessions,
+        "correct_reviews": correct_count,
+        "wrong_reviews": wrong_count,
+        "success_rate": success_rate
+    }
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 def load(app):
+    # Last state sent to stream subscribers; deltas are computed against it
+    published = {'stats': None, 'recent-session': None}
+    published_lock = threading.Lock()
+
+    # Runs on the watcher thread below, once per batch of changes, however
+    # many dashboards are connected. Computing, diffing and publishing happen
+    # under one lock, so an older snapshot can never overwrite a newer one.
+    def publish_dashboard_changes():
+        with published_lock:
+            try:
+                stats = compute_stats(app.db)
+                recent_session = compute_recent_session(app.db)
+            except Exception as e:
+                app.logger.error(f'Dashboard refresh failed: {str(e)}')
+                return
+
+            previous_stats = published['stats'] or {}
+            stats_delta = {key: value for key, value in stats.items() if previous_stats.get(key) != value}
+            recent_session_changed = recent_session != published['recent-session']
+            published['stats'] = stats
+            published['recent-session'] = recent_session
+
+            if stats_delta:
+                app.events.publish('stats', stats_delta)
+            if recent_session_changed:
+                app.events.publish('recent-session', recent_session)
+
+    # Full state for a stream whose queue overflowed and lost deltas
+    def current_snapshot():
+        with published_lock:
+            if published['stats'] is None:
+                with app.app_context():
+                    try:
+                        published['stats'] = compute_stats(app.db)
+                        published['recent-session'] = compute_recent_session(app.db)
+                    finally:
+                        app.db.close()
+            return published['stats'], published['recent-session']
+
+    # While streams are open, one thread per process refreshes them when
+    # table_versions changes. It polls, so writes handled by other serve.py
+    # workers reach these streams too, and this process's writes only wake it:
+    # the aggregates never run on a writer's request thread, and a burst of
+    # writes costs one recompute.
+    watcher = {'thread': None, 'pid': None, 'versions': None, 'wake': threading.Event()}
+    watcher_lock = threading.Lock()
+
+    app.events.listen('write', lambda data: watcher['wake'].set())
+
+    def watch_versions():
+        while True:
+            with watcher_lock:
+                if not app.events.subscriber_count:
+                    watcher['thread'] = None
+                    watcher['versions'] = None
+                    with published_lock:
+                        published['stats'] = None
+                    return
+            watcher['wake'].wait(app.config['DASHBOARD_POLL_INTERVAL'])
+            watcher['wake'].clear()
+
+            with app.app_context():
+                try:
+                    # Read before computing: a write landing in between changes them again
+                    versions = app.db.table_versions(DASHBOARD_TABLES)
+                    if versions != watcher['versions']:
+                        watcher['versions'] = versions
+                        publish_dashboard_changes()
+                except Exception as e:
+                    app.logger.error(f'Dashboard version check failed: {str(e)}')
+                finally:
+                    app.db.close()
+
+    def start_watcher():
+        with watcher_lock:
+            # A forked worker inherits the record of the master's thread, not the thread
+            if watcher['thread'] is not None and watcher['pid'] == os.getpid():
+                return
+            watcher['pid'] = os.getpid()
+            watcher['thread'] = threading.Thread(target=watch_versions, name='dashboard-watcher', daemon=True)
+            watcher['thread'].start()
+
     @app.route('/dashboard/recent-session', methods=['GET', 'OPTIONS'])
     @cross_origin()
     def get_recent_session():
@@ -9,38 +153,7 @@ def load(app):
             return '', 200
             
         try:
-            cursor = app.db.cursor()
-            
-            # Get the most recent study session with activity name and results
-            cursor.execute('''
-                SELECT 
-                    ss.id,
-                    ss.group_id,
-                    sa.name as activity_name,
-                    ss.created_at,
-                    COUNT(CASE WHEN wri.correct = 1 THEN 1 END) as correct_count,
-                    COUNT(CASE WHEN wri.correct = 0 THEN 1 END) as wrong_count
-                FROM study_sessions ss
-                JOIN study_activities sa ON ss.study_activity_id = sa.id
-                LEFT JOIN word_review_items wri ON ss.id = wri.study_session_id
-                GROUP BY ss.id
-                ORDER BY ss.created_at DESC
-                LIMIT 1
-            ''')
-            
-            session = cursor.fetchone()
-            
-            if not session:
-                return jsonify(None)
-            
-            return jsonify({
-                "id": session["id"],
-                "group_id": session["group_id"],
-                "activity_name": session["activity_name"],
-                "created_at": session["created_at"],
-                "correct_count": session["correct_count"] or 0,
-                "wrong_count": session["wrong_count"] or 0
-            })
+            return jsonify(compute_recent_session(app.db))
             
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -52,41 +165,51 @@ def load(app):
             return '', 200
             
         try:
-            cursor = app.db.cursor()
-            
-            # Get vocabulary count
-            cursor.execute('SELECT COUNT(*) as count FROM words')
-            total_vocabulary = cursor.fetchone()['count']
-            
-            # Get group count
-            cursor.execute('SELECT COUNT(*) as count FROM groups')
-            total_groups = cursor.fetchone()['count']
-            
-            # Get study sessions count
-            cursor.execute('SELECT COUNT(*) as count FROM study_sessions')
-            total_sessions = cursor.fetchone()['count']
-            
-            # Get word reviews
-            cursor.execute('''
-                SELECT SUM(correct_count) as correct, SUM(wrong_count) as wrong
-                FROM word_reviews
-            ''')
-            reviews = cursor.fetchone()
-            
-            # Calculate success rate
-            correct_count = reviews['correct'] or 0
-            wrong_count = reviews['wrong'] or 0
-            total_reviews = correct_count + wrong_count
-            success_rate = round((correct_count / total_reviews * 100) if total_reviews > 0 else 0, 1)
-            
-            return jsonify({
-                "total_vocabulary": total_vocabulary,
-                "total_groups": total_groups,
-                "total_sessions": total_sessions,
-                "correct_reviews": correct_count,
-                "wrong_reviews": wrong_count,
-                "success_rate": success_rate
-            })
+            return jsonify(compute_stats(app.db))
             
         except Exception as e:
-            return jsonify({"error": str(e)}), 500
\ No newline at end of file
+            return jsonify({"error": str(e)}), 500
+
+    # Server-Sent Events feed: a full snapshot first, then only changed fields
+    @app.route('/dashboard/stream', methods=['GET'])
+    @cross_origin()
+    def stream_dashboard():
+        subscriber = app.events.subscribe(DASHBOARD_EVENTS)
+        try:
+            stats = compute_stats(app.db)
+            recent_session = compute_recent_session(app.db)
+            with published_lock:
+                if published['stats'] is None:
+                    published['stats'] = stats
+                    published['recent-session'] = recent_session
+            start_watcher()
+        except Exception as e:
+            app.events.unsubscribe(subscriber)
+            return jsonify({"error": str(e)}), 500
+        finally:
+            app.db.close()
+
+        def generate():
+            try:
+                yield format_sse('stats', stats)
+                yield format_sse('recent-session', recent_session)
+                while True:
+                    try:
+                        event, data = subscriber.get(timeout=STREAM_KEEPALIVE)
+                    except queue.Empty:
+                        yield ': keep-alive\n\n'
+                        continue
+                    if event == OVERFLOW:
+                        # Later deltas only carry changed fields; start over from a full snapshot
+                        current_stats, current_session = current_snapshot()
+                        yield format_sse('stats', current_stats)
+                        yield format_sse('recent-session', current_session)
+                        continue
+                    yield format_sse(event, data)
+            finally:
+                app.events.unsubscribe(subscriber)
+
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
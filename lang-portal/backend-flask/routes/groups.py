@@ -1,14 +1,111 @@
-from flask import request, jsonify, g
+from flask import request, jsonify, g, Response
 from flask_cors import cross_origin
 import json
 
+from lib import queries
+from lib.db import DatabaseBusy
+from lib.fields import requested_fields, project
+
+# ?fields= whitelists
+GROUP_WORD_FIELDS = list(queries.WORD_COLUMNS)
+GROUP_WORD_RAW_FIELDS = ['id', 'kanji', 'romaji', 'english', 'parts']
+
+def group_rollups(group):
+  """Review progress of a group from its rollup columns."""
+  reviews = group["correct_reviews"] + group["wrong_reviews"]
+  return {
+    "reviewed_words": group["reviewed_words"],
+    "mastered_words": group["mastered_words"],
+    "accuracy": round(group["correct_reviews"] / reviews, 4) if reviews else None
+  }
+
+def group_detail(db, group_id):
+  """GET /groups/<id> payload, or None when the group doesn't exist."""
+  group = db.execute('groups.get', (group_id,)).fetchone()
+  if not group:
+    return None
+
+  return {
+    "id": group["id"],
+    "name": group["name"],
+    "stats": {
+      "total_word_count": group["total_word_count"],
+      **group_rollups(group)
+    }
+  }
+
+def group_words_page(db, group_id, page, sort_by, order, fields):
+  words_per_page = 10
+  offset = (page - 1) * words_per_page
+
+  # Validate sort_by and order
+  valid_columns = ['kanji', 'romaji', 'english', 'correct_count', 'wrong_count']
+  if sort_by not in valid_columns:
+    sort_by = 'kanji'
+  if order not in ['asc', 'desc']:
+    order = 'asc'
+
+  # Query to fetch words for this group, selecting only the requested fields
+  words = db.execute(
+    queries.projected_name('groups.words', fields, sort_by, order),
+    (group_id, words_per_page, offset)
+  ).fetchall()
+
+  # Get total words count for pagination
+  total_words = db.execute('groups.words_count', (group_id,)).fetchone()[0]
+  total_pages = (total_words + words_per_page - 1) // words_per_page
+
+  return {
+    'words': [project(word, fields) for word in words],
+    'total_pages': total_pages,
+    'current_page': page,
+    'total_words': total_words
+  }
+
+def group_sessions_page(db, group_id, page, sort_by, order):
+  sessions_per_page = 10
+  offset = (page - 1) * sessions_per_page
+
+  # Frontend sort keys (startTime, endTime, activityName, groupName,
+  # reviewItemsCount) each have a registered statement; default to startTime
+  valid_columns = ['startTime', 'endTime', 'activityName', 'groupName', 'reviewItemsCount']
+  if sort_by not in valid_columns:
+    sort_by = 'startTime'
+  if order not in ['asc', 'desc']:
+    order = 'desc'
+
+  # Get total count for pagination
+  total_sessions = db.execute('groups.study_sessions_count', (group_id,)).fetchone()[0]
+  total_pages = (total_sessions + sessions_per_page - 1) // sessions_per_page
+
+  # Get study sessions for this group with dynamic calculations
+  sessions = db.execute(
+    queries.sorted_name('groups.study_sessions', sort_by, order),
+    (group_id, sessions_per_page, offset)
+  ).fetchall()
+
+  return {
+    'study_sessions': [{
+      "id": session["id"],
+      "group_id": session["group_id"],
+      "group_name": session["group_name"],
+      "study_activity_id": session["study_activity_id"],
+      "activity_name": session["activity_name"],
+      "start_time": session["start_time"],
+      "end_time": session["end_time"],
+      "active": session["ended_at"] is None,
+      "review_items_count": session["review_count"]
+    } for session in sessions],
+    'total_pages': total_pages,
+    'current_page': page
+  }
+
 def load(app):
   @app.route('/groups', methods=['GET'])
   @cross_origin()
+  @app.result_cache.cached('groups', 'group_rollups')
   def get_groups():
     try:
-      cursor = app.db.cursor()
-
       # Get the current page number from query parameters (default is 1)
       page = int(request.args.get('page', 1))
       groups_per_page = 10
@@ -19,25 +116,20 @@ def load(app):
       order = request.args.get('order', 'asc')  # Default to ascending order
 
       # Validate sort_by and order
-      valid_columns = ['name', 'words_count']
+      valid_columns = ['name', 'words_count', 'mastered_words']
       if sort_by not in valid_columns:
         sort_by = 'name'
       if order not in ['asc', 'desc']:
         order = 'asc'
 
       # Query to fetch groups with sorting and the cached word count
-      cursor.execute(f'''
-        SELECT id, name, words_count
-        FROM groups
-        ORDER BY {sort_by} {order}
-        LIMIT ? OFFSET ?
-      ''', (groups_per_page, offset))
-
-      groups = cursor.fetchall()
+      groups = app.db.execute(
+        queries.sorted_name('groups.list', sort_by, order),
+        (groups_per_page, offset)
+      ).fetchall()
 
       # Query the total number of groups
-      cursor.execute('SELECT COUNT(*) FROM groups')
-      total_groups = cursor.fetchone()[0]
+      total_groups = app.db.execute('groups.count').fetchone()[0]
       total_pages = (total_groups + groups_per_page - 1) // groups_per_page
 
       # Format the response
@@ -46,7 +138,8 @@ def load(app):
         groups_data.append({
           "id": group["id"],
           "group_name": group["name"],
-          "word_count": group["words_count"]
+          "word_count": group["words_count"],
+          **group_rollups(group)
         })
 
       # Return groups and pagination metadata
@@ -62,67 +155,19 @@ def load(app):
   @cross_origin()
   def get_group_words(id):
     try:
-      cursor = app.db.cursor()
-
-      # Get the current page number from query parameters (default is 1)
-      page = int(request.args.get('page', 1))
-      words_per_page = 10
-      offset = (page - 1) * words_per_page
-
-      # Get sorting parameters from the query string
-      sort_by = request.args.get('sort_by', 'kanji')  # Default to sorting by 'kanji'
-      order = request.args.get('order', 'asc')  # Default to ascending order
-
-      # Validate sort_by and order
-      valid_columns = ['kanji', 'romaji', 'english', 'correct_count', 'wrong_count']
-      if sort_by not in valid_columns:
-        sort_by = 'kanji'
-      if order not in ['asc', 'desc']:
-        order = 'asc'
-
-      # Query to fetch words for this group
-      cursor.execute(f'''
-        SELECT w.id, w.kanji, w.romaji, w.english,
-            COALESCE(wr.correct_count, 0) as correct_count,
-            COALESCE(wr.wrong_count, 0) as wrong_count
-        FROM words w
-        JOIN words_groups wg ON w.id = wg.word_id
-        LEFT JOIN word_reviews wr ON w.id = wr.word_id
-        WHERE wg.group_id = ?
-        ORDER BY {sort_by} {order}
-        LIMIT ? OFFSET ?
-      ''', (id, words_per_page, offset))
-      
-      words = cursor.fetchall()
-
-      # Get total words count for pagination
-      cursor.execute('''
-        SELECT COUNT(*) 
-        FROM words_groups 
-        WHERE group_id = ?
-      ''', (id,))
-      total_words = cursor.fetchone()[0]
-      total_pages = (total_words + words_per_page - 1) // words_per_page
-
-      # Format the response
-      words_data = []
-      for word in words:
-        words_data.append({
-          "id": word["id"],
-          "kanji": word["kanji"],
-          "romaji": word["romaji"],
-          "english": word["english"],
-          "correct_count": word["correct_count"],
-          "wrong_count": word["wrong_count"]
-        })
+      try:
+        fields = requested_fields(request.args, GROUP_WORD_FIELDS)
+      except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-      # Return words and pagination metadata
-      return jsonify({
-        'words': words_data,
-        'total_pages': total_pages,
-        'current_page': page,
-        'total_words': total_words
-      })
+      # Default to page 1 sorted by kanji, ascending
+      return jsonify(group_words_page(
+        app.db, id,
+        int(request.args.get('page', 1)),
+        request.args.get('sort_by', 'kanji'),
+        request.args.get('order', 'asc'),
+        fields
+      ))
     except Exception as e:
       return jsonify({"error": str(e)}), 500
     finally:
@@ -132,43 +177,30 @@ def load(app):
   @cross_origin()
   def get_group_words_raw(id):
     try:
-      cursor = app.db.cursor()
-
       # First, check if the group exists
-      cursor.execute('SELECT name FROM groups WHERE id = ?', (id,))
-      group = cursor.fetchone()
+      group = app.db.execute('groups.name', (id,)).fetchone()
       if not group:
         return jsonify({"error": "Group not found"}), 404
 
-      # SQL query to fetch words along with group information
-      cursor.execute('''
-        SELECT g.id as group_id, g.name as group_name, w.*
-        FROM groups g
-        JOIN words_groups wg ON g.id = wg.group_id
-        JOIN words w ON w.id = wg.word_id
-        WHERE g.id = ?;
-      ''', (id,))
-      
-      data = cursor.fetchall()
-      
-      # Format the response
-      result = {
-        "group_id": id,
-        "group_name": data[0]["group_name"] if data else group["name"],
-        "words": []
-      }
-      
-      for row in data:
-        word = {
-          "id": row["id"],
-          "kanji": row["kanji"],
-          "romaji": row["romaji"],
-          "english": row["english"],
-          "parts": json.loads(row["parts"])  # Deserialize 'parts' field
-        }
-        result["words"].append(word)
+      try:
+        fields = requested_fields(request.args, GROUP_WORD_RAW_FIELDS)
+      except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+      # SQL query to fetch the group's words, selecting only the requested fields
+      data = app.db.execute(queries.projected_name('groups.words_raw', fields), (id,)).fetchall()
       
-      return jsonify(result)
+      # words.parts is stored as canonical JSON, so it is spliced into the
+      # body verbatim instead of being decoded and re-encoded per row
+      words_json = ','.join(
+        '{%s}' % ','.join(
+          '"%s":%s' % (field, row[field] if field == 'parts' else json.dumps(row[field]))
+          for field in fields
+        ) for row in data
+      )
+      body = '{"group_id":%d,"group_name":%s,"words":[%s]}' % (id, json.dumps(group["name"]), words_json)
+
+      return Response(body, mimetype='application/json')
     except Exception as e:
       return jsonify({"error": str(e)}), 500
 
@@ -176,117 +208,69 @@ def load(app):
   @cross_origin()
   def get_group_study_sessions(id):
     try:
-      cursor = app.db.cursor()
-      
-      # Get pagination parameters
-      page = int(request.args.get('page', 1))
-      sessions_per_page = 10
-      offset = (page - 1) * sessions_per_page
-
-      # Get sorting parameters
-      sort_by = request.args.get('sort_by', 'created_at')
-      order = request.args.get('order', 'desc')  # Default to newest first
-
-      # Map frontend sort keys to database columns
-      sort_mapping = {
-        'startTime': 'created_at',
-        'endTime': 'last_activity_time',
-        'activityName': 'a.name',
-        'groupName': 'g.name',
-        'reviewItemsCount': 'review_count'
-      }
-
-      # Use mapped sort column or default to created_at
-      sort_column = sort_mapping.get(sort_by, 'created_at')
-
-      # Get total count for pagination
-      cursor.execute('''
-        SELECT COUNT(*)
-        FROM study_sessions
-        WHERE group_id = ?
-      ''', (id,))
-      total_sessions = cursor.fetchone()[0]
-      total_pages = (total_sessions + sessions_per_page - 1) // sessions_per_page
-
-      # Get study sessions for this group with dynamic calculations
-      cursor.execute(f'''
-        SELECT 
-          s.id,
-          s.group_id,
-          s.study_activity_id,
-          s.created_at as start_time,
-          (
-            SELECT MAX(created_at)
-            FROM word_review_items
-            WHERE study_session_id = s.id
-          ) as last_activity_time,
-          a.name as activity_name,
-          g.name as group_name,
-          (
-            SELECT COUNT(*)
-            FROM word_review_items
-            WHERE study_session_id = s.id
-          ) as review_count
-        FROM study_sessions s
-        JOIN study_activities a ON s.study_activity_id = a.id
-        JOIN groups g ON s.group_id = g.id
-        WHERE s.group_id = ?
-        ORDER BY {sort_column} {order}
-        LIMIT ? OFFSET ?
-      ''', (id, sessions_per_page, offset))
-      
-      sessions = cursor.fetchall()
-      sessions_data = []
-      
-      for session in sessions:
-        # If there's no last_activity_time, use start_time + 30 minutes
-        end_time = session["last_activity_time"]
-        if not end_time:
-            end_time = cursor.execute('SELECT datetime(?, "+30 minutes")', (session["start_time"],)).fetchone()[0]
-        
-        sessions_data.append({
-          "id": session["id"],
-          "group_id": session["group_id"],
-          "group_name": session["group_name"],
-          "study_activity_id": session["study_activity_id"],
-          "activity_name": session["activity_name"],
-          "start_time": session["start_time"],
-          "end_time": end_time,
-          "review_items_count": session["review_count"]
-        })
-
-      return jsonify({
-        'study_sessions': sessions_data,
-        'total_pages': total_pages,
-        'current_page': page
-      })
+      # Default to page 1, newest first
+      return jsonify(group_sessions_page(
+        app.db, id,
+        int(request.args.get('page', 1)),
+        request.args.get('sort_by', 'startTime'),
+        request.args.get('order', 'desc')
+      ))
     except Exception as e:
       return jsonify({"error": str(e)}), 500
     
   @app.route('/groups/<int:group_id>', methods=['GET'])
   @cross_origin()
+  @app.result_cache.cached('groups', 'words_groups', 'group_rollups')
   def get_group(group_id):
       try:
-          cursor = app.db.cursor()
-          cursor.execute('''
-              SELECT g.id, g.name, COUNT(wg.word_id) as total_word_count
-              FROM groups g
-              LEFT JOIN words_groups wg ON g.id = wg.group_id
-              WHERE g.id = ?
-              GROUP BY g.id
-          ''', (group_id,))
-          
-          group = cursor.fetchone()
+          group = group_detail(app.db, group_id)
           
           if not group:
               return jsonify({"error": "Group not found"}), 404
           
+          return jsonify(group)
+      except Exception as e:
+          return jsonify({"error": str(e)}), 500
+      finally:
+          app.db.close()
+
+  # Endpoint: GET /groups/:id/overview returns the group page's three payloads
+  # (group, first words page, first sessions page) in one round trip. They
+  # are read in one transaction, so the counts and pages agree with each other.
+  # Query parameters are those of the separate endpoints, prefixed with
+  # words_ or sessions_ (e.g. words_sort_by, sessions_page); fields applies to words.
+  @app.route('/groups/<int:group_id>/overview', methods=['GET'])
+  @cross_origin()
+  def get_group_overview(group_id):
+      try:
+          try:
+              fields = requested_fields(request.args, GROUP_WORD_FIELDS)
+          except ValueError as e:
+              return jsonify({"error": str(e)}), 400
+
+          with app.db.read_transaction():
+              group = group_detail(app.db, group_id)
+              if not group:
+                  return jsonify({"error": "Group not found"}), 404
+
+              words = group_words_page(
+                  app.db, group_id,
+                  int(request.args.get('words_page', 1)),
+                  request.args.get('words_sort_by', 'kanji'),
+                  request.args.get('words_order', 'asc'),
+                  fields
+              )
+              study_sessions = group_sessions_page(
+                  app.db, group_id,
+                  int(request.args.get('sessions_page', 1)),
+                  request.args.get('sessions_sort_by', 'startTime'),
+                  request.args.get('sessions_order', 'desc')
+              )
+
           return jsonify({
-              "id": group["id"],
-              "name": group["name"],
-              "stats": {
-                  "total_word_count": group["total_word_count"]
-              }
+              "group": group,
+              "words": words,
+              "study_sessions": study_sessions
           })
       except Exception as e:
           return jsonify({"error": str(e)}), 500
@@ -297,43 +281,66 @@ def load(app):
   @cross_origin()
   def add_word_to_group(group_id, word_id):
       try:
-          cursor = app.db.cursor()
-          
-          # Check if the group exists
-          cursor.execute('SELECT id FROM groups WHERE id = ?', (group_id,))
-          found_group = cursor.fetchone()
-          if not found_group:
-              return jsonify({"error": "Group not found"}), 404
-          
-          # Check if the word exists
-          cursor.execute('SELECT id FROM words WHERE id = ?', (word_id,))
-          found_word = cursor.fetchone()
-          if not found_word:
-              return jsonify({"error": "Word not found"}), 404
-          
-          # Insert or ignore the group-word relationship
-          cursor.execute('''
-              INSERT OR IGNORE INTO words_groups (group_id, word_id)
-              VALUES (?, ?)
-          ''', (group_id, word_id))
-          app.db.commit()
-          
-          # Recalculate words_count in the groups table
-          cursor.execute('''
-              UPDATE groups
-              SET words_count = (
-                  SELECT COUNT(*) FROM words_groups WHERE group_id = ?
-              )
-              WHERE id = ?
-          ''', (group_id, group_id))
-          app.db.commit()
+          with app.db.write():
+              # Check if the group exists
+              found_group = app.db.execute('groups.exists', (group_id,)).fetchone()
+              if not found_group:
+                  return jsonify({"error": "Group not found"}), 404
+              
+              # Check if the word exists
+              found_word = app.db.execute('words.exists', (word_id,)).fetchone()
+              if not found_word:
+                  return jsonify({"error": "Word not found"}), 404
+              
+              # Insert or ignore the group-word relationship
+              # The words_groups trigger bumps words_count for new memberships
+              app.db.execute('groups.add_word', (group_id, word_id))
+          app.word_cache.invalidate(word_id)
+          app.events.publish('write', {'tables': ['words_groups', 'groups']})
           
           return jsonify({"success": True}), 200
+      except DatabaseBusy:
+          raise
       except Exception as e:
           return jsonify({"error": str(e)}), 500
       finally:
           app.db.close()
           
+  # Endpoint: POST /groups/:id/words to add many words in one transaction
+  @app.route('/groups/<int:group_id>/words', methods=['POST'])
+  @cross_origin()
+  def add_words_to_group(group_id):
+      try:
+          data = request.get_json(silent=True)
+          word_ids = data.get('word_ids') if isinstance(data, dict) else None
+          if not isinstance(word_ids, list) or not all(type(word_id) is int for word_id in word_ids):
+              return jsonify({"error": "word_ids must be a list of integers"}), 400
+
+          with app.db.write():
+              if not app.db.execute('groups.exists', (group_id,)).fetchone():
+                  return jsonify({"error": "Group not found"}), 404
+
+              word_ids_json = json.dumps(word_ids)
+              missing_ids = [row['id'] for row in app.db.execute('words.missing_ids', (word_ids_json,)).fetchall()]
+
+              cursor = app.db.execute('groups.add_words', (group_id, word_ids_json))
+
+          for word_id in word_ids:
+              app.word_cache.invalidate(word_id)
+          app.events.publish('write', {'tables': ['words_groups', 'groups']})
+
+          return jsonify({
+              "success": True,
+              "added": cursor.rowcount,
+              "missing_ids": missing_ids
+          }), 200
+      except DatabaseBusy:
+          raise
+      except Exception as e:
+          return jsonify({"error": str(e)}), 500
+      finally:
+          app.db.close()
+
   @app.route('/groups', methods=['POST'])
   @cross_origin()
   def create_group():
@@ -342,15 +349,14 @@ def load(app):
           if not data or 'name' not in data:
               return jsonify({"error": "Invalid input"}), 400
               
-          cursor = app.db.cursor()
-          cursor.execute(
-              'INSERT INTO groups (name) VALUES (?)',
-              (data['name'],)
-          )
-          app.db.commit()
+          with app.db.write():
+              cursor = app.db.execute('groups.insert', (data['name'],))
+          app.events.publish('write', {'tables': ['groups']})
           group_id = cursor.lastrowid
           
           return jsonify({"id": group_id, "name": data['name']}), 201
+      except DatabaseBusy:
+          raise
       except Exception as e:
           return jsonify({"error": str(e)}), 500
       finally:
@@ -0,0 +1,36 @@
+from flask import request, jsonify
+from flask_cors import cross_origin
+
+from routes.admin import ADMIN_JOB_KINDS, unauthorized
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed')
+
+def load(app):
+    # Endpoint: GET /api/jobs/:id reports any background job's status, progress and result
+    @app.route('/api/jobs/<int:job_id>', methods=['GET'])
+    @cross_origin()
+    def get_job(job_id):
+        job = app.jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+
+        if job['kind'] in ADMIN_JOB_KINDS:
+            error = unauthorized(app)
+            if error:
+                return error
+        return jsonify(job)
+
+    # Endpoint: GET /api/jobs?status=&kind=&limit= lists recent jobs, newest first.
+    # Admin jobs are only listed with the admin token.
+    @app.route('/api/jobs', methods=['GET'])
+    @cross_origin()
+    def list_jobs():
+        status = request.args.get('status')
+        if status is not None and status not in JOB_STATUSES:
+            return jsonify({'error': f"status must be one of: {', '.join(JOB_STATUSES)}"}), 400
+        limit = min(request.args.get('limit', 50, type=int), 500)
+
+        jobs = app.jobs.list(status=status, kind=request.args.get('kind'), limit=limit)
+        if unauthorized(app):
+            jobs = [job for job in jobs if job['kind'] not in ADMIN_JOB_KINDS]
+        return jsonify({'jobs': jobs})
@@ -0,0 +1,17 @@
+from flask import jsonify
+from flask_cors import cross_origin
+
+def load(app):
+    # Endpoint: GET /api/metrics reports in-process cache and write counters
+    @app.route('/api/metrics', methods=['GET'])
+    @cross_origin()
+    def get_metrics():
+        return jsonify({
+            'caches': {
+                'results': app.result_cache.stats(),
+                'words': app.word_cache.stats(),
+                'compression': app.compressor.cache.stats()
+            },
+            'catalog': app.catalog.stats(),
+            'db': app.db.stats()
+        })
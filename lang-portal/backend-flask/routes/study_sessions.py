@@ -3,6 +3,20 @@ from flask_cors import cross_origin
 from datetime import datetime
 import math
 
+from lib import queries
+from lib.db import DatabaseBusy
+from lib.fields import requested_fields, project
+from lib.study_history import reset_study_history
+
+# ?fields= whitelist for the words of a session
+SESSION_WORD_FIELDS = ['id', 'kanji', 'romaji', 'english', 'correct_count', 'wrong_count']
+
+# Normalize an ISO 8601 date/datetime to SQLite's CURRENT_TIMESTAMP format
+def parse_timestamp(value):
+  if value is None:
+    return None
+  return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+
 def load(app):
   # todo /study_sessions POST
 
@@ -14,41 +28,16 @@ def load(app):
         
       if request.method == 'GET':
           try:
-              cursor = app.db.cursor()
-                
               # Get pagination parameters
               page = request.args.get('page', 1, type=int)
               per_page = request.args.get('per_page', 10, type=int)
               offset = (page - 1) * per_page
 
               # Get total count
-              cursor.execute('''
-                    SELECT COUNT(*) as count 
-                    FROM study_sessions ss
-                    JOIN groups g ON g.id = ss.group_id
-                    JOIN study_activities sa ON sa.id = ss.study_activity_id
-                ''')
-              total_count = cursor.fetchone()['count']
+              total_count = app.db.execute('study_sessions.count').fetchone()['count']
 
               # Get paginated sessions
-              cursor.execute('''
-                    SELECT 
-                        ss.id,
-                        ss.group_id,
-                        g.name as group_name,
-                        sa.id as activity_id,
-                        sa.name as activity_name,
-                        ss.created_at,
-                        COUNT(wri.id) as review_items_count
-                    FROM study_sessions ss
-                    JOIN groups g ON g.id = ss.group_id
-                    JOIN study_activities sa ON sa.id = ss.study_activity_id
-                    LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
-                    GROUP BY ss.id
-                    ORDER BY ss.created_at DESC
-                    LIMIT ? OFFSET ?
-                ''', (per_page, offset))
-              sessions = cursor.fetchall()
+              sessions = app.db.execute('study_sessions.list', (per_page, offset)).fetchall()
 
               return jsonify({
                     'items': [{
@@ -58,7 +47,8 @@ def load(app):
                         'activity_id': session['activity_id'],
                         'activity_name': session['activity_name'],
                         'start_time': session['created_at'],
-                        'end_time': session['created_at'],  # For now, just use the same time since we don't track end time
+                        'end_time': session['end_time'],  # ended_at, or the last activity while active
+                        'active': session['ended_at'] is None,
                         'review_items_count': session['review_items_count']
                     } for session in sessions],
                     'total': total_count,
@@ -74,11 +64,13 @@ def load(app):
       if request.method == 'POST':
           try:
                 data = request.get_json()
-                cursor = app.db.cursor()
-                cursor.execute("INSERT INTO study_sessions (group_id, study_activity_id) VALUES (?, ?)", (data['group_id'], data['study_activity_id']))
-                app.db.commit()
+                with app.db.write():
+                      cursor = app.db.execute('study_sessions.insert', (data['group_id'], data['study_activity_id']))
                 session_id = cursor.lastrowid
+                app.events.publish('write', {'tables': ['study_sessions']})
                 return jsonify({'id': session_id}), 201
+          except DatabaseBusy:
+                raise
           except Exception as e:
                 return jsonify({"error": str(e)}), 500
           finally:
@@ -89,27 +81,8 @@ def load(app):
   @cross_origin()
   def get_study_session(id):
     try:
-      cursor = app.db.cursor()
-      
       # Get session details
-      cursor.execute('''
-        SELECT 
-          ss.id,
-          ss.group_id,
-          g.name as group_name,
-          sa.id as activity_id,
-          sa.name as activity_name,
-          ss.created_at,
-          COUNT(wri.id) as review_items_count
-        FROM study_sessions ss
-        JOIN groups g ON g.id = ss.group_id
-        JOIN study_activities sa ON sa.id = ss.study_activity_id
-        LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
-        WHERE ss.id = ?
-        GROUP BY ss.id
-      ''', (id,))
-      
-      session = cursor.fetchone()
+      session = app.db.execute('study_sessions.get', (id,)).fetchone()
       if not session:
         return jsonify({"error": "Study session not found"}), 404
 
@@ -118,31 +91,19 @@ def load(app):
       per_page = request.args.get('per_page', 10, type=int)
       offset = (page - 1) * per_page
 
+      try:
+        fields = requested_fields(request.args, SESSION_WORD_FIELDS)
+      except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
       # Get the words reviewed in this session with their review status
-      cursor.execute('''
-        SELECT 
-          w.*,
-          COALESCE(SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END), 0) as session_correct_count,
-          COALESCE(SUM(CASE WHEN wri.correct = 0 THEN 1 ELSE 0 END), 0) as session_wrong_count
-        FROM words w
-        JOIN word_review_items wri ON wri.word_id = w.id
-        WHERE wri.study_session_id = ?
-        GROUP BY w.id
-        ORDER BY w.kanji
-        LIMIT ? OFFSET ?
-      ''', (id, per_page, offset))
-      
-      words = cursor.fetchall()
+      words = app.db.execute(
+        queries.projected_name('study_sessions.words', fields),
+        (id, per_page, offset)
+      ).fetchall()
 
       # Get total count of words
-      cursor.execute('''
-        SELECT COUNT(DISTINCT w.id) as count
-        FROM words w
-        JOIN word_review_items wri ON wri.word_id = w.id
-        WHERE wri.study_session_id = ?
-      ''', (id,))
-      
-      total_count = cursor.fetchone()['count']
+      total_count = app.db.execute('study_sessions.words_count', (id,)).fetchone()['count']
 
       return jsonify({
         'session': {
@@ -152,17 +113,11 @@ def load(app):
           'activity_id': session['activity_id'],
           'activity_name': session['activity_name'],
           'start_time': session['created_at'],
-          'end_time': session['created_at'],  # For now, just use the same time
+          'end_time': session['end_time'],  # ended_at, or the last activity while active
+          'active': session['ended_at'] is None,
           'review_items_count': session['review_items_count']
         },
-        'words': [{
-          'id': word['id'],
-          'kanji': word['kanji'],
-          'romaji': word['romaji'],
-          'english': word['english'],
-          'correct_count': word['session_correct_count'],
-          'wrong_count': word['session_wrong_count']
-        } for word in words],
+        'words': [project(word, fields) for word in words],
         'total': total_count,
         'page': page,
         'per_page': per_page,
@@ -173,23 +128,95 @@ def load(app):
 
   # todo POST /study_sessions/:id/review
 
+  # Queued by POST /api/study-sessions/reset; a retry deletes whatever the failed attempt left
+  def run_reset(job, group_id=None, start=None, end=None):
+    result = reset_study_history(
+      job,
+      app.db,
+      group_id=group_id,
+      start=start,
+      end=end,
+      batch_size=app.config['RESET_BATCH_SIZE'],
+      pause=app.config['RESET_BATCH_PAUSE']
+    )
+    with app.app_context():
+      app.word_cache.clear()
+      app.events.publish('write', {'tables': ['word_review_items', 'study_sessions', 'word_reviews', 'session_word_stats']})
+      app.db.close()
+    return result
+
+  app.jobs.register('reset_study_history', run_reset)
+
+  # Endpoint: POST /api/study-sessions/reset clears study history in the background.
+  # Optional JSON body: {"group_id": 1, "start_date": "2025-01-01", "end_date": "2025-02-01"}
   @app.route('/api/study-sessions/reset', methods=['POST'])
   @cross_origin()
   def reset_study_sessions():
     try:
-      cursor = app.db.cursor()
-      
-      # First delete all word review items since they have foreign key constraints
-      cursor.execute('DELETE FROM word_review_items')
-      
-      # Then delete all study sessions
-      cursor.execute('DELETE FROM study_sessions')
-      
-      app.db.commit()
-      
-      return jsonify({"message": "Study history cleared successfully"}), 200
+      data = request.get_json(silent=True) or {}
+
+      group_id = data.get('group_id')
+      if group_id is not None and type(group_id) is not int:
+        return jsonify({"error": "group_id must be an integer"}), 400
+
+      try:
+        start = parse_timestamp(data.get('start_date'))
+        end = parse_timestamp(data.get('end_date'))
+      except ValueError:
+        return jsonify({"error": "start_date and end_date must be ISO 8601 dates"}), 400
+
+      job_id = app.jobs.submit('reset_study_history', group_id=group_id, start=start, end=end)
+
+      return jsonify({
+        "message": "Study history reset started",
+        "job_id": job_id,
+        "status_url": f"/api/study-sessions/reset/{job_id}"
+      }), 202
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /api/study-sessions/reset/:job_id reports reset progress
+  @app.route('/api/study-sessions/reset/<int:job_id>', methods=['GET'])
+  @cross_origin()
+  def get_reset_status(job_id):
+    job = app.jobs.get(job_id)
+    if job is None or job['kind'] != 'reset_study_history':
+      return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+  # Endpoint: POST /api/study-sessions/:id/close ends a session (repeated calls keep the first end time)
+  @app.route('/api/study-sessions/<int:session_id>/close', methods=['POST'])
+  @cross_origin()
+  def close_study_session(session_id):
+    try:
+      with app.db.write():
+        closed = app.db.execute('study_sessions.close', (session_id,)).rowcount
+        session = app.db.execute('study_sessions.state', (session_id,)).fetchone()
+      if not session:
+        return jsonify({"error": "Study session not found"}), 404
+
+      if closed:
+        app.events.publish('write', {'tables': ['study_sessions']})
+      return jsonify({"id": session['id'], "ended_at": session['ended_at']})
+    except DatabaseBusy:
+      raise
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+    finally:
+      app.db.close()
+
+  # Endpoint: GET /api/study-sessions/active lists open sessions, most recently active first
+  @app.route('/api/study-sessions/active', methods=['GET'])
+  @cross_origin()
+  def get_active_study_sessions():
+    try:
+      limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+      sessions = app.db.execute('study_sessions.active', (limit,)).fetchall()
+      return jsonify({'items': [dict(session) for session in sessions]})
     except Exception as e:
       return jsonify({"error": str(e)}), 500
+    finally:
+      app.db.close()
     
   # # Endpoint: POST /study-sessions to create a new study session
   # @app.route('/api/study-sessions', methods=['POST'])
@@ -216,36 +243,48 @@ def load(app):
           if not data or not all(k in data for k in ('word_id', 'correct')):
               return jsonify({"error": "Invalid input"}), 400
           
-          cursor = app.db.cursor()
-          
-          # Insert review item
-          cursor.execute(
-              "INSERT INTO word_review_items (study_session_id, word_id, correct) VALUES (?, ?, ?)",
-              (session_id, data['word_id'], 1 if data['correct'] else 0)
-          )
-          
-          # Update word_reviews
-          cursor.execute('''
-              INSERT INTO word_reviews (word_id, correct_count, wrong_count)
-              VALUES (?, ?, ?)
-              ON CONFLICT(word_id) DO UPDATE SET
-              correct_count = correct_count + ?,
-              wrong_count = wrong_count + ?
-          ''', (
-              data['word_id'],
-              1 if data['correct'] else 0,
-              0 if data['correct'] else 1,
-              1 if data['correct'] else 0,
-              0 if data['correct'] else 1
-          ))
+          with app.db.write():
+              # Bump the session's last activity, reopening it if the idle sweeper ended it;
+              # sessions closed through /close or missing ones take no reviews
+              if app.db.execute('study_sessions.touch', (session_id,)).rowcount == 0:
+                  session = app.db.execute('study_sessions.state', (session_id,)).fetchone()
+                  if not session:
+                      return jsonify({"error": "Study session not found"}), 404
+                  return jsonify({"error": "Study session is closed"}), 409
+
+              # Insert review item
+              app.db.execute(
+                  'word_review_items.insert',
+                  (session_id, data['word_id'], 1 if data['correct'] else 0)
+              )
+              
+              # Update word_reviews
+              app.db.execute('word_reviews.upsert', (
+                  data['word_id'],
+                  1 if data['correct'] else 0,
+                  0 if data['correct'] else 1,
+                  1 if data['correct'] else 0,
+                  0 if data['correct'] else 1
+              ))
+
+              # Update the session's word list entry
+              app.db.execute('session_word_stats.upsert', (
+                  session_id,
+                  1 if data['correct'] else 0,
+                  0 if data['correct'] else 1,
+                  data['word_id']
+              ))
           
-          app.db.commit()
+          app.word_cache.invalidate(data['word_id'])
+          app.events.publish('write', {'tables': ['word_review_items', 'word_reviews', 'study_sessions', 'session_word_stats']})
           return jsonify({
               "success": True,
               "word_id": data['word_id'],
               "study_session_id": session_id,
               "correct": data['correct']
           }), 201
+      except DatabaseBusy:
+          raise
       except Exception as e:
           return jsonify({"error": str(e)}), 500
       finally:
@@ -0,0 +1,71 @@
+from flask import request, jsonify
+from flask_cors import cross_origin
+import json
+
+# Most change log entries returned by one GET /api/sync page
+MAX_SYNC_LIMIT = 5000
+
+SYNC_TABLES = ['words', 'groups', 'words_groups', 'word_reviews']
+
+def parse_row_key(table_name, row_key):
+    if table_name == 'words_groups':
+        return [int(key) for key in row_key.split(':')]
+    return int(row_key)
+
+def fetch_rows(db, table_name, keys):
+    rows = db.execute('sync.' + table_name, (json.dumps(keys),)).fetchall()
+    if table_name == 'words':
+        return [{
+            "id": row["id"],
+            "kanji": row["kanji"],
+            "romaji": row["romaji"],
+            "english": row["english"],
+            "parts": json.loads(row["parts"])
+        } for row in rows]
+    return [dict(row) for row in rows]
+
+def row_identity(table_name, row):
+    if table_name == 'words_groups':
+        return [row['word_id'], row['group_id']]
+    if table_name == 'word_reviews':
+        return row['word_id']
+    return row['id']
+
+def load(app):
+  # Endpoint: GET /api/sync?since=<version> returns rows changed after a version
+  @app.route('/api/sync', methods=['GET'])
+  @cross_origin()
+  def sync():
+    try:
+      since = request.args.get('since', 0, type=int)
+      limit = min(max(request.args.get('limit', 1000, type=int), 1), MAX_SYNC_LIMIT)
+
+      changes = app.db.execute('sync.changes', (since, limit)).fetchall()
+
+      keys = {table_name: [] for table_name in SYNC_TABLES}
+      for change in changes:
+        keys[change['table_name']].append(parse_row_key(change['table_name'], change['row_key']))
+
+      upserts = {}
+      deleted = {}
+      for table_name in SYNC_TABLES:
+        rows = fetch_rows(app.db, table_name, keys[table_name]) if keys[table_name] else []
+        upserts[table_name] = rows
+
+        # Rows in the log that no longer exist are reported as tombstones
+        present = {json.dumps(row_identity(table_name, row)) for row in rows}
+        deleted[table_name] = [key for key in keys[table_name] if json.dumps(key) not in present]
+
+      version = changes[-1]['version'] if changes else since
+
+      return jsonify({
+        "since": since,
+        "version": version,
+        "has_more": len(changes) == limit,
+        "changes": upserts,
+        "deleted": deleted
+      })
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+    finally:
+      app.db.close()
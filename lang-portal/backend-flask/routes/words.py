@@ -1,6 +1,65 @@
 from flask import request, jsonify, g
 from flask_cors import cross_origin
 import json
+import sqlite3
+
+from lib import queries
+from lib.db import DatabaseBusy, canonical_parts, word_key
+from lib.fields import requested_fields, project
+
+# Upper bound on ids accepted by the batch lookup (GET /words?ids=...)
+MAX_BATCH_IDS = 200
+
+# Default and maximum number of suggestions from GET /words/complete
+COMPLETE_LIMIT = 10
+MAX_COMPLETE_LIMIT = 50
+
+# ?fields= whitelists
+WORD_LIST_FIELDS = list(queries.WORD_COLUMNS)
+WORD_DETAIL_FIELDS = WORD_LIST_FIELDS + ['groups']
+
+# Tables a word detail payload is built from, besides its word_reviews row.
+# Cached payloads carry a marker and are only served while it is current, so
+# writes in other worker processes invalidate them too (invalidate() only
+# reaches this one). Reviews move the word's own change_log entry rather than
+# a table version, so reviewing one word leaves the other entries valid.
+WORD_TABLES = ('words', 'words_groups', 'groups')
+
+def word_markers(db, word_ids):
+  """Return {word_id: (table versions, version of the word's word_reviews change)}."""
+  versions = db.table_versions(WORD_TABLES)
+  reviews = dict(db.execute('words.review_versions', (json.dumps(list(word_ids)),)).fetchall())
+  return {word_id: (versions, reviews.get(word_id)) for word_id in word_ids}
+
+def cached_word(cache, word_id, marker):
+  entry = cache.get(word_id, valid=lambda entry: entry[0] == marker)
+  return entry[1] if entry is not None else None
+
+def fetch_word_details(db, word_ids):
+  """Return {word_id: word detail payload} for the given ids using two queries."""
+  ids_json = json.dumps(list(word_ids))
+
+  words = {}
+  for row in db.execute('words.details_by_ids', (ids_json,)).fetchall():
+    words[row["id"]] = {
+      "id": row["id"],
+      "kanji": row["kanji"],
+      "romaji": row["romaji"],
+      "english": row["english"],
+      "correct_count": row["correct_count"],
+      "wrong_count": row["wrong_count"],
+      "groups": []
+    }
+
+  if words:
+    # Group membership is fetched as rows rather than a GROUP_CONCAT string
+    for row in db.execute('words.groups_by_word_ids', (ids_json,)).fetchall():
+      words[row["word_id"]]["groups"].append({
+        "id": row["id"],
+        "name": row["name"]
+      })
+
+  return words
 
 def load(app):
   # Endpoint: GET /words with pagination (10 words per page)
@@ -8,7 +67,8 @@ def load(app):
   @cross_origin()
   def get_words():
     try:
-      cursor = app.db.cursor()
+      if 'ids' in request.args:
+        return get_words_batch()
 
       # Get the current page number from query parameters (default is 1)
       page = int(request.args.get('page', 1))
@@ -28,38 +88,23 @@ def load(app):
       if order not in ['asc', 'desc']:
         order = 'asc'
 
-      # Query to fetch words with sorting
-      cursor.execute(f'''
-        SELECT w.id, w.kanji, w.romaji, w.english, 
-            COALESCE(r.correct_count, 0) AS correct_count,
-            COALESCE(r.wrong_count, 0) AS wrong_count
-        FROM words w
-        LEFT JOIN word_reviews r ON w.id = r.word_id
-        ORDER BY {sort_by} {order}
-        LIMIT ? OFFSET ?
-      ''', (words_per_page, offset))
+      try:
+        fields = requested_fields(request.args, WORD_LIST_FIELDS)
+      except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-      words = cursor.fetchall()
+      # Query to fetch words with sorting, selecting only the requested fields
+      words = app.db.execute(
+        queries.projected_name('words.list', fields, sort_by, order),
+        (words_per_page, offset)
+      ).fetchall()
 
       # Query the total number of words
-      cursor.execute('SELECT COUNT(*) FROM words')
-      total_words = cursor.fetchone()[0]
+      total_words = app.db.execute('words.count').fetchone()[0]
       total_pages = (total_words + words_per_page - 1) // words_per_page
 
-      # Format the response
-      words_data = []
-      for word in words:
-        words_data.append({
-          "id": word["id"],
-          "kanji": word["kanji"],
-          "romaji": word["romaji"],
-          "english": word["english"],
-          "correct_count": word["correct_count"],
-          "wrong_count": word["wrong_count"]
-        })
-
       return jsonify({
-        "words": words_data,
+        "words": [project(word, fields) for word in words],
         "total_pages": total_pages,
         "current_page": page,
         "total_words": total_words
@@ -70,58 +115,87 @@ def load(app):
     finally:
       app.db.close()
 
+  # Endpoint: GET /words/complete?prefix=<text>&limit=<n> for type-ahead lookups
+  @app.route('/words/complete', methods=['GET'])
+  @cross_origin()
+  def complete_words():
+    prefix = request.args.get('prefix', '')
+    if not prefix.strip():
+      return jsonify({"error": "prefix is required"}), 400
+    limit = min(max(request.args.get('limit', COMPLETE_LIMIT, type=int), 1), MAX_COMPLETE_LIMIT)
+
+    try:
+      app.word_index.refresh(app.db)
+      return jsonify({
+        "prefix": prefix,
+        "words": app.word_index.complete(prefix, limit)
+      })
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+    finally:
+      app.db.close()
+
   # Endpoint: GET /words/:id to get a single word with its details
   @app.route('/words/<int:word_id>', methods=['GET'])
   @cross_origin()
   def get_word(word_id):
       try:
-          cursor = app.db.cursor()
-          
-          # Query to fetch the word and its details
-          cursor.execute('''
-              SELECT w.id, w.kanji, w.romaji, w.english,
-                  COALESCE(r.correct_count, 0) AS correct_count,
-                  COALESCE(r.wrong_count, 0) AS wrong_count,
-                  GROUP_CONCAT(DISTINCT g.id || '::' || g.name) as groups
-              FROM words w
-              LEFT JOIN word_reviews r ON w.id = r.word_id
-              LEFT JOIN words_groups wg ON w.id = wg.word_id
-              LEFT JOIN groups g ON wg.group_id = g.id
-              WHERE w.id = ?
-              GROUP BY w.id
-          ''', (word_id,))
-          
-          word = cursor.fetchone()
-          
-          if not word:
-              return jsonify({"error": "Word not found"}), 404
-          
-          # Parse the groups string into a list of group objects
-          groups = []
-          if word["groups"]:
-              for group_str in word["groups"].split(','):
-                  group_id, group_name = group_str.split('::')
-                  groups.append({
-                      "id": int(group_id),
-                      "name": group_name
-                  })
-          
-          return jsonify({
-              "word": {
-                  "id": word["id"],
-                  "kanji": word["kanji"],
-                  "romaji": word["romaji"],
-                  "english": word["english"],
-                  "correct_count": word["correct_count"],
-                  "wrong_count": word["wrong_count"],
-                  "groups": groups
-              }
-          })
+          fields = requested_fields(request.args, WORD_DETAIL_FIELDS)
+      except ValueError as e:
+          return jsonify({"error": str(e)}), 400
+
+      try:
+          # Read before the payload, so a concurrent write leaves the entry out of date rather than wrong
+          marker = word_markers(app.db, [word_id])[word_id]
+          word = cached_word(app.word_cache, word_id, marker)
+          if word is None:
+              word = fetch_word_details(app.db, [word_id]).get(word_id)
+              if not word:
+                  return jsonify({"error": "Word not found"}), 404
+              app.word_cache.set(word_id, (marker, word))
+
+          return jsonify({"word": project(word, fields)})
       except Exception as e:
           return jsonify({"error": str(e)}), 500
       finally:
           app.db.close()
-      
+
+  # GET /words?ids=1,2,3 resolves many word detail payloads in one request
+  def get_words_batch():
+      try:
+          word_ids = [int(word_id) for word_id in request.args['ids'].split(',') if word_id.strip()]
+      except ValueError:
+          return jsonify({"error": "ids must be a comma separated list of integers"}), 400
+
+      if len(word_ids) > MAX_BATCH_IDS:
+          return jsonify({"error": f"At most {MAX_BATCH_IDS} ids can be requested at once"}), 400
+
+      try:
+          fields = requested_fields(request.args, WORD_DETAIL_FIELDS)
+      except ValueError as e:
+          return jsonify({"error": str(e)}), 400
+
+      markers = word_markers(app.db, word_ids)
+      words = {}
+      missing_ids = []
+      for word_id in word_ids:
+        word = cached_word(app.word_cache, word_id, markers[word_id])
+        if word is None:
+          missing_ids.append(word_id)
+        else:
+          words[word_id] = word
+
+      if missing_ids:
+        fetched = fetch_word_details(app.db, missing_ids)
+        for word_id, word in fetched.items():
+          app.word_cache.set(word_id, (markers[word_id], word))
+        words.update(fetched)
+
+      return jsonify({
+        "words": [project(words[word_id], fields) for word_id in dict.fromkeys(word_ids) if word_id in words],
+        "missing_ids": [word_id for word_id in dict.fromkeys(word_ids) if word_id not in words]
+      })
+
   # Endpoint: POST /words to add a new word
   @app.route('/words', methods=['POST'])
   @cross_origin()
@@ -131,17 +205,35 @@ def load(app):
           if not data or not all(k in data for k in ('kanji', 'romaji', 'english')):
               return jsonify({"error": "Invalid input"}), 400
           
-          parts = data.get('parts', '[]')  # Provide a default empty list if parts is not provided
+          # Provide a default empty list if parts is not provided
+          try:
+              parts = canonical_parts(data.get('parts', []))
+          except ValueError:
+              return jsonify({"error": "parts must be a JSON array"}), 400
           
-          cursor = app.db.cursor()
-          cursor.execute(
-              "INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)",
-              (data['kanji'], data['romaji'], data['english'], parts)
-          )
-          app.db.commit()
+          key = word_key(data['kanji'], data['romaji'])
+          with app.db.write():
+              # A word with the same normalized kanji and romaji already exists
+              existing = app.db.execute('words.id_by_key', (key,)).fetchone()
+              if existing:
+                  return jsonify({"error": "Word already exists", "id": existing['id']}), 409
+
+              try:
+                  cursor = app.db.execute(
+                      'words.insert',
+                      (data['kanji'], data['romaji'], data['english'], parts, key)
+                  )
+              except sqlite3.IntegrityError:
+                  # Created by a concurrent request since the check
+                  existing = app.db.execute('words.id_by_key', (key,)).fetchone()
+                  return jsonify({"error": "Word already exists", "id": existing['id']}), 409
           word_id = cursor.lastrowid
+          app.word_cache.invalidate(word_id)
+          app.events.publish('write', {'tables': ['words']})
           
           return jsonify({"id": word_id}), 201
+      except DatabaseBusy:
+          raise
       except Exception as e:
           return jsonify({"error": str(e)}), 500
       finally:
@@ -0,0 +1,230 @@
+"""Prefork production server.
+
+The master process builds the app once (schema setup, migrations and query
+validation run a single time), binds the listening socket and forks workers
+sharing it. Each worker opens its own SQLite connections after the fork,
+warms their statement caches and the hot read endpoints, then serves
+requests with a threaded WSGI server.
+
+Workers share nothing but the database. Per-process state that must follow
+other workers' writes (the word and result caches, the activity catalog,
+dashboard streams) is checked against table_versions, not just app.events.
+
+    python serve.py --workers 4 --port 5000
+
+Signals sent to the master:
+    SIGHUP           reload: start fresh workers, then gracefully stop the old ones
+    SIGTERM, SIGINT  graceful shutdown
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from app import create_app
+from lib import queries
+
+# Read endpoints requested by every worker before it accepts traffic
+WARM_PATHS = [
+    '/api/study-activities',
+    '/groups',
+    '/groups/1/overview',
+    '/dashboard/stats',
+    '/words/complete?prefix=a',  # builds the prefix index
+]
+
+log = logging.getLogger('serve')
+
+def warm_statements(db):
+    """Prepare every read statement of the query registry on the pooled connections.
+
+    sqlite3 keeps a statement in the connection's cache once it has been
+    prepared, so running each SELECT once (with NULL parameters, matching no
+    rows) is enough. Returns the number of statements warmed per connection.
+    """
+    connections = [db.acquire() for _ in range(db.pool_size)]
+    warmed = 0
+    try:
+        for connection in connections:
+            warmed = 0
+            for name, sql in queries.QUERIES.items():
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                try:
+                    connection.execute(sql, (None,) * sql.count('?')).fetchall()
+                except Exception:
+                    # Still prepared and cached even if stepping it failed
+                    pass
+                warmed += 1
+    finally:
+        for connection in connections:
+            db.release(connection)
+    return warmed
+
+def warm_endpoints(app, paths=WARM_PATHS):
+    client = app.test_client()
+    for path in paths:
+        response = client.get(path)
+        if response.status_code != 200:
+            log.warning(f'Warm-up request {path} returned {response.status_code}')
+
+def bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(app, sock, host, port, graceful_timeout):
+    # Workers inherit the master's handlers; they only react to SIGTERM
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    warmed = warm_statements(app.db)
+    warm_endpoints(app)
+    log.info(f'Worker {os.getpid()} ready ({warmed} statements warmed)')
+
+    # Every worker claims background jobs, so queued ones survive a worker restart
+    app.jobs.start()
+
+    server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+    # Let shutdown() wait for in-flight requests instead of abandoning them
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stopping.wait()
+
+    # Stop accepting, then give in-flight requests graceful_timeout seconds
+    closer = threading.Thread(target=server.shutdown, daemon=True)
+    closer.start()
+    closer.join(graceful_timeout)
+    app.jobs.stop(graceful_timeout)
+    app.db.close_pool()
+    os._exit(0)
+
+class Master:
+    def __init__(self, host, port, workers, graceful_timeout):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.sock = None
+        self.app = None
+        self.children = {}  # pid -> app generation
+        self.generation = 0
+        self.pending = []
+        self.stopping = False
+
+    def load_app(self):
+        app = create_app()
+        # Connections opened by the master must not leak into the workers
+        app.db.close_pool()
+        self.app = app
+        self.generation += 1
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(self.app, self.sock, self.host, self.port, self.graceful_timeout)
+            except Exception:
+                log.exception('Worker crashed')
+            finally:
+                os._exit(1)
+        self.children[pid] = self.generation
+        return pid
+
+    def stop_workers(self, generation=None):
+        for pid, worker_generation in list(self.children.items()):
+            if generation is None or worker_generation == generation:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    self.children.pop(pid, None)
+
+    def reload(self):
+        old_generation = self.generation
+        try:
+            self.load_app()
+        except Exception:
+            log.exception('Reload failed, keeping the current workers')
+            return
+        for _ in range(self.workers):
+            self.spawn()
+        self.stop_workers(old_generation)
+        log.info(f'Reloaded, now serving generation {self.generation}')
+
+    def reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            generation = self.children.pop(pid, None)
+            # Replace workers of the current generation that died unexpectedly
+            if generation == self.generation and not self.stopping:
+                log.warning(f'Worker {pid} exited with status {status}, respawning')
+                self.spawn()
+
+    def run(self):
+        self.load_app()
+        self.sock = bind_socket(self.host, self.port)
+
+        def handle(signum, frame):
+            self.pending.append(signum)
+
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, handle)
+
+        for _ in range(self.workers):
+            self.spawn()
+        log.info(f'Listening on http://{self.host}:{self.port} with {self.workers} workers')
+
+        while True:
+            while self.pending:
+                signum = self.pending.pop(0)
+                if signum == signal.SIGHUP and not self.stopping:
+                    self.reload()
+                elif signum in (signal.SIGTERM, signal.SIGINT) and not self.stopping:
+                    self.stopping = True
+                    self.stop_workers()
+            self.reap()
+            if self.stopping and not self.children:
+                break
+            # One sweeper for all workers, on its own connection
+            if not self.stopping:
+                self.app.session_sweeper.run_pending()
+            time.sleep(0.2)
+
+        self.sock.close()
+        log.info('Shut down')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the API with a prefork server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--graceful-timeout', type=float, default=30.0,
+                        help='seconds a stopping worker waits for in-flight requests')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='[%(process)d] %(levelname)s %(message)s')
+    Master(args.host, args.port, args.workers, args.graceful_timeout).run()
+
+if __name__ == '__main__':
+    sys.exit(main())
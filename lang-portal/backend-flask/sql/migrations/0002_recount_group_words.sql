@@ -0,0 +1,5 @@
+-- Counters were recomputed by the application before the words_groups triggers existed
+UPDATE groups
+SET words_count = (
+  SELECT COUNT(*) FROM words_groups WHERE group_id = groups.id
+);
@@ -0,0 +1,3 @@
+-- words.parts is spliced into responses verbatim, so it must be valid, minified JSON
+UPDATE words
+SET parts = CASE WHEN json_valid(parts) THEN json(parts) ELSE '[]' END;
@@ -0,0 +1,9 @@
+-- Existing rows enter the change log once so a sync from version 0 returns everything
+INSERT OR REPLACE INTO change_log (table_name, row_key)
+SELECT 'words', CAST(id AS TEXT) FROM words
+UNION ALL
+SELECT 'groups', CAST(id AS TEXT) FROM groups
+UNION ALL
+SELECT 'words_groups', word_id || ':' || group_id FROM words_groups
+UNION ALL
+SELECT 'word_reviews', CAST(word_id AS TEXT) FROM word_reviews;
@@ -0,0 +1,7 @@
+-- Sessions created before last_activity_at existed: their last review, or their start
+UPDATE study_sessions
+SET last_activity_at = COALESCE(
+  (SELECT MAX(created_at) FROM word_review_items WHERE study_session_id = study_sessions.id),
+  created_at
+)
+WHERE last_activity_at IS NULL;
@@ -0,0 +1,2 @@
+-- Recreated by setup/create_change_log.sql, limited to the synced columns
+DROP TRIGGER IF EXISTS words_change_log_update;
@@ -0,0 +1,7 @@
+-- Build the per-session word stats from the review log; the insert trigger
+-- counts each session's words into study_sessions.words_count
+INSERT INTO session_word_stats (session_id, word_id, kanji, correct, wrong)
+SELECT wri.study_session_id, wri.word_id, w.kanji, SUM(wri.correct = 1), SUM(wri.correct = 0)
+FROM word_review_items wri
+JOIN words w ON w.id = wri.word_id
+GROUP BY wri.study_session_id, wri.word_id;
@@ -0,0 +1,4 @@
+-- Recreated by setup/create_table_versions.sql and setup/create_change_log.sql,
+-- limited to name and words_count
+DROP TRIGGER IF EXISTS groups_version_update;
+DROP TRIGGER IF EXISTS groups_change_log_update;
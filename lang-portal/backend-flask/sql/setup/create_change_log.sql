@@ -0,0 +1,82 @@
+-- One row per changed row (or tombstone) for incremental client sync;
+-- version is the rowid, so "changes since N" is a primary key range scan
+CREATE TABLE IF NOT EXISTS change_log (
+  version INTEGER PRIMARY KEY AUTOINCREMENT,
+  table_name TEXT NOT NULL,
+  row_key TEXT NOT NULL,  -- id (word_id for word_reviews, "word_id:group_id" for words_groups)
+  deleted BOOLEAN NOT NULL DEFAULT 0
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS change_log_table_row ON change_log (table_name, row_key);
+
+-- Writes replace the row's previous entry so the log stays one entry per row.
+-- (DELETE + INSERT rather than INSERT OR REPLACE: an outer INSERT OR IGNORE
+-- would override the trigger's conflict policy.)
+
+CREATE TRIGGER IF NOT EXISTS words_change_log_insert AFTER INSERT ON words
+BEGIN
+  DELETE FROM change_log WHERE table_name = 'words' AND row_key = CAST(NEW.id AS TEXT);
+  INSERT INTO change_log (table_name, row_key, deleted) VALUES ('words', CAST(NEW.id AS TEXT), 0);
+END;
+
+-- Only the synced columns; norm_key is derived from them
+CREATE TRIGGER IF NOT EXISTS words_change_log_update AFTER UPDATE OF kanji, romaji, english, parts ON words
+BEGIN
+  DELETE FROM change_log WHERE table_name = 'words' AND row_key = CAST(NEW.id AS TEXT);
+  INSERT INTO change_log (table_name, row_key, deleted) VALUES ('words', CAST(NEW.id AS TEXT), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_change_log_delete AFTER DELETE ON words
+BEGIN
+  DELETE FROM change_log WHERE table_name = 'words' AND row_key = CAST(OLD.id AS TEXT);
+  INSERT INTO change_log (table_name, row_key, deleted) VALUES ('words', CAST(OLD.id AS TEXT), 1);
+END;
+
+CREATE TRIGGER IF NOT EXISTS groups_change_log_insert AFTER INSERT ON groups
+BEGIN
+  DELETE FROM change_log WHERE table_name = 'groups' AND row_key = CAST(NEW.id AS TEXT);
+  INSERT INTO change_log (table_name, row_key, deleted) VALUES ('groups', CAST(NEW.id AS TEXT), 0);
+END;
+
+-- Not the review rollups, which move with every review and aren't synced
+CREATE TRIGGER IF NOT EXISTS groups_change_log_update AFTER UPDATE OF name, words_count ON groups
+BEGIN
+  DELETE FROM change_log WHERE table_name = 'groups' AND row_key = CAST(NEW.id AS TEXT);
+  INSERT INTO change_log (table_name, row_key, deleted) VALUES ('groups', CAST(NEW.id AS TEXT), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS groups_change_log_delete AFTER DELETE ON groups
+BEGIN
+  DELETE FROM change_log WHERE table_name = 'groups' AND row_key = CAST(OLD.id AS TEXT);
+  INSERT INTO change_log (table_name, row_key, deleted) VALUES ('groups', CAST(OLD.id AS TEXT), 1);
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_groups_change_log_insert AFTER INSERT ON words_groups
+BEGIN
+  DELETE FROM change_log WHERE table_name = 'words_groups' AND row_key = NEW.word_id || ':' || NEW.group_id;
+  INSERT INTO change_log (table_name, row_key, deleted) VALUES ('words_groups', NEW.word_id || ':' || NEW.group_id, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_groups_change_log_delete AFTER DELETE ON words_groups
+BEGIN
+  DELETE FROM change_log WHERE table_name = 'words_groups' AND row_key = OLD.word_id || ':' || OLD.group_id;
+  INSERT INTO change_log (table_name, row_key, deleted) VALUES ('words_groups', OLD.word_id || ':' || OLD.group_id, 1);
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_reviews_change_log_insert AFTER INSERT ON word_reviews
+BEGIN
+  DELETE FROM change_log WHERE table_name = 'word_reviews' AND row_key = CAST(NEW.word_id AS TEXT);
+  INSERT INTO change_log (table_name, row_key, deleted) VALUES ('word_reviews', CAST(NEW.word_id AS TEXT), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_reviews_change_log_update AFTER UPDATE ON word_reviews
+BEGIN
+  DELETE FROM change_log WHERE table_name = 'word_reviews' AND row_key = CAST(NEW.word_id AS TEXT);
+  INSERT INTO change_log (table_name, row_key, deleted) VALUES ('word_reviews', CAST(NEW.word_id AS TEXT), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_reviews_change_log_delete AFTER DELETE ON word_reviews
+BEGIN
+  DELETE FROM change_log WHERE table_name = 'word_reviews' AND row_key = CAST(OLD.word_id AS TEXT);
+  INSERT INTO change_log (table_name, row_key, deleted) VALUES ('word_reviews', CAST(OLD.word_id AS TEXT), 1);
+END;
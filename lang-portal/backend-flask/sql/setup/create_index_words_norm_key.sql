@@ -0,0 +1,4 @@
+-- One word per normalized kanji + romaji; the upsert target of imports.
+-- Kept out of create_indexes_words.sql, which migrations older than the
+-- norm_key column replay.
+CREATE UNIQUE INDEX IF NOT EXISTS words_norm_key ON words (norm_key);
@@ -0,0 +1,10 @@
+-- Active sessions, ordered by last activity: listing them and closing idle ones are range scans
+CREATE INDEX IF NOT EXISTS study_sessions_active ON study_sessions (last_activity_at) WHERE ended_at IS NULL;
+
+-- Sessions ended within a period (duration analytics)
+CREATE INDEX IF NOT EXISTS study_sessions_ended_at ON study_sessions (ended_at) WHERE ended_at IS NOT NULL;
+
+-- Session listings page through these newest first without sorting
+CREATE INDEX IF NOT EXISTS study_sessions_created_at ON study_sessions (created_at);
+CREATE INDEX IF NOT EXISTS study_sessions_group_id ON study_sessions (group_id, created_at);
+CREATE INDEX IF NOT EXISTS study_sessions_study_activity_id ON study_sessions (study_activity_id, created_at);
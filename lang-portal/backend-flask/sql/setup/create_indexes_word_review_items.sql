@@ -0,0 +1,5 @@
+-- Per-session lookups (session pages, history resets)
+CREATE INDEX IF NOT EXISTS word_review_items_study_session_id ON word_review_items (study_session_id);
+
+-- Per-word recounts of word_reviews
+CREATE INDEX IF NOT EXISTS word_review_items_word_id ON word_review_items (word_id, correct);
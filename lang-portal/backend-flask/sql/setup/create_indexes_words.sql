@@ -0,0 +1,9 @@
+-- Covers slim (?fields=id,kanji,romaji,english) word listings sorted by kanji
+CREATE INDEX IF NOT EXISTS words_kanji ON words (kanji, romaji, english);
+
+-- Group membership lookups by group (the primary key leads with word_id)
+CREATE INDEX IF NOT EXISTS words_groups_group_id ON words_groups (group_id, word_id);
+
+-- Word listings sorted by romaji or english
+CREATE INDEX IF NOT EXISTS words_romaji ON words (romaji);
+CREATE INDEX IF NOT EXISTS words_english ON words (english);
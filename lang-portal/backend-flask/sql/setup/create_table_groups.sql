@@ -1,5 +1,10 @@
 CREATE TABLE IF NOT EXISTS groups (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   name TEXT NOT NULL,
-  words_count INTEGER DEFAULT 0  -- Counter cache for the number of words in the group
+  words_count INTEGER DEFAULT 0,  -- Counter cache for the number of words in the group
+  -- Review rollups over the group's words, maintained by the group rollup triggers
+  reviewed_words INTEGER NOT NULL DEFAULT 0,  -- words with at least one review
+  mastered_words INTEGER NOT NULL DEFAULT 0,  -- words with 3+ correct answers and more correct than wrong
+  correct_reviews INTEGER NOT NULL DEFAULT 0,
+  wrong_reviews INTEGER NOT NULL DEFAULT 0
 );
\ No newline at end of file
@@ -0,0 +1,28 @@
+-- Background job queue. Lives in its own database file (JOBS_DATABASE, see
+-- lib/jobs.py), so progress writes neither take the app's write lock nor
+-- restart online backups of it.
+CREATE TABLE IF NOT EXISTS jobs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  kind TEXT NOT NULL,
+  params TEXT NOT NULL DEFAULT '{}',  -- JSON keyword arguments of the handler
+  status TEXT NOT NULL DEFAULT 'queued',  -- queued, running, succeeded or failed
+  attempts INTEGER NOT NULL DEFAULT 0,
+  max_attempts INTEGER NOT NULL DEFAULT 3,
+  progress INTEGER NOT NULL DEFAULT 0,
+  total INTEGER,
+  message TEXT,
+  result TEXT,  -- JSON return value of the handler
+  error TEXT,  -- Last attempt's error, kept while a retry is queued
+  worker TEXT,  -- host:pid:thread of the claiming worker
+  run_after DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,  -- Not claimed before; pushed back on retries
+  heartbeat_at DATETIME,  -- Refreshed by progress updates; stale running jobs are reclaimed
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  started_at DATETIME,
+  finished_at DATETIME
+);
+
+-- Claiming takes the oldest due queued job
+CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (run_after, id) WHERE status = 'queued';
+
+-- Reclaiming looks for running jobs whose worker stopped reporting
+CREATE INDEX IF NOT EXISTS jobs_running ON jobs (heartbeat_at) WHERE status = 'running';
@@ -0,0 +1,33 @@
+-- Review counts of every word in a session, upserted with each review so a
+-- session's word list is an index range instead of a GROUP BY over its
+-- review items. kanji is copied from words for the (session_id, kanji) order.
+CREATE TABLE IF NOT EXISTS session_word_stats (
+  session_id INTEGER NOT NULL,
+  word_id INTEGER NOT NULL,
+  kanji TEXT NOT NULL,
+  correct INTEGER NOT NULL DEFAULT 0,
+  wrong INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (session_id, word_id),
+  FOREIGN KEY (session_id) REFERENCES study_sessions(id),
+  FOREIGN KEY (word_id) REFERENCES words(id)
+) WITHOUT ROWID;
+
+-- Entries end with the primary key, so pages come out ordered by (kanji, word_id)
+CREATE INDEX IF NOT EXISTS session_word_stats_kanji ON session_word_stats (session_id, kanji);
+
+-- Keep the study_sessions.words_count counter cache in step with the stats rows
+CREATE TRIGGER IF NOT EXISTS session_word_stats_insert AFTER INSERT ON session_word_stats
+BEGIN
+  UPDATE study_sessions SET words_count = words_count + 1 WHERE id = NEW.session_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS session_word_stats_delete AFTER DELETE ON session_word_stats
+BEGIN
+  UPDATE study_sessions SET words_count = words_count - 1 WHERE id = OLD.session_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_kanji_session_word_stats AFTER UPDATE OF kanji ON words
+WHEN NEW.kanji IS NOT OLD.kanji
+BEGIN
+  UPDATE session_word_stats SET kanji = NEW.kanji WHERE word_id = NEW.id;
+END;
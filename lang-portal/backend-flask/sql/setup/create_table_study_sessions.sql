@@ -3,6 +3,10 @@ CREATE TABLE IF NOT EXISTS study_sessions (
   group_id INTEGER NOT NULL,  -- The group of words being studied
   study_activity_id INTEGER NOT NULL,  -- The activity performed
   created_at DATETIME DEFAULT CURRENT_TIMESTAMP,  -- Timestamp of the session
+  last_activity_at DATETIME DEFAULT CURRENT_TIMESTAMP,  -- Bumped by every review
+  ended_at DATETIME,  -- NULL while the session is active
+  auto_closed INTEGER NOT NULL DEFAULT 0,  -- 1 when the idle sweeper set ended_at; the next review reopens it
+  words_count INTEGER NOT NULL DEFAULT 0,  -- Distinct words reviewed, maintained by the session_word_stats triggers
   FOREIGN KEY (group_id) REFERENCES groups(id),
   FOREIGN KEY (study_activity_id) REFERENCES study_activities(id)
 );
\ No newline at end of file
@@ -0,0 +1,123 @@
+-- Per-table write counters, bumped by triggers on every row change.
+-- Cached read results record the versions of the tables they were built
+-- from and are discarded once any of them moves (see lib/result_cache.py);
+-- being in the database, the counters also cover writes from other processes.
+CREATE TABLE IF NOT EXISTS table_versions (
+  table_name TEXT PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO table_versions (table_name) VALUES
+  ('words'),
+  ('groups'),
+  ('words_groups'),
+  ('word_reviews'),
+  ('word_review_items'),
+  ('study_sessions'),
+  ('study_activities');
+
+CREATE TRIGGER IF NOT EXISTS words_version_insert AFTER INSERT ON words
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'words';
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_version_update AFTER UPDATE ON words
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'words';
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_version_delete AFTER DELETE ON words
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'words';
+END;
+
+CREATE TRIGGER IF NOT EXISTS groups_version_insert AFTER INSERT ON groups
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'groups';
+END;
+
+-- Review rollup updates bump group_rollups instead (setup/create_trigger_group_rollups_version.sql)
+CREATE TRIGGER IF NOT EXISTS groups_version_update AFTER UPDATE OF name, words_count ON groups
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'groups';
+END;
+
+CREATE TRIGGER IF NOT EXISTS groups_version_delete AFTER DELETE ON groups
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'groups';
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_groups_version_insert AFTER INSERT ON words_groups
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'words_groups';
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_groups_version_update AFTER UPDATE ON words_groups
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'words_groups';
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_groups_version_delete AFTER DELETE ON words_groups
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'words_groups';
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_reviews_version_insert AFTER INSERT ON word_reviews
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'word_reviews';
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_reviews_version_update AFTER UPDATE ON word_reviews
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'word_reviews';
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_reviews_version_delete AFTER DELETE ON word_reviews
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'word_reviews';
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_version_insert AFTER INSERT ON word_review_items
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'word_review_items';
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_version_update AFTER UPDATE ON word_review_items
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'word_review_items';
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_version_delete AFTER DELETE ON word_review_items
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'word_review_items';
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_version_insert AFTER INSERT ON study_sessions
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'study_sessions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_version_update AFTER UPDATE ON study_sessions
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'study_sessions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_version_delete AFTER DELETE ON study_sessions
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'study_sessions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_activities_version_insert AFTER INSERT ON study_activities
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'study_activities';
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_activities_version_update AFTER UPDATE ON study_activities
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'study_activities';
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_activities_version_delete AFTER DELETE ON study_activities
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'study_activities';
+END;
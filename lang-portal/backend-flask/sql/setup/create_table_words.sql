@@ -3,5 +3,6 @@ CREATE TABLE IF NOT EXISTS words (
   kanji TEXT NOT NULL,
   romaji TEXT NOT NULL,
   english TEXT NOT NULL,
-  parts TEXT NOT NULL  -- Store parts as JSON string
+  parts TEXT NOT NULL,  -- Minified JSON written via canonical_parts(), spliced into responses as-is
+  norm_key TEXT  -- word_key(kanji, romaji), unique; NULL only on duplicates predating it
 );
\ No newline at end of file
@@ -0,0 +1,43 @@
+-- Summary tables rewritten by lib/analytics.py from the full review log and
+-- read by the /analytics endpoints. Each refresh replaces their contents.
+
+-- One row per refresh; the newest tells how current the summaries are
+CREATE TABLE IF NOT EXISTS analytics_runs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  reviews INTEGER NOT NULL,  -- Review items the summaries were computed from
+  seconds REAL NOT NULL,
+  computed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- difficulty is 1 - accuracy, smoothed towards the overall accuracy for rarely reviewed words
+CREATE TABLE IF NOT EXISTS analytics_word_difficulty (
+  word_id INTEGER PRIMARY KEY,
+  reviews INTEGER NOT NULL,
+  correct INTEGER NOT NULL,
+  accuracy REAL NOT NULL,
+  difficulty REAL NOT NULL,
+  last_reviewed_at DATETIME NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS analytics_word_difficulty_difficulty ON analytics_word_difficulty (difficulty);
+CREATE INDEX IF NOT EXISTS analytics_word_difficulty_reviews ON analytics_word_difficulty (reviews);
+
+-- Recall rate of a word by the time since its previous review
+CREATE TABLE IF NOT EXISTS analytics_forgetting_curve (
+  bucket INTEGER PRIMARY KEY,
+  min_seconds INTEGER NOT NULL,
+  max_seconds INTEGER,  -- NULL for the open-ended last bucket
+  reviews INTEGER NOT NULL,
+  recalled INTEGER NOT NULL,
+  recall_rate REAL
+);
+
+-- Accuracy of every study activity on every group it was used with
+CREATE TABLE IF NOT EXISTS analytics_activity_accuracy (
+  study_activity_id INTEGER NOT NULL,
+  group_id INTEGER NOT NULL,
+  reviews INTEGER NOT NULL,
+  correct INTEGER NOT NULL,
+  accuracy REAL NOT NULL,
+  PRIMARY KEY (study_activity_id, group_id)
+);
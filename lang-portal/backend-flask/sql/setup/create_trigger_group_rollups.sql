@@ -0,0 +1,60 @@
+-- Keep the groups review rollups in step with word_reviews, fanning each
+-- change out to every group containing the word. A word is mastered once it
+-- has 3+ correct answers and more correct than wrong ones; the same rule is
+-- used by the groups.rebuild_rollups query.
+
+CREATE TRIGGER IF NOT EXISTS word_reviews_rollup_insert AFTER INSERT ON word_reviews
+BEGIN
+  UPDATE groups SET
+    reviewed_words = reviewed_words + (NEW.correct_count + NEW.wrong_count > 0),
+    mastered_words = mastered_words + (NEW.correct_count >= 3 AND NEW.correct_count > NEW.wrong_count),
+    correct_reviews = correct_reviews + NEW.correct_count,
+    wrong_reviews = wrong_reviews + NEW.wrong_count
+  WHERE id IN (SELECT group_id FROM words_groups WHERE word_id = NEW.word_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_reviews_rollup_update AFTER UPDATE ON word_reviews
+BEGIN
+  UPDATE groups SET
+    reviewed_words = reviewed_words
+      + (NEW.correct_count + NEW.wrong_count > 0) - (OLD.correct_count + OLD.wrong_count > 0),
+    mastered_words = mastered_words
+      + (NEW.correct_count >= 3 AND NEW.correct_count > NEW.wrong_count)
+      - (OLD.correct_count >= 3 AND OLD.correct_count > OLD.wrong_count),
+    correct_reviews = correct_reviews + NEW.correct_count - OLD.correct_count,
+    wrong_reviews = wrong_reviews + NEW.wrong_count - OLD.wrong_count
+  WHERE id IN (SELECT group_id FROM words_groups WHERE word_id = NEW.word_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_reviews_rollup_delete AFTER DELETE ON word_reviews
+BEGIN
+  UPDATE groups SET
+    reviewed_words = reviewed_words - (OLD.correct_count + OLD.wrong_count > 0),
+    mastered_words = mastered_words - (OLD.correct_count >= 3 AND OLD.correct_count > OLD.wrong_count),
+    correct_reviews = correct_reviews - OLD.correct_count,
+    wrong_reviews = wrong_reviews - OLD.wrong_count
+  WHERE id IN (SELECT group_id FROM words_groups WHERE word_id = OLD.word_id);
+END;
+
+-- Adding or removing a reviewed word moves its review stats into or out of the group
+CREATE TRIGGER IF NOT EXISTS words_groups_rollup_insert AFTER INSERT ON words_groups
+WHEN EXISTS (SELECT 1 FROM word_reviews WHERE word_id = NEW.word_id)
+BEGIN
+  UPDATE groups SET
+    reviewed_words = reviewed_words + (SELECT correct_count + wrong_count > 0 FROM word_reviews WHERE word_id = NEW.word_id),
+    mastered_words = mastered_words + (SELECT correct_count >= 3 AND correct_count > wrong_count FROM word_reviews WHERE word_id = NEW.word_id),
+    correct_reviews = correct_reviews + (SELECT correct_count FROM word_reviews WHERE word_id = NEW.word_id),
+    wrong_reviews = wrong_reviews + (SELECT wrong_count FROM word_reviews WHERE word_id = NEW.word_id)
+  WHERE id = NEW.group_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_groups_rollup_delete AFTER DELETE ON words_groups
+WHEN EXISTS (SELECT 1 FROM word_reviews WHERE word_id = OLD.word_id)
+BEGIN
+  UPDATE groups SET
+    reviewed_words = reviewed_words - (SELECT correct_count + wrong_count > 0 FROM word_reviews WHERE word_id = OLD.word_id),
+    mastered_words = mastered_words - (SELECT correct_count >= 3 AND correct_count > wrong_count FROM word_reviews WHERE word_id = OLD.word_id),
+    correct_reviews = correct_reviews - (SELECT correct_count FROM word_reviews WHERE word_id = OLD.word_id),
+    wrong_reviews = wrong_reviews - (SELECT wrong_count FROM word_reviews WHERE word_id = OLD.word_id)
+  WHERE id = OLD.group_id;
+END;
@@ -0,0 +1,11 @@
+-- The groups review rollups change with every review. They get their own
+-- table_versions counter so the groups counter (and the catalog, word cache
+-- and sync clients following it) only moves for names and memberships; the
+-- cached /groups pages check both.
+INSERT OR IGNORE INTO table_versions (table_name) VALUES ('group_rollups');
+
+CREATE TRIGGER IF NOT EXISTS group_rollups_version_update
+AFTER UPDATE OF reviewed_words, mastered_words, correct_reviews, wrong_reviews ON groups
+BEGIN
+  UPDATE table_versions SET version = version + 1 WHERE table_name = 'group_rollups';
+END;
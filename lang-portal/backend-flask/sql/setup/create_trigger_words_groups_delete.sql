@@ -0,0 +1,5 @@
+CREATE TRIGGER IF NOT EXISTS words_groups_after_delete
+AFTER DELETE ON words_groups
+BEGIN
+  UPDATE groups SET words_count = words_count - 1 WHERE id = OLD.group_id;
+END;
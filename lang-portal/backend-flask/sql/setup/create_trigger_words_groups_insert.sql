@@ -0,0 +1,6 @@
+CREATE TRIGGER IF NOT EXISTS words_groups_after_insert
+AFTER INSERT ON words_groups
+BEGIN
+  -- Keep the groups.words_count counter cache in step with membership
+  UPDATE groups SET words_count = words_count + 1 WHERE id = NEW.group_id;
+END;
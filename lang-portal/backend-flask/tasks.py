@@ -1,4 +1,6 @@
-from invoke import task
+import sqlite3
+
+from invoke import task, Exit
 from lib.db import db
 
 @task
@@ -6,4 +8,152 @@ def init_db(c):
   from flask import Flask
   app = Flask(__name__)
   db.init(app)
-  print("Database initialized successfully.")
\ No newline at end of file
+  print("Database initialized successfully.")
+
+@task
+def check_group_counts(c, fix=False):
+  """Verify groups.words_count against words_groups membership (--fix repairs it)."""
+  from flask import Flask
+  app = Flask(__name__)
+  with app.app_context():
+    mismatches = db.check_group_counts(fix=fix)
+    db.close()
+
+  for row in mismatches:
+    print(f"Group {row['id']} ({row['name']}): words_count={row['words_count']} actual={row['actual_count']}")
+
+  if not mismatches:
+    print("All group word counts are consistent.")
+  elif fix:
+    print(f"Fixed {len(mismatches)} group word counts.")
+  else:
+    raise Exit(f"{len(mismatches)} group word counts are inconsistent, rerun with --fix to repair them.", code=1)
+
+@task
+def benchmark_compression(c, iterations=50):
+  """Print bytes saved and CPU cost of response compression per endpoint."""
+  from benchmarks import compression
+  compression.main(iterations=int(iterations))
+
+@task
+def serve(c, host='127.0.0.1', port=5000, workers=None):
+  """Run the prefork production server (defaults to one worker per CPU)."""
+  import serve as server
+  argv = ['--host', host, '--port', str(port)]
+  if workers is not None:
+    argv += ['--workers', str(workers)]
+  server.main(argv)
+
+@task
+def benchmark_completion(c, words=50000, iterations=1000):
+  """Compare prefix index lookups with SQLite LIKE queries over a generated vocabulary."""
+  from benchmarks import completion
+  completion.main(words=int(words), iterations=int(iterations))
+
+@task
+def rebuild_group_rollups(c):
+  """Recompute the groups review rollups (reviewed/mastered words, accuracy) from word_reviews."""
+  from flask import Flask
+  app = Flask(__name__)
+  with app.app_context():
+    groups = db.rebuild_group_rollups()
+    db.close()
+  print(f"Rebuilt review rollups for {groups} groups.")
+
+@task
+def backup(c, method='online', dest='backups', no_compress=False, pages=256, pause=0.005, max_restarts=5):
+  """Snapshot words.db while the app is running (--method online|vacuum, online falls back to vacuum after --max-restarts)."""
+  from lib import backup as backups
+  result = backups.backup(
+    db.database,
+    dest,
+    method=method,
+    compress=not no_compress,
+    pages=int(pages),
+    pause=float(pause),
+    max_restarts=int(max_restarts)
+  )
+  print(f"Wrote {result['path']} ({result['method']}, {result['bytes']} bytes, sha256 {result['sha256']}) in {result['seconds']}s")
+
+@task
+def restore(c, snapshot, target):
+  """Restore a snapshot into a new database file, e.g. for benchmarking against production data."""
+  from lib import backup as backups
+  try:
+    result = backups.restore(snapshot, target)
+  except (ValueError, sqlite3.DatabaseError) as e:
+    raise Exit(str(e), code=1)
+  print(f"Restored {snapshot} to {result['path']} (schema version {result['schema_version']})")
+
+@task
+def close_idle_sessions(c, idle_minutes=30):
+  """End study sessions without reviews for --idle-minutes (for cron when the app's sweeper is disabled)."""
+  from lib.sessions import close_idle_sessions as close_idle
+  closed = close_idle(db, int(idle_minutes) * 60)
+  print(f"Closed {closed} idle study sessions.")
+
+@task
+def generate_data(c, database, scale='medium', seed=42, days=365, words=None, groups=None,
+                  activities=None, sessions=None, reviews=None, slow=False):
+  """Generate a deterministic production-scale database (--scale small|medium|large, counts override it)."""
+  from lib import synthetic
+  if scale not in synthetic.SCALES:
+    raise Exit(f"scale must be one of: {', '.join(synthetic.SCALES)}", code=1)
+
+  counts = dict(synthetic.SCALES[scale])
+  for name, value in [('words', words), ('groups', groups), ('activities', activities),
+                      ('sessions', sessions), ('reviews', reviews)]:
+    if value is not None:
+      counts[name] = int(value)
+
+  try:
+    result = synthetic.generate(database, seed=int(seed), days=int(days), fast=not slow, **counts)
+  except ValueError as e:
+    raise Exit(str(e), code=1)
+  print(', '.join(f"{value} {name}" for name, value in result.items() if name != 'seconds') + f" in {result['seconds']}s")
+
+@task
+def report_duplicates(c, threshold=0.8, limit=50):
+  """List words sharing a normalized kanji + romaji key, and near-duplicates with n-gram similarity >= --threshold."""
+  from lib import duplicates
+  connection = db.connect()
+  try:
+    report = duplicates.report(connection, float(threshold))
+  finally:
+    connection.close()
+
+  describe = lambda word: f"#{word['id']} {word['kanji']} ({word['romaji']}) {word['english']}"
+  for words in report['exact'][:int(limit)]:
+    print('exact: ' + ' = '.join(describe(word) for word in words))
+  for pair in report['near'][:int(limit)]:
+    print(f"{pair['similarity']:.2f}: " + ' ~ '.join(describe(word) for word in pair['words']))
+  print(f"{len(report['exact'])} exact and {len(report['near'])} near duplicates among {report['words']} words ({report['seconds']}s).")
+
+@task
+def run_jobs(c, workers=2):
+  """Run background job workers in the foreground (for deployments with JOBS_WORKERS=0 in the web processes)."""
+  import time
+  from app import create_app
+  app = create_app()
+  app.jobs.workers = int(workers)
+  app.jobs.start()
+  print(f"Running {workers} job workers on {app.jobs.database}, Ctrl+C stops them.")
+  try:
+    while True:
+      time.sleep(1)
+  except KeyboardInterrupt:
+    print("Finishing running jobs...")
+    app.jobs.stop()
+
+@task
+def refresh_analytics(c):
+  """Recompute word difficulty, the forgetting curve and activity accuracy from the review log (needs numpy)."""
+  from lib import analytics
+  connection = db.connect()
+  try:
+    result = analytics.refresh(connection, progress=print)
+  except RuntimeError as e:
+    raise Exit(str(e), code=1)
+  finally:
+    connection.close()
+  print(f"Summarized {result['reviews']} reviews of {result['words']} words in {result['seconds']}s.")
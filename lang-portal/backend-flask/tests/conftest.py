@@ -16,9 +16,22 @@ def app():
     
     yield app
     
-    # Clean up - remove test database
+    # Clean up - stop the job workers, remove test database and job queue
+    app.jobs.stop()
     os.unlink(test_config['DATABASE'])
+    for suffix in ['', '-wal', '-shm']:
+        if os.path.exists(app.config['JOBS_DATABASE'] + suffix):
+            os.unlink(app.config['JOBS_DATABASE'] + suffix)
 
 @pytest.fixture
 def client(app):
-    return app.test_client()
\ No newline at end of file
+    return app.test_client()
+# Medium-size generated database shared by the query plan tests (tests/test_query_plans.py)
+GENERATED_SCALE = dict(words=5000, groups=50, activities=4, sessions=2000, reviews=100000)
+
+@pytest.fixture(scope='session')
+def generated_db(tmp_path_factory):
+    from lib import synthetic
+    database = str(tmp_path_factory.mktemp('generated') / 'generated.db')
+    synthetic.generate(database, seed=42, log=None, **GENERATED_SCALE)
+    return database
@@ -0,0 +1,64 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from lib import analytics
+
+# (word_id, session_id, correct, created_at); session 1 is group 1 with activity 1, session 2 group 2 with activity 2
+REVIEWS = [
+    (1, 1, 1, '2025-01-01 10:00:00'),
+    (1, 1, 0, '2025-01-01 10:00:30'),  # 30s after word 1's previous review
+    (1, 2, 1, '2025-01-03 10:00:30'),  # 2 days after
+    (2, 2, 0, '2025-01-02 09:00:00'),
+    (2, 2, 0, '2025-01-02 11:00:00'),  # 2 hours after
+]
+
+def test_analytics_refresh_and_endpoints(app, client):
+    """Test the refresh job summarizes the review log and the endpoints serve the summaries"""
+    assert client.get('/analytics/words').json['computed_at'] is None
+
+    connection = sqlite3.connect(app.config['DATABASE'])
+    connection.executemany(
+        'INSERT INTO word_review_items (word_id, study_session_id, correct, created_at) VALUES (?, ?, ?, ?)', REVIEWS
+    )
+    connection.commit()
+    connection.close()
+
+    response = client.post('/analytics/refresh')
+    assert response.status_code == 202
+    assert app.jobs.wait(response.json['job_id'], timeout=10)
+    assert client.get(response.json['status_url']).json['status'] == 'succeeded'
+
+    words = client.get('/analytics/words').json
+    assert words['reviews'] == 5 and words['computed_at'] is not None
+    # Word 2 (never right) is harder than word 1 (2 of 3), both pulled towards the overall 2 of 5
+    assert [(word['word_id'], word['reviews'], word['correct']) for word in words['words']] == [(2, 2, 0), (1, 3, 2)]
+    assert words['words'][0]['difficulty'] == round(1 - (0 + 5 * 0.4) / (2 + 5), 4)
+    assert words['words'][1]['last_reviewed_at'] == '2025-01-03 10:00:30'
+
+    buckets = {bucket['max_seconds']: bucket for bucket in client.get('/analytics/forgetting-curve').json['buckets']}
+    assert (buckets[60]['reviews'], buckets[60]['recalled']) == (1, 0)
+    assert (buckets[6 * 3600]['reviews'], buckets[6 * 3600]['recall_rate']) == (1, 0.0)
+    assert (buckets[3 * 86400]['reviews'], buckets[3 * 86400]['recall_rate']) == (1, 1.0)
+    assert sum(bucket['reviews'] for bucket in buckets.values()) == 3
+
+    matrix = client.get('/analytics/activity-accuracy').json
+    assert [activity['id'] for activity in matrix['activities']] == [1, 2]
+    assert [(cell['activity_id'], cell['group_id'], cell['reviews'], cell['accuracy']) for cell in matrix['cells']] == [
+        (1, 1, 2, 0.5), (2, 2, 3, 0.3333)
+    ]
+
+def test_review_chunks_match_a_single_read(app):
+    """Test chunked loading returns the same columns as one read of the whole log"""
+    connection = sqlite3.connect(app.config['DATABASE'])
+    connection.executemany(
+        'INSERT INTO word_review_items (word_id, study_session_id, correct, created_at) VALUES (?, ?, ?, ?)', REVIEWS * 3
+    )
+    chunked = analytics.load_reviews(connection, chunk_size=4)
+    whole = analytics.load_reviews(connection, chunk_size=1000)
+    connection.close()
+
+    for column in ['word_id', 'session_id', 'correct', 'time']:
+        assert np.array_equal(chunked[column], whole[column])
+    assert chunked['time'][1] - chunked['time'][0] == 30
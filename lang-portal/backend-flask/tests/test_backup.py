@@ -0,0 +1,91 @@
+import os
+import sqlite3
+
+import pytest
+
+from lib import backup
+
+@pytest.mark.parametrize('method', backup.METHODS)
+def test_backup_and_restore(app, tmp_path, method):
+    """Test snapshots are checksummed and restore into a fresh, identical database"""
+    result = backup.backup(app.config['DATABASE'], str(tmp_path), method=method, pages=4, pause=0)
+    assert result['path'].endswith('.db.gz')
+    assert backup.verify(result['path'])
+    assert [snapshot['name'] for snapshot in backup.list_snapshots(str(tmp_path))] == [os.path.basename(result['path'])]
+
+    target = str(tmp_path / 'restored.db')
+    restored = backup.restore(result['path'], target)
+    assert restored['schema_version'] > 0
+
+    original = sqlite3.connect(app.config['DATABASE'])
+    copy = sqlite3.connect(target)
+    assert copy.execute('SELECT * FROM words ORDER BY id').fetchall() == \
+        original.execute('SELECT * FROM words ORDER BY id').fetchall()
+    original.close()
+    copy.close()
+
+    # Never overwrites, and refuses tampered snapshots
+    with pytest.raises(ValueError):
+        backup.restore(result['path'], target)
+    with open(result['path'], 'ab') as file:
+        file.write(b'x')
+    with pytest.raises(ValueError):
+        backup.restore(result['path'], str(tmp_path / 'other.db'))
+
+def test_backup_falls_back_when_writes_keep_restarting(app, tmp_path):
+    """Test an online copy restarted by every step's write gives up and snapshots with VACUUM INTO"""
+    writer = sqlite3.connect(app.config['DATABASE'])
+    steps = []
+
+    def write(copied, total):
+        steps.append(copied)
+        writer.execute("INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, 'write', '[]')",
+                       (f'書{len(steps)}', f'sho{len(steps)}'))
+        writer.commit()
+
+    try:
+        result = backup.backup(app.config['DATABASE'], str(tmp_path), pages=1, pause=0,
+                               progress=write, max_restarts=3)
+    finally:
+        writer.close()
+    assert result['method'] == 'vacuum'
+    assert result['restarts'] == 4
+    assert len(steps) == 4
+    assert backup.verify(result['path'])
+    assert not os.path.exists(result['path'].removesuffix('.gz') + '.partial')
+
+    restored = backup.restore(result['path'], str(tmp_path / 'restored.db'))
+    copy = sqlite3.connect(restored['path'])
+    assert copy.execute("SELECT COUNT(*) FROM words WHERE english = 'write'").fetchone()[0] == 4
+    copy.close()
+
+def test_restore_cleans_up_non_databases(tmp_path):
+    """Test restoring a checksummed file that isn't a database leaves no partial file behind"""
+    snapshot = tmp_path / 'words-bogus.db'
+    snapshot.write_bytes(b'not a database' * 100)
+    (tmp_path / 'words-bogus.db.sha256').write_text(f'{backup.sha256_file(str(snapshot))}  words-bogus.db\n')
+    target = tmp_path / 'restored.db'
+    with pytest.raises(sqlite3.DatabaseError):
+        backup.restore(str(snapshot), str(target))
+    assert not target.exists()
+    assert not (tmp_path / 'restored.db.partial').exists()
+
+def test_backup_endpoint(app, client, tmp_path):
+    """Test the admin endpoint runs a backup job and lists its snapshot"""
+    app.config.update(BACKUP_DIR=str(tmp_path), ADMIN_TOKEN='secret')
+    assert client.post('/api/admin/backup').status_code == 401
+
+    headers = {'Authorization': 'Bearer secret'}
+    assert client.post('/api/admin/backup', json={'method': 'copy'}, headers=headers).status_code == 400
+
+    response = client.post('/api/admin/backup', json={'compress': False}, headers=headers)
+    assert response.status_code == 202
+    app.jobs.wait(response.json['job_id'], 5)
+
+    status = client.get(response.json['status_url'], headers=headers).json
+    assert status['status'] == 'succeeded'
+    assert status['progress'] == status['total']
+    assert status['result']['path'].endswith('.db')
+
+    backups = client.get('/api/admin/backups', headers=headers).json['backups']
+    assert len(backups) == 1 and backups[0]['checksum']
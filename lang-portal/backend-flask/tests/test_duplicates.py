@@ -0,0 +1,46 @@
+import itertools
+import random
+import sqlite3
+
+import pytest
+
+from lib import duplicates
+
+def brute_force_pairs(words, threshold):
+    signatures = {word_id: duplicates.signature(kanji, romaji) for word_id, kanji, romaji in words}
+    pairs = []
+    for a, b in itertools.combinations(sorted(signatures), 2):
+        similarity = duplicates.jaccard(signatures[a], signatures[b])
+        if similarity >= threshold - duplicates.EPSILON:
+            pairs.append((round(similarity, 4), a, b))
+    return sorted(pairs, key=lambda pair: (-pair[0], pair[1], pair[2]))
+
+@pytest.mark.parametrize('threshold', [0.5, 0.7, 0.8, 1.0])
+def test_similar_pairs_match_brute_force(threshold):
+    """Test the prefix filtered index finds exactly the pairs a full comparison finds"""
+    rng = random.Random(7)
+    syllables = ['ta', 'be', 'ru', 'no', 'mu', 'ka', 'ki', 'shi']
+    words = [(
+        word_id,
+        ''.join(rng.choice('食飲見行来') for _ in range(rng.randint(1, 3))),
+        ''.join(rng.choice(syllables) for _ in range(rng.randint(1, 4)))
+    ) for word_id in range(1, 301)]
+    assert duplicates.similar_pairs(words, threshold) == brute_force_pairs(words, threshold)
+
+def test_duplicate_report(app):
+    """Test the report separates exact duplicates from near-duplicates"""
+    connection = sqlite3.connect(app.config['DATABASE'])
+    # norm_key is unique, so duplicates of these shapes predate it
+    connection.executemany('INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)', [
+        ('東京', 'Tōkyō', 'Tokyo', '[]'),
+        ('東京', 'tokyo', 'Tokyo', '[]'),
+        ('東京', 'TOKYO ', 'Tokyo', '[]'),
+    ])
+    connection.commit()
+    report = duplicates.report(connection, threshold=0.8)
+    connection.close()
+
+    assert [[word['romaji'] for word in words] for words in report['exact']] == [['tokyo', 'TOKYO ']]
+    # Macrons fold away, but the keys differ
+    assert [pair['similarity'] for pair in report['near']] == [1.0, 1.0]
+    assert {pair['words'][0]['romaji'] for pair in report['near']} == {'Tōkyō'}
@@ -221,6 +221,8 @@
 
 
 
+import sqlite3
+import threading
 import pytest
 from flask import json
 
@@ -483,4 +485,659 @@ def test_get_group_words_raw(client, setup_database):
     assert data['words'][0]['kanji'] == '猫'
     assert data['words'][0]['romaji'] == 'neko'
     assert data['words'][0]['english'] == 'cat'
-    assert data['words'][0]['parts'] == []
\ No newline at end of file
+    assert data['words'][0]['parts'] == []
+
+def test_get_words_batch(client, setup_database):
+    """Test resolving several words in one request"""
+    response = client.get('/words?ids=2,1,999999')
+    print("GET /words?ids=2,1,999999 response:", response.get_json())
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [word['id'] for word in data['words']] == [2, 1]
+    assert data['missing_ids'] == [999999]
+    assert data['words'][1]['groups'] == [{'id': 1, 'name': 'Core Verbs'}]
+
+    response = client.get('/words?ids=1,abc')
+    assert response.status_code == 400
+
+def test_word_cache_invalidated_on_review(client, setup_database):
+    """Test cached word details reflect new reviews"""
+    response = client.get('/words/1')
+    assert response.get_json()['word']['correct_count'] == 0
+
+    client.post('/api/study-sessions/1/reviews', json={'word_id': 1, 'correct': True})
+
+    response = client.get('/words/1')
+    assert response.get_json()['word']['correct_count'] == 1
+
+    # A review committed by another process (a different serve.py worker)
+    # never calls invalidate() here; the word's change_log entry still moves
+    connection = sqlite3.connect(client.application.config['DATABASE'])
+    connection.execute("INSERT INTO word_reviews (word_id, correct_count, wrong_count) VALUES (1, 1, 0) "
+                       "ON CONFLICT(word_id) DO UPDATE SET correct_count = correct_count + 1")
+    connection.commit()
+    connection.close()
+    assert client.get('/words/1').get_json()['word']['correct_count'] == 2
+    assert client.get('/words?ids=1').get_json()['words'][0]['correct_count'] == 2
+
+    # Reviewing one word leaves the other cached words valid
+    cache = client.application.word_cache
+    client.get('/words/2')
+    entry = cache.get(2)
+    client.post('/api/study-sessions/1/reviews', json={'word_id': 1, 'correct': False})
+    client.get('/words/2')
+    assert cache.get(2) is entry
+
+def test_sort_parameters_whitelisted(client, setup_database):
+    """Test unknown sort columns and orders fall back to the defaults"""
+    response = client.get('/groups/1/study_sessions?sort_by=id;DROP&order=sideways')
+    assert response.status_code == 200
+    assert 'study_sessions' in response.json
+
+    response = client.get('/words?sort_by=wrong_count&order=desc')
+    assert response.status_code == 200
+    assert len(response.json['words']) == 10
+
+def test_add_words_to_group_batch(client, setup_database):
+    """Test adding many words to a group in one request"""
+    group_id = client.post('/groups', json={'name': 'Batch'}).get_json()['id']
+
+    response = client.post(f'/groups/{group_id}/words', json={'word_ids': [1, 2, 3, 999999]})
+    print("POST /groups/:id/words response:", response.get_json())
+    assert response.status_code == 200
+    assert response.json['added'] == 3
+    assert response.json['missing_ids'] == [999999]
+
+    # Re-adding existing members must not inflate the counter
+    client.post(f'/groups/{group_id}/words', json={'word_ids': [1, 2]})
+    client.post(f'/groups/{group_id}/words/4')
+
+    groups = client.get('/groups?sort_by=name').json['groups']
+    assert next(g for g in groups if g['id'] == group_id)['word_count'] == 4
+    assert client.application.db.check_group_counts() == []
+
+    response = client.post(f'/groups/{group_id}/words', json={'word_ids': 'abc'})
+    assert response.status_code == 400
+
+def test_response_compression(client, setup_database):
+    """Test large JSON responses are gzip encoded and revalidated by ETag"""
+    import gzip
+
+    response = client.get('/api/groups/1/words/raw', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data))['group_id'] == 1
+
+    etag = response.headers['ETag']
+    response = client.get('/api/groups/1/words/raw', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    # Small payloads stay uncompressed
+    response = client.get('/groups/1', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+def test_word_parts_round_trip(client, setup_database):
+    """Test parts are stored canonically and returned unchanged by the raw export"""
+    parts = [{'kanji': '猫', 'romaji': ['ne', 'ko']}]
+    word_id = client.post('/words', json={'kanji': '猫', 'romaji': 'neko', 'english': 'cat', 'parts': parts}).get_json()['id']
+    group_id = client.post('/groups', json={'name': 'Cats "and" more'}).get_json()['id']
+    client.post(f'/groups/{group_id}/words/{word_id}')
+
+    response = client.get(f'/api/groups/{group_id}/words/raw')
+    assert response.content_type == 'application/json'
+    assert response.get_json() == {
+        'group_id': group_id,
+        'group_name': 'Cats "and" more',
+        'words': [{'id': word_id, 'kanji': '猫', 'romaji': 'neko', 'english': 'cat', 'parts': parts}]
+    }
+
+    response = client.post('/words', json={'kanji': '猫', 'romaji': 'neko', 'english': 'cat', 'parts': '{oops'})
+    assert response.status_code == 400
+
+def test_dashboard_stream(client, setup_database):
+    """Test the SSE feed sends a snapshot and then deltas for writes"""
+    response = client.get('/dashboard/stream')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = response.response
+
+    first = next(events).decode()
+    assert first.startswith('event: stats\n')
+    snapshot = json.loads(first.split('data: ', 1)[1])
+    assert next(events).decode().startswith('event: recent-session\n')
+
+    client.post('/api/study-sessions/1/reviews', json={'word_id': 1, 'correct': True})
+
+    delta = next(events).decode()
+    assert delta.startswith('event: stats\n')
+    data = json.loads(delta.split('data: ', 1)[1])
+    assert data['correct_reviews'] == snapshot['correct_reviews'] + 1
+    assert 'total_vocabulary' not in data
+
+    response.close()
+    assert client.application.events.subscriber_count == 0
+
+def test_dashboard_stream_resyncs_after_overflow(client, setup_database):
+    """Test a stream that fell behind gets a full snapshot instead of silently missing deltas"""
+    client.application.events.max_queue_size = 2
+    response = client.get('/dashboard/stream')
+    events = response.response
+    snapshot = json.loads(next(events).decode().split('data: ', 1)[1])
+    next(events)
+
+    for _ in range(3):
+        client.application.events.publish('stats', {'correct_reviews': 0})
+
+    message = next(events).decode()
+    assert message.startswith('event: stats\n')
+    assert json.loads(message.split('data: ', 1)[1]) == snapshot
+    assert next(events).decode().startswith('event: recent-session\n')
+    response.close()
+
+def test_dashboard_refresh_leaves_writers_alone(client, setup_database):
+    """Test writes only wake the stream's watcher, which folds a burst of them into one delta"""
+    from routes import dashboard
+
+    client.application.config['DASHBOARD_POLL_INTERVAL'] = 60
+    response = client.get('/dashboard/stream')
+    events = response.response
+    snapshot = json.loads(next(events).decode().split('data: ', 1)[1])
+    next(events)
+
+    # Writers finish while the recompute is held up
+    threads = set()
+    refresh = threading.Lock()
+    compute_stats = dashboard.compute_stats
+
+    def held(db):
+        threads.add(threading.current_thread().name)
+        with refresh:
+            return compute_stats(db)
+
+    dashboard.compute_stats = held
+    try:
+        with refresh:
+            for _ in range(3):
+                assert client.post('/api/study-sessions/1/reviews', json={'word_id': 1, 'correct': True}).status_code == 201
+        message = next(events).decode()
+    finally:
+        dashboard.compute_stats = compute_stats
+    assert message.startswith('event: stats\n')
+    assert json.loads(message.split('data: ', 1)[1])['correct_reviews'] == snapshot['correct_reviews'] + 3
+    assert threads == {'dashboard-watcher'}
+    response.close()
+
+def test_dashboard_stream_sees_other_processes(client, setup_database):
+    """Test streams get deltas for writes committed outside this process"""
+    client.application.config['DASHBOARD_POLL_INTERVAL'] = 0.05
+    response = client.get('/dashboard/stream')
+    events = response.response
+    snapshot = json.loads(next(events).decode().split('data: ', 1)[1])
+    next(events)
+
+    # Another serve.py worker's write never reaches this process's app.events
+    connection = sqlite3.connect(client.application.config['DATABASE'])
+    connection.execute("INSERT INTO groups (name) VALUES ('Elsewhere')")
+    connection.commit()
+    connection.close()
+
+    delta = next(events).decode()
+    assert delta.startswith('event: stats\n')
+    assert json.loads(delta.split('data: ', 1)[1]) == {'total_groups': snapshot['total_groups'] + 1}
+    response.close()
+
+def test_sync_returns_changes_since_version(client, setup_database):
+    """Test incremental sync returns only rows written after a version"""
+    response = client.get('/api/sync?since=0&limit=5000')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['has_more'] is False
+    assert len(data['changes']['words']) == client.get('/words').json['total_words']
+    version = data['version']
+
+    word_id = client.post('/words', json={'kanji': '鳥', 'romaji': 'tori', 'english': 'bird'}).get_json()['id']
+    client.post(f'/groups/1/words/{word_id}')
+    client.post('/api/study-sessions/1/reviews', json={'word_id': word_id, 'correct': False})
+
+    data = client.get(f'/api/sync?since={version}').get_json()
+    assert [word['id'] for word in data['changes']['words']] == [word_id]
+    assert data['changes']['words_groups'] == [{'word_id': word_id, 'group_id': 1}]
+    assert [group['id'] for group in data['changes']['groups']] == [1]
+    assert data['changes']['word_reviews'][0]['wrong_count'] == 1
+    assert data['version'] > version
+
+    # Deleted rows come back as tombstones
+    with client.application.app_context():
+        client.application.db.get().execute('DELETE FROM words_groups WHERE word_id = ?', (word_id,))
+        client.application.db.commit()
+    data = client.get(f'/api/sync?since={version}').get_json()
+    assert data['deleted']['words_groups'] == [[word_id, 1]]
+
+    assert client.get(f"/api/sync?since={data['version']}").get_json()['changes']['words'] == []
+
+def test_reset_study_history_job(client, setup_database):
+    """Test the background reset deletes in batches and rebuilds word reviews"""
+    app = client.application
+    app.config['RESET_BATCH_SIZE'] = 2
+    app.config['RESET_BATCH_PAUSE'] = 0
+
+    group_session = client.post('/api/study-sessions', json={'group_id': 2, 'study_activity_id': 1}).get_json()['id']
+    for correct in (True, False, True):
+        client.post('/api/study-sessions/1/reviews', json={'word_id': 1, 'correct': correct})
+        client.post(f'/api/study-sessions/{group_session}/reviews', json={'word_id': 1, 'correct': correct})
+
+    # The review left in session 1 is older than the ones being reset
+    with app.app_context():
+        app.db.get().execute("UPDATE word_review_items SET created_at = '2025-01-01 10:00:00' WHERE study_session_id = 1")
+        app.db.commit()
+        app.db.close()
+
+    # Only group 2's history is cleared
+    transactions = app.db.stats()['transactions']
+    response = client.post('/api/study-sessions/reset', json={'group_id': 2})
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    assert app.jobs.wait(job_id, timeout=10)
+
+    status = client.get(f'/api/study-sessions/reset/{job_id}').get_json()
+    print("GET /api/study-sessions/reset/:job_id response:", status)
+    assert status['status'] == 'succeeded'
+    assert status['progress'] == status['total']
+    assert status['result']['deleted_review_items'] == 3
+    assert status['result']['rebuilt_words'] == 1
+
+    word = client.get('/words/1').get_json()['word']
+    assert (word['correct_count'], word['wrong_count']) == (2, 1)
+    assert client.get(f'/api/study-sessions/{group_session}').status_code == 404
+
+    # Every batch took the write lock up front, as did closing the sessions
+    assert app.db.stats()['transactions'] - transactions == status['total'] + 1
+    with app.app_context():
+        last_reviewed = app.db.get().execute('SELECT last_reviewed FROM word_reviews WHERE word_id = 1').fetchone()[0]
+        app.db.close()
+    assert last_reviewed == '2025-01-01 10:00:00'
+    assert client.get('/api/study-sessions/1').status_code == 200
+
+    # The reset session's word stats go with it
+    with app.app_context():
+        stats = app.db.get().execute('SELECT DISTINCT session_id FROM session_word_stats').fetchall()
+        assert [row['session_id'] for row in stats] == [1]
+        app.db.close()
+
+    response = client.post('/api/study-sessions/reset', json={'start_date': 'yesterday'})
+    assert response.status_code == 400
+    assert client.get('/api/study-sessions/reset/999').status_code == 404
+
+def test_reset_rejects_reviews_while_running(client, setup_database):
+    """Test reviews arriving mid-reset can't leave orphaned items counted into word_reviews"""
+    from lib.study_history import reset_study_history
+
+    app = client.application
+    old_session = client.post('/api/study-sessions', json={'group_id': 2, 'study_activity_id': 1}).json['id']
+    client.post(f'/api/study-sessions/{old_session}/reviews', json={'word_id': 1, 'correct': True})
+    responses = []
+
+    class Job:
+        progress = 0
+        total = None
+
+        def update(self, progress=None, total=None, message=None):
+            if progress is not None:
+                self.progress = progress
+            if total is not None:
+                self.total = total
+            # Requests racing the job: one for a session being reset, one for a session started meanwhile
+            if message == 'Deleting review items':
+                responses.append(client.post(f'/api/study-sessions/{old_session}/reviews', json={'word_id': 1, 'correct': True}))
+                new_session = client.post('/api/study-sessions', json={'group_id': 2, 'study_activity_id': 1}).json['id']
+                responses.append(client.post(f'/api/study-sessions/{new_session}/reviews', json={'word_id': 1, 'correct': False}))
+
+    result = reset_study_history(Job(), app.db, group_id=2, batch_size=1)
+    assert [response.status_code for response in responses] == [409, 201]
+    assert result['deleted_review_items'] == 1
+
+    with app.app_context():
+        connection = app.db.get()
+        orphans = connection.execute('''
+            SELECT COUNT(*) FROM word_review_items
+            WHERE study_session_id NOT IN (SELECT id FROM study_sessions)
+        ''').fetchone()[0]
+        app.db.close()
+    assert orphans == 0
+    word = client.get('/words/1').json['word']
+    assert (word['correct_count'], word['wrong_count']) == (0, 1)
+
+def test_field_projection(client, setup_database):
+    """Test ?fields= narrows word payloads and rejects unknown fields"""
+    response = client.get('/words?fields=id,kanji,english')
+    assert response.status_code == 200
+    assert all(set(word) == {'id', 'kanji', 'english'} for word in response.json['words'])
+
+    response = client.get('/words?fields=kanji&sort_by=correct_count&order=desc')
+    assert set(response.json['words'][0]) == {'kanji'}
+
+    response = client.get('/words/1?fields=id,groups')
+    assert response.json['word'] == {'id': 1, 'groups': [{'id': 1, 'name': 'Core Verbs'}]}
+
+    response = client.get('/api/groups/1/words/raw?fields=id,parts')
+    assert set(response.get_json()['words'][0]) == {'id', 'parts'}
+
+    response = client.get('/groups/1/words?fields=english')
+    assert set(response.json['words'][0]) == {'english'}
+
+    client.post('/api/study-sessions/1/reviews', json={'word_id': 1, 'correct': True})
+    response = client.get('/api/study-sessions/1?fields=id,correct_count')
+    assert response.json['words'] == [{'id': 1, 'correct_count': 1}]
+
+    response = client.get('/words?fields=id,password')
+    assert response.status_code == 400
+    assert 'password' in response.json['error']
+
+def test_field_projection_uses_registered_profiles(client, setup_database):
+    """Test ?fields= subsets map onto statements registered at startup instead of adding new ones"""
+    from lib import queries
+
+    registered = len(queries.QUERIES)
+    assert queries.projected_name('words.list', ['id', 'english'], 'kanji', 'asc') == 'words.list[slim].kanji.asc'
+    assert queries.projected_name('words.list', ['kanji', 'wrong_count'], 'kanji', 'asc') == 'words.list.kanji.asc'
+    assert queries.projected_name('study_sessions.words', ['id']) == 'study_sessions.words'
+
+    for fields in ['id', 'romaji', 'english,kanji', 'id,wrong_count', 'correct_count']:
+        response = client.get(f'/words?fields={fields}')
+        assert all(set(word) == set(fields.split(',')) for word in response.json['words'])
+    for fields in ['id', 'kanji,english', 'id,parts']:
+        response = client.get(f'/api/groups/1/words/raw?fields={fields}')
+        assert set(response.get_json()['words'][0]) == set(fields.split(','))
+    assert len(queries.QUERIES) == registered
+
+def test_word_completion(client, setup_database):
+    """Test prefix completion over romaji, kanji and english, including new words"""
+    response = client.get('/words/complete?prefix=INU')
+    assert response.status_code == 200
+    assert response.json['words'][0]['romaji'] == 'inu'
+
+    client.post('/words', json={'kanji': '犬小屋', 'romaji': 'inugoya', 'english': 'kennel'})
+    response = client.get('/words/complete?prefix=inu')
+    assert [word['romaji'] for word in response.json['words']][:2] == ['inu', 'inugoya']
+
+    response = client.get('/words/complete?prefix=犬')
+    assert {word['english'] for word in response.json['words']} >= {'dog', 'kennel'}
+
+    response = client.get('/words/complete?prefix=ken&limit=1')
+    assert [word['english'] for word in response.json['words']] == ['kennel']
+
+    assert client.get('/words/complete?prefix=zzzz').json['words'] == []
+    assert client.get('/words/complete').status_code == 400
+
+def test_result_cache_follows_table_versions(client, setup_database):
+    """Test cached read endpoints are served from cache until a table they read changes"""
+    def results():
+        return client.get('/api/metrics').json['caches']['results']
+
+    first = client.get('/groups/1').json
+    assert client.get('/groups/1').json == first
+    assert results()['hits'] == 1
+    assert results()['misses'] == 1
+
+    assert first['stats']['total_word_count'] == 60
+    word_id = client.post('/words', json={'kanji': '食べ物', 'romaji': 'tabemono', 'english': 'food'}).json['id']
+    client.post(f'/groups/1/words/{word_id}')
+    assert client.get('/groups/1').json['stats']['total_word_count'] == 61
+    assert results()['stale'] == 1
+
+    # Query args are part of the key
+    names = [group['group_name'] for group in client.get('/groups?order=desc').json['groups']]
+    assert names == sorted(names, reverse=True)
+
+def test_cache_counts_stale_entries_under_its_lock():
+    """Test concurrent stale lookups are counted exactly, never as hits"""
+    from lib.cache import LRUCache
+
+    cache = LRUCache()
+    cache.set('key', 1)
+
+    def lookups():
+        for _ in range(1000):
+            assert cache.get('key', valid=lambda value: value == 2) is None
+
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['stale']) == (0, 8000, 8000)
+
+def test_activity_catalog_snapshot(app, client, setup_database):
+    """Test activity listing and launch data come from the snapshot until its tables change"""
+    def rebuilds():
+        return client.get('/api/metrics').json['catalog']['rebuilds']
+
+    listing = client.get('/api/study-activities')
+    launch = client.get('/api/study-activities/1/launch')
+    assert listing.mimetype == launch.mimetype == 'application/json'
+    assert [activity['id'] for activity in listing.json] == [1, 2]
+    assert client.get('/api/study-activities/2').json == listing.json[1]
+    assert client.get('/api/study-activities/99/launch').status_code == 404
+    assert rebuilds() == 1
+
+    # A local write marks it stale at once
+    client.post('/groups', json={'name': 'Food'})
+    assert 'Food' in [group['name'] for group in client.get('/api/study-activities/1/launch').json['groups']]
+    assert rebuilds() == 2
+
+    # Another process' write shows up once the check interval has passed
+    connection = sqlite3.connect(app.config['DATABASE'])
+    connection.execute("UPDATE study_activities SET name = 'Flashcards' WHERE id = 2")
+    connection.commit()
+    connection.close()
+    app.catalog.check_interval = 0
+    assert client.get('/api/study-activities/2').json['title'] == 'Flashcards'
+    assert client.get('/api/study-activities/2').json['title'] == 'Flashcards'
+    assert rebuilds() == 3
+
+    # A failed rebuild answers with a JSON error like the other routes
+    def broken(versions):
+        raise sqlite3.OperationalError('no such table: study_activities')
+
+    load = app.catalog.load
+    app.catalog.load = broken
+    app.catalog.on_write({'tables': ['groups']})
+    for url in ('/api/study-activities', '/api/study-activities/1', '/api/study-activities/1/launch'):
+        response = client.get(url)
+        assert response.status_code == 500
+        assert response.json == {'error': 'no such table: study_activities'}
+
+    app.catalog.load = load
+    assert client.get('/api/study-activities').status_code == 200
+    assert rebuilds() == 4
+
+def test_group_mastery_rollups(app, client, setup_database):
+    """Test group review rollups follow reviews and membership, and match a full rebuild"""
+    for correct in [True, True, True, False]:
+        client.post('/api/study-sessions/1/reviews', json={'word_id': 1, 'correct': correct})
+    client.post('/api/study-sessions/1/reviews', json={'word_id': 2, 'correct': False})
+
+    group = client.get('/groups/1').json
+    assert group['stats']['reviewed_words'] == 2
+    assert group['stats']['mastered_words'] == 1
+    assert group['stats']['accuracy'] == 0.6
+
+    # Word 1 brings its review history into another group
+    client.post('/groups/2/words/1')
+    groups = {group['id']: group for group in client.get('/groups?sort_by=mastered_words&order=desc').json['groups']}
+    assert groups[2]['mastered_words'] == 1
+    assert groups[3]['accuracy'] is None
+
+    with app.app_context():
+        before = [tuple(row) for row in app.db.get().execute('SELECT * FROM groups ORDER BY id')]
+        app.db.rebuild_group_rollups()
+        after = [tuple(row) for row in app.db.get().execute('SELECT * FROM groups ORDER BY id')]
+        app.db.close()
+    assert before == after
+
+def test_reviews_leave_group_versions_alone(app, client, setup_database):
+    """Test rollup updates don't invalidate the catalog or sync group rows, but do refresh /groups"""
+    def versions():
+        with app.app_context():
+            result = app.db.table_versions(('groups', 'group_rollups'))
+            app.db.close()
+        return result
+
+    client.get('/api/study-activities')
+    assert client.get('/groups/1').json['stats']['reviewed_words'] == 0
+    since = client.get('/api/sync').json['version']
+    rebuilds = app.catalog.rebuilds
+    groups_version, rollups_version = versions()
+
+    client.post('/api/study-sessions/1/reviews', json={'word_id': 1, 'correct': True})
+
+    assert versions()[0] == groups_version and versions()[1] > rollups_version
+    client.get('/api/study-activities')
+    assert app.catalog.rebuilds == rebuilds
+    assert client.get(f'/api/sync?since={since}').json['changes']['groups'] == []
+    assert client.get('/groups/1').json['stats']['reviewed_words'] == 1
+
+def test_group_overview(app, client, setup_database):
+    """Test the overview combines the group, words and sessions endpoints in one response"""
+    overview = client.get('/groups/1/overview?words_sort_by=romaji&words_order=desc&fields=id,romaji')
+    assert overview.status_code == 200
+    assert overview.json['group'] == client.get('/groups/1').json
+    assert overview.json['words'] == client.get('/groups/1/words?sort_by=romaji&order=desc&fields=id,romaji').json
+    assert overview.json['study_sessions'] == client.get('/groups/1/study_sessions').json
+
+    assert client.get('/groups/999/overview').status_code == 404
+    assert client.get('/groups/1/overview?fields=secret').status_code == 400
+
+    # The reads run in one transaction, which is over when the request is
+    with app.test_request_context():
+        with app.db.read_transaction() as connection:
+            assert connection.in_transaction
+        assert not connection.in_transaction
+        app.db.close()
+
+def test_create_duplicate_word(client, setup_database):
+    """Test creating a word whose normalized kanji and romaji exist returns the existing id"""
+    created = client.post('/words', json={'kanji': '走る', 'romaji': 'hashiru', 'english': 'run'})
+    assert created.status_code == 201
+
+    # Full width kanji/romaji variants and case normalize to the same key
+    duplicate = client.post('/words', json={'kanji': '走る', 'romaji': ' ＨＡＳＨＩＲＵ', 'english': 'to run'})
+    assert duplicate.status_code == 409
+    assert duplicate.json['id'] == created.json['id']
+
+    assert client.post('/words', json={'kanji': '走る', 'romaji': 'hashiru2', 'english': 'run'}).status_code == 201
+
+def test_session_lifecycle(app, client, setup_database):
+    """Test reviews bump last activity, sessions close explicitly or when idle, and closed ones take no reviews"""
+    from lib.sessions import close_idle_sessions
+
+    session_id = client.post('/api/study-sessions', json={'group_id': 1, 'study_activity_id': 1}).json['id']
+    assert client.post(f'/api/study-sessions/{session_id}/reviews', json={'word_id': 1, 'correct': True}).status_code == 201
+
+    session = client.get(f'/api/study-sessions/{session_id}').json['session']
+    assert session['active'] is True and session['end_time'] is not None
+    assert session_id in [item['id'] for item in client.get('/api/study-sessions/active').json['items']]
+
+    response = client.post(f'/api/study-sessions/{session_id}/close')
+    ended_at = response.json['ended_at']
+    assert ended_at is not None
+    assert client.post(f'/api/study-sessions/{session_id}/close').json['ended_at'] == ended_at
+    assert client.get(f'/api/study-sessions/{session_id}').json['session']['end_time'] == ended_at
+
+    response = client.post(f'/api/study-sessions/{session_id}/reviews', json={'word_id': 1, 'correct': True})
+    assert response.status_code == 409
+    assert client.post('/api/study-sessions/999/reviews', json={'word_id': 1, 'correct': True}).status_code == 404
+    assert client.post('/api/study-sessions/999/close').status_code == 404
+
+    # Sessions idle longer than the timeout end at their last activity
+    with app.app_context():
+        app.db.get().execute("UPDATE study_sessions SET last_activity_at = datetime('now', '-2 hours') WHERE id = 1")
+        app.db.commit()
+        app.db.close()
+    assert close_idle_sessions(app.db, 3600) == 1
+    active = [item['id'] for item in client.get('/api/study-sessions/active').json['items']]
+    assert 1 not in active and 2 in active
+
+def test_review_reopens_swept_session(app, client, setup_database):
+    """Test a session the idle sweeper ended takes the learner's next review, unlike a closed one"""
+    from lib.sessions import close_idle_sessions
+
+    session_id = client.post('/api/study-sessions', json={'group_id': 1, 'study_activity_id': 1}).json['id']
+    with app.app_context():
+        app.db.get().execute(
+            "UPDATE study_sessions SET last_activity_at = datetime('now', '-2 hours') WHERE id = ?", (session_id,))
+        app.db.commit()
+        app.db.close()
+    assert close_idle_sessions(app.db, 3600) == 1
+    assert client.get(f'/api/study-sessions/{session_id}').json['session']['active'] is False
+
+    response = client.post(f'/api/study-sessions/{session_id}/reviews', json={'word_id': 1, 'correct': True})
+    assert response.status_code == 201
+    assert client.get(f'/api/study-sessions/{session_id}').json['session']['active'] is True
+    assert session_id in [item['id'] for item in client.get('/api/study-sessions/active').json['items']]
+
+    # Closing a swept session keeps its end time and ends it for good
+    with app.app_context():
+        app.db.get().execute(
+            "UPDATE study_sessions SET last_activity_at = datetime('now', '-2 hours') WHERE id = ?", (session_id,))
+        app.db.commit()
+        app.db.close()
+    assert close_idle_sessions(app.db, 3600) == 1
+    ended_at = client.get(f'/api/study-sessions/{session_id}').json['session']['end_time']
+    assert client.post(f'/api/study-sessions/{session_id}/close').json['ended_at'] == ended_at
+    response = client.post(f'/api/study-sessions/{session_id}/reviews', json={'word_id': 1, 'correct': True})
+    assert response.status_code == 409
+
+def test_write_backpressure(app, client, setup_database):
+    """Test writes retry a held database lock, then answer 503 instead of a raw locked error"""
+    from lib.db import WriteQueue
+
+    session_id = client.post('/api/study-sessions', json={'group_id': 1, 'study_activity_id': 1}).json['id']
+    app.db.busy_timeout = 0.05
+    app.db.close_pool()
+
+    blocker = sqlite3.connect(app.config['DATABASE'], isolation_level=None)
+    blocker.execute('BEGIN IMMEDIATE')
+    try:
+        response = client.post(f'/api/study-sessions/{session_id}/reviews', json={'word_id': 1, 'correct': True})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+    finally:
+        blocker.execute('ROLLBACK')
+        blocker.close()
+
+    stats = client.get('/api/metrics').json['db']
+    assert stats['busy'] == 1
+    assert stats['retries'] == app.db.write_retries
+    assert stats['max_lock_wait_seconds'] >= 0.05 * (app.db.write_retries + 1)
+
+    # Queued writers of one process all get through, one at a time
+    app.db.write_queue = WriteQueue()
+    def review():
+        local = app.test_client()
+        for _ in range(10):
+            assert local.post(f'/api/study-sessions/{session_id}/reviews', json={'word_id': 1, 'correct': True}).status_code == 201
+    threads = [threading.Thread(target=review) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert client.get(f'/api/study-sessions/{session_id}').json['session']['review_items_count'] == 40
+    assert client.get('/api/metrics').json['db']['queued'] == 0
+
+def test_session_word_stats(client, setup_database):
+    """Test a session's word list pages through per-session stats in kanji order"""
+    session_id = client.post('/api/study-sessions', json={'group_id': 1, 'study_activity_id': 1}).json['id']
+    for word_id, correct in [(2, True), (1, False), (2, False), (3, True), (2, True), (999, True)]:
+        client.post(f'/api/study-sessions/{session_id}/reviews', json={'word_id': word_id, 'correct': correct})
+
+    first = client.get(f'/api/study-sessions/{session_id}?per_page=2').json
+    second = client.get(f'/api/study-sessions/{session_id}?per_page=2&page=2').json
+    assert first['total'] == 3 and first['total_pages'] == 2
+    words = first['words'] + second['words']
+    assert [word['kanji'] for word in words] == sorted(word['kanji'] for word in words)
+    counts = {word['id']: (word['correct_count'], word['wrong_count']) for word in words}
+    assert counts == {1: (0, 1), 2: (2, 1), 3: (1, 0)}
@@ -0,0 +1,96 @@
+import pytest
+
+from lib.jobs import JobRunner
+
+@pytest.fixture
+def runner(tmp_path):
+    runner = JobRunner(str(tmp_path / 'jobs.db'), workers=2, poll_interval=0.05, retry_delay=0)
+    yield runner
+    runner.stop()
+
+def test_job_retried_until_it_succeeds(runner):
+    """Test a failing attempt is queued again and the next attempt's result is kept"""
+    attempts = []
+
+    def flaky(job, word_ids):
+        attempts.append(job.attempt)
+        job.update(progress=len(attempts), total=2, message='Working')
+        if len(attempts) == 1:
+            raise RuntimeError('database is locked')
+        return {'words': len(word_ids)}
+
+    runner.register('flaky', flaky)
+    job_id = runner.submit('flaky', word_ids=[1, 2, 3])
+    assert runner.wait(job_id, timeout=5)
+
+    job = runner.get(job_id)
+    assert attempts == [1, 2]
+    assert (job['status'], job['attempts'], job['result']) == ('succeeded', 2, {'words': 3})
+    assert (job['progress'], job['total'], job['message'], job['error']) == (2, 2, 'Working', None)
+    assert job['params'] == {'word_ids': [1, 2, 3]}
+
+def test_job_fails_after_max_attempts(runner):
+    """Test a job failing every attempt ends failed with the last error"""
+    def broken(job):
+        raise ValueError(f'attempt {job.attempt}')
+
+    runner.register('broken', broken, max_attempts=2)
+    job_id = runner.submit('broken')
+    assert runner.wait(job_id, timeout=5)
+
+    job = runner.get(job_id)
+    assert (job['status'], job['attempts'], job['error']) == ('failed', 2, 'attempt 2')
+    assert job['finished_at'] is not None
+
+    with pytest.raises(ValueError):
+        runner.submit('unknown')
+
+def test_stale_running_job_is_reclaimed(runner):
+    """Test a running job whose worker stopped reporting runs again"""
+    runner.register('noop', lambda job: job.attempt)
+    runner.execute('''
+        INSERT INTO jobs (kind, status, attempts, heartbeat_at)
+        VALUES ('noop', 'running', 1, datetime('now', '-1 hour'))
+    ''')
+    runner.start()
+    assert runner.wait(1, timeout=5)
+    assert runner.get(1)['result'] == 2
+    assert [job['id'] for job in runner.list(status='succeeded')] == [1]
+
+def test_worker_survives_failed_bookkeeping(runner):
+    """Test a worker that can't record a job's outcome logs it and keeps running jobs"""
+    runner.register('doomed', lambda job: 'done')
+    runner.register('noop', lambda job: job.attempt)
+    runner.execute('''
+        CREATE TRIGGER doomed_outcome BEFORE UPDATE OF status ON jobs
+        WHEN NEW.kind = 'doomed' AND NEW.status != 'running'
+        BEGIN SELECT RAISE(ABORT, 'database is locked'); END
+    ''')
+    doomed = [runner.submit('doomed') for _ in range(runner.workers)]
+    runner.start()
+    job_id = runner.submit('noop')
+    assert runner.wait(job_id, timeout=5)
+    assert runner.get(job_id)['result'] == 1
+
+    # Left running for the stale job reclaim
+    assert [runner.get(doomed_id)['status'] for doomed_id in doomed] == ['running'] * runner.workers
+    assert all(thread.is_alive() for thread in runner._threads)
+
+def test_jobs_endpoints(app, client):
+    """Test /api/jobs reports jobs and keeps admin jobs behind the admin token"""
+    app.config['ADMIN_TOKEN'] = 'secret'
+    headers = {'Authorization': 'Bearer secret'}
+
+    reset = client.post('/api/study-sessions/reset').json['job_id']
+    rebuild = client.post('/api/admin/rebuild-rollups', headers=headers).json['job_id']
+    for job_id in (reset, rebuild):
+        assert app.jobs.wait(job_id, timeout=5)
+
+    assert client.get(f'/api/jobs/{reset}').json['status'] == 'succeeded'
+    assert client.get(f'/api/jobs/{rebuild}').status_code == 401
+    assert client.get(f'/api/jobs/{rebuild}', headers=headers).json['result'] == {'groups': 2}
+    assert client.get('/api/jobs/999').status_code == 404
+
+    assert [job['id'] for job in client.get('/api/jobs').json['jobs']] == [reset]
+    assert [job['id'] for job in client.get('/api/jobs', headers=headers).json['jobs']] == [rebuild, reset]
+    assert client.get('/api/jobs?status=done').status_code == 400
@@ -0,0 +1,148 @@
+"""Query plan regressions against a generated medium-size database.
+
+Every registered statement is planned with EXPLAIN QUERY PLAN, which covers
+all statements the routes and dashboard run. A new full scan of
+word_review_items, a sorted page that falls back to a temp B-tree, a key
+statement losing its index or a read statement blowing its time budget
+fails here before it reaches production data.
+"""
+import re
+import sqlite3
+import time
+
+import pytest
+
+from lib import queries
+
+# Sorted pages allowed to sort in a temp B-tree, with the reason
+TEMP_BTREE_ALLOWED = {
+    'words.list.correct_count': 'Sort key is a COALESCE over the LEFT JOINed word_reviews',
+    'words.list.wrong_count': 'Sort key is a COALESCE over the LEFT JOINed word_reviews',
+    'groups.list': 'groups is small, one row per group',
+    'groups.words': "Sorts one group's words after the words_groups lookup",
+    'groups.study_sessions.endTime': 'Sort key is COALESCE(ended_at, last_activity_at)',
+    'groups.study_sessions.activityName': "Sorts one group's sessions by the joined activity name",
+    'groups.study_sessions.reviewItemsCount': "Sorts one group's sessions by a counted column",
+}
+
+# Statement -> index its plan must use
+EXPECTED_INDEXES = {
+    'study_sessions.list': 'study_sessions_created_at',
+    'study_sessions.get': 'INTEGER PRIMARY KEY',
+    'study_sessions.words': 'session_word_stats_kanji',
+    'study_sessions.words_count': 'INTEGER PRIMARY KEY',
+    'study_sessions.active': 'study_sessions_active',
+    'study_sessions.close_idle': 'study_sessions_active',
+    'study_activities.sessions': 'study_sessions_study_activity_id',
+    'groups.study_sessions_count': 'study_sessions_group_id',
+    'groups.study_sessions.startTime.desc': 'study_sessions_group_id',
+    'groups.words_count': 'words_groups',
+    'dashboard.recent_session': 'study_sessions_created_at',
+    'words.list.kanji.asc': 'words_kanji',
+    'words.list[slim].kanji.asc': 'COVERING INDEX words_kanji',
+    'words.list.romaji.asc': 'words_romaji',
+    'words.list.english.asc': 'words_english',
+    'words.id_by_key': 'words_norm_key',
+    'words.index_changes': 'INTEGER PRIMARY KEY',
+    'words.review_versions': 'change_log_table_row',
+    'sync.changes': 'INTEGER PRIMARY KEY',
+}
+
+# Statement -> (parameters, budget in milliseconds); measured well under a
+# tenth of the budget, so only a lost index or a pathological plan trips it
+BUDGETS_MS = {
+    'words.list.kanji.asc': ((10, 0), 20),
+    'words.list.romaji.desc': ((10, 100), 20),
+    'words.list[slim].kanji.asc': ((10, 0), 20),
+    'words.list.correct_count.desc': ((10, 0), 100),
+    'words.count': ((), 20),
+    'words.details_by_ids': (('[1, 2, 3, 4, 5, 6, 7, 8, 9, 10]',), 20),
+    'words.groups_by_word_ids': (('[1, 2, 3, 4, 5, 6, 7, 8, 9, 10]',), 20),
+    'words.review_versions': (('[1, 2, 3, 4, 5, 6, 7, 8, 9, 10]',), 20),
+    'groups.list.name.asc': ((10, 0), 20),
+    'groups.list.mastered_words.desc': ((10, 0), 20),
+    'groups.get': ((1,), 20),
+    'groups.words.kanji.asc': ((1, 10, 0), 50),
+    'groups.words.correct_count.desc': ((1, 10, 0), 50),
+    'groups.words_count': ((1,), 20),
+    'groups.words_raw': ((1,), 100),
+    'groups.study_sessions_count': ((1,), 20),
+    'groups.study_sessions.startTime.desc': ((1, 10, 0), 20),
+    'groups.study_sessions.reviewItemsCount.desc': ((1, 10, 0), 50),
+    'study_sessions.count': ((), 20),
+    'study_sessions.list': ((10, 1000), 20),
+    'study_sessions.get': ((1000,), 20),
+    'study_sessions.words': ((1000, 10, 0), 20),
+    'study_sessions.words_count': ((1000,), 20),
+    'study_sessions.active': ((50,), 20),
+    'study_activities.sessions_count': ((1,), 20),
+    'study_activities.sessions': ((1, 10, 0), 20),
+    'dashboard.recent_session': ((), 20),
+    'dashboard.sessions_count': ((), 20),
+    'dashboard.review_totals': ((), 50),
+    'sync.changes': ((0, 1000), 50),
+    'table_versions.all': ((), 20),
+}
+
+KEYWORDS = {'on', 'where', 'join', 'left', 'inner', 'group', 'order', 'limit', 'set', 'using', 'as'}
+
+@pytest.fixture(scope='module')
+def connection(generated_db):
+    connection = sqlite3.connect(generated_db)
+    yield connection
+    connection.close()
+
+def review_item_names(sql):
+    """word_review_items and every alias it goes by in `sql`."""
+    aliases = re.findall(r'\bword_review_items\s+(?:AS\s+)?(\w+)', sql, re.IGNORECASE)
+    return {'word_review_items'} | {alias for alias in aliases if alias.lower() not in KEYWORDS}
+
+def allowed_reason(name):
+    # Profiles (words.list[slim].kanji.asc) sort like the full statement
+    name = re.sub(r'\[\w+\]', '', name)
+    for prefix, reason in TEMP_BTREE_ALLOWED.items():
+        if name == prefix or name.startswith(prefix + '.'):
+            return reason
+    return None
+
+@pytest.mark.parametrize('name', sorted(queries.QUERIES))
+def test_no_full_scan_of_review_items(connection, name):
+    names = review_item_names(queries.get(name))
+    for detail in queries.explain(connection, name):
+        match = re.match(r'SCAN (\w+)', detail)
+        assert not (match and match.group(1) in names), f'{name}: {detail}'
+
+@pytest.mark.parametrize('name', sorted(queries.SORTED))
+def test_sorted_pages_avoid_temp_btree(connection, name):
+    if allowed_reason(name):
+        pytest.skip(allowed_reason(name))
+    plan = queries.explain(connection, name)
+    assert not any('TEMP B-TREE FOR ORDER BY' in detail for detail in plan), f'{name}: {plan}'
+
+def test_session_words_page_is_an_index_range(connection):
+    plan = queries.explain(connection, 'study_sessions.words')
+    assert not any('TEMP B-TREE' in detail for detail in plan), plan
+
+def test_temp_btree_allowlist_is_current():
+    """Every allowlist entry still names registered sorted pages"""
+    for prefix in TEMP_BTREE_ALLOWED:
+        assert any(name.startswith(prefix + '.') for name in queries.SORTED), prefix
+
+@pytest.mark.parametrize('name,index', sorted(EXPECTED_INDEXES.items()))
+def test_expected_index(connection, name, index):
+    plan = queries.explain(connection, name)
+    assert any(index in detail for detail in plan), f'{name}: {plan}'
+
+@pytest.mark.parametrize('name', sorted(BUDGETS_MS))
+def test_execution_budget(connection, name):
+    parameters, budget = BUDGETS_MS[name]
+    sql = queries.get(name)
+    connection.execute(sql, parameters).fetchall()  # warm the page cache
+
+    best = min(timed(connection, sql, parameters) for _ in range(3))
+    assert best <= budget, f'{name} took {best:.1f}ms, budget {budget}ms'
+
+def timed(connection, sql, parameters):
+    started = time.perf_counter()
+    connection.execute(sql, parameters).fetchall()
+    return (time.perf_counter() - started) * 1000
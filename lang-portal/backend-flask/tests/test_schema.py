@@ -16,4 +16,182 @@ def test_database_schema(client):
             "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
             (table,)
         ).fetchone()
-        assert result is not None, f"Table {table} does not exist"
\ No newline at end of file
+        assert result is not None, f"Table {table} does not exist"
+
+def test_schema_version_recorded(client):
+    """Test init records the schema version and skips setup afterwards"""
+    from lib.db import SCHEMA_VERSION
+
+    app = client.application
+    with app.app_context():
+        connection = app.db.get()
+        assert connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+
+        # A second init must not seed the data again
+        words_count = connection.execute('SELECT COUNT(*) FROM words').fetchone()[0]
+        app.db.init(app)
+        assert connection.execute('SELECT COUNT(*) FROM words').fetchone()[0] == words_count
+
+def test_sql_files_resolved_from_package(tmp_path):
+    """Test SQL files load regardless of the working directory"""
+    import os
+    from lib.db import load_sql
+
+    load_sql.cache_clear()
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        assert 'CREATE TABLE IF NOT EXISTS words' in load_sql('setup/create_table_words.sql')
+    finally:
+        os.chdir(cwd)
+
+def test_query_registry_validates(client):
+    """Test every registered statement prepares against the schema"""
+    from lib import queries
+
+    with client.application.app_context():
+        plans = queries.validate(client.application.db.get())
+
+    assert set(plans) == set(queries.QUERIES)
+    assert len(queries.QUERIES) < queries.CACHED_STATEMENTS
+    assert 'words.list.correct_count.desc' in plans
+
+# The schema created by the code before user_version was stamped, verbatim.
+# Not read from sql/setup, whose files have gained columns since.
+VERSION_1_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS words (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      kanji TEXT NOT NULL,
+      romaji TEXT NOT NULL,
+      english TEXT NOT NULL,
+      parts TEXT NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS word_reviews (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      word_id INTEGER NOT NULL UNIQUE,
+      correct_count INTEGER DEFAULT 0,
+      wrong_count INTEGER DEFAULT 0,
+      last_reviewed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      FOREIGN KEY (word_id) REFERENCES words(id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS word_review_items (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      word_id INTEGER NOT NULL,
+      study_session_id INTEGER NOT NULL,
+      correct BOOLEAN NOT NULL,
+      created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+      FOREIGN KEY (word_id) REFERENCES words(id),
+      FOREIGN KEY (study_session_id) REFERENCES study_sessions(id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS groups (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      name TEXT NOT NULL,
+      words_count INTEGER DEFAULT 0
+    )''',
+    '''CREATE TABLE IF NOT EXISTS words_groups (
+      word_id INTEGER NOT NULL,
+      group_id INTEGER NOT NULL,
+      PRIMARY KEY (word_id, group_id),
+      FOREIGN KEY (word_id) REFERENCES words(id),
+      FOREIGN KEY (group_id) REFERENCES groups(id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS study_activities (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      name TEXT NOT NULL,
+      url TEXT NOT NULL,
+      preview_url TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS study_sessions (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      group_id INTEGER NOT NULL,
+      study_activity_id INTEGER NOT NULL,
+      created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+      FOREIGN KEY (group_id) REFERENCES groups(id),
+      FOREIGN KEY (study_activity_id) REFERENCES study_activities(id)
+    )''',
+]
+
+def test_migrates_unversioned_database(tmp_path):
+    """Test a database created before schema versioning is upgraded in place"""
+    import sqlite3
+    from flask import Flask
+    from lib import queries
+    from lib.db import Db, SCHEMA_VERSION
+
+    database = str(tmp_path / 'legacy.db')
+    connection = sqlite3.connect(database)
+    for statement in VERSION_1_SCHEMA:
+        connection.execute(statement)
+    connection.execute("INSERT INTO words (kanji, romaji, english, parts) VALUES ('犬', 'inu', 'dog', '[]')")
+    connection.execute("INSERT INTO words (kanji, romaji, english, parts) VALUES ('犬', 'INU', 'dog', '[]')")
+    connection.execute("INSERT INTO groups (name, words_count) VALUES ('Stale', 7)")
+    connection.execute('INSERT INTO words_groups (word_id, group_id) VALUES (1, 1)')
+    connection.execute("INSERT INTO study_activities (name, url) VALUES ('Flashcards', 'http://localhost:8082')")
+    connection.execute('INSERT INTO study_sessions (group_id, study_activity_id) VALUES (1, 1)')
+    connection.executemany(
+        'INSERT INTO word_review_items (word_id, study_session_id, correct) VALUES (?, 1, ?)',
+        [(1, 1), (1, 0), (1, 1)]
+    )
+    connection.execute('INSERT INTO word_reviews (word_id, correct_count, wrong_count) VALUES (1, 2, 1)')
+    connection.commit()
+    connection.close()
+
+    app = Flask(__name__)
+    db = Db(database=database)
+    db.init(app)
+
+    connection = sqlite3.connect(database)
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert connection.execute('SELECT words_count FROM groups WHERE id = 1').fetchone()[0] == 1
+    assert connection.execute('SELECT correct_reviews, wrong_reviews FROM groups WHERE id = 1').fetchone() == (2, 1)
+    # The first copy of a duplicate gets the key, later copies are left for the report
+    assert connection.execute('SELECT norm_key FROM words ORDER BY id').fetchall() == [('犬|inu',), (None,)]
+    assert connection.execute('SELECT last_activity_at IS NOT NULL, words_count FROM study_sessions').fetchone() == (1, 1)
+    assert connection.execute('SELECT correct, wrong FROM session_word_stats').fetchall() == [(2, 1)]
+
+    # Every registered statement prepares against the migrated schema
+    queries.validate(connection)
+    connection.close()
+
+def test_pooled_connections_are_warmed(app):
+    """Test workers reuse pooled connections with the read statements already prepared"""
+    from lib import queries
+    from serve import warm_statements
+
+    warmed = warm_statements(app.db)
+    assert warmed == len([sql for sql in queries.QUERIES.values() if sql.lstrip().upper().startswith('SELECT')])
+
+    with app.app_context():
+        connection = app.db.get()
+        app.db.close()
+    with app.app_context():
+        assert app.db.get() is connection
+
+def test_synthetic_database(tmp_path):
+    """Test generated databases are deterministic and their aggregates consistent"""
+    import sqlite3
+    from lib import synthetic
+
+    scale = dict(words=300, groups=8, activities=3, sessions=40, reviews=2000)
+    first = str(tmp_path / 'first.db')
+    second = str(tmp_path / 'second.db')
+    counts = synthetic.generate(first, seed=7, log=None, **scale)
+    synthetic.generate(second, seed=7, log=None, fast=False, **scale)
+    assert counts['word_review_items'] == 2000 and counts['study_activities'] == 3
+
+    a, b = sqlite3.connect(first), sqlite3.connect(second)
+    for table in ['words', 'groups', 'words_groups', 'study_sessions', 'word_review_items', 'word_reviews',
+                  'session_word_stats']:
+        assert a.execute(f'SELECT * FROM {table} ORDER BY 1, 2').fetchall() == \
+            b.execute(f'SELECT * FROM {table} ORDER BY 1, 2').fetchall()
+    assert a.execute('''
+        SELECT COUNT(*) FROM groups g
+        WHERE words_count != (SELECT COUNT(*) FROM words_groups WHERE group_id = g.id)
+    ''').fetchone()[0] == 0
+    assert a.execute('''
+        SELECT COUNT(*) FROM study_sessions ss
+        WHERE words_count != (SELECT COUNT(*) FROM session_word_stats WHERE session_id = ss.id)
+    ''').fetchone()[0] == 0
+    assert a.execute('PRAGMA user_version').fetchone()[0] > 0
+    a.close()
+    b.close()